@@ -0,0 +1,9 @@
+"""
+tachphai: sinh prompt JSON cinematic cho từng cảnh bằng Gemini.
+
+Import package / các module offline (scenes, resources, prompts, postprocess, validate...)
+KHÔNG đọc file, KHÔNG nạp API key và KHÔNG import google.generativeai.
+Chỉ lệnh `generate` (tachphai.runner / tachphai.gemini) mới cần tới Gemini.
+"""
+
+__version__ = "0.1.0"
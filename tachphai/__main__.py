@@ -0,0 +1,7 @@
+"""`python -m tachphai ...`"""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
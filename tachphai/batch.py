@@ -0,0 +1,118 @@
+"""Batch: gộp nhiều cảnh vào 1 request, map kết quả về từng cảnh theo scene_number."""
+
+import json
+import re
+
+from .gemini import cache_lookup, cache_store, call_gemini_cached, call_gemini_text
+from .prompts import build_batch_prompt, build_prompt
+from .repair import parse_lenient, strip_fences
+from .retry import TERMINAL_KINDS, NoUsableKeysError, error_line
+from .scenes import scene_number_of
+
+
+# ==============================
+# 6c. BATCH: GỘP NHIỀU CẢNH VÀO 1 REQUEST
+# ==============================
+
+def normalize_scene_number(value) -> str:
+    """1 / "1" / "Scene 1" → "1"."""
+    m = re.search(r"\d+", str(value))
+    return m.group(0) if m else ""
+
+
+def parse_batch_response(text: str) -> dict:
+    """
+    Tách response batch thành {scene_number: 1 dòng JSON}.
+    Chấp nhận cả trường hợp model trả về 1 JSON array. Số cảnh bị lặp → bỏ (không map được chắc chắn).
+    Cảnh có JSON hỏng không sửa được coi như thiếu → được gửi lại theo batch nhỏ hơn.
+    """
+    text = strip_fences(text)
+
+    objects = []
+    if text.startswith("["):
+        data, _ = parse_lenient(text)
+        if isinstance(data, list):
+            objects = [obj for obj in data if isinstance(obj, dict)]
+    if not objects:
+        for raw in text.splitlines():
+            raw = raw.strip().rstrip(",")
+            if not raw:
+                continue
+            # Từng dòng cũng qua bước sửa lỗi (dấu " chưa escape, dòng cuối bị cụt...)
+            obj, _ = parse_lenient(raw)
+            if isinstance(obj, dict):
+                objects.append(obj)
+
+    found, dup = {}, set()
+    for obj in objects:
+        num = normalize_scene_number(obj.get("scene_number", ""))
+        if not num:
+            continue
+        if num in found:
+            dup.add(num)
+        found[num] = json.dumps(obj, ensure_ascii=False)
+    for num in dup:
+        del found[num]
+    return found
+
+
+def generate_batch(batch, char_dict_for, camera_list_str: str) -> list:
+    """
+    Sinh JSON cho 1 batch cảnh, trả về list raw line đúng thứ tự batch.
+    char_dict_for(list cảnh) → CHAR_DICT string cho đúng các cảnh đó (xem Episode.char_dict_for).
+    - Cảnh đã có trong cache (theo prompt 1 cảnh) thì không gửi lại.
+    - Response thiếu cảnh / sai số cảnh → giữ các cảnh khớp, tách phần còn lại làm đôi
+      và gửi lại, tới mức 1 cảnh thì dùng prompt 1 cảnh như bình thường.
+    """
+    lines = [None] * len(batch)
+    missing = []
+    for i, scene in enumerate(batch):
+        lines[i] = cache_lookup(build_prompt(scene, char_dict_for([scene]), camera_list_str))
+        if lines[i] is None:
+            missing.append(i)
+
+    fill_batch(batch, missing, lines, char_dict_for, camera_list_str)
+    return lines
+
+
+def fill_batch(batch, idxs, lines, char_dict_for, camera_list_str: str):
+    if not idxs:
+        return
+    if len(idxs) == 1:
+        i = idxs[0]
+        try:
+            lines[i] = call_gemini_cached(build_prompt(batch[i], char_dict_for([batch[i]]), camera_list_str))
+        except NoUsableKeysError:
+            raise
+        except Exception as e:
+            lines[i] = error_line(batch[i], e)
+        return
+
+    numbers = [scene_number_of(batch[i]) for i in idxs]
+    left = idxs
+    if all(numbers) and len(set(numbers)) == len(numbers):
+        scenes = [batch[i] for i in idxs]
+        prompt = build_batch_prompt(scenes, char_dict_for(scenes), camera_list_str)
+        try:
+            got = parse_batch_response(call_gemini_text(prompt, "batch"))
+        except NoUsableKeysError:
+            raise
+        except Exception as e:
+            if getattr(e, "kind", None) not in TERMINAL_KINDS:
+                # Server chập chờn / lỗi lạ: tách nhỏ chỉ nhân số request hỏng, để --regen / --resume làm lại
+                for i in idxs:
+                    lines[i] = error_line(batch[i], e)
+                return
+            got = {}  # 1 cảnh trong batch bị chặn → tách nhỏ để khoanh đúng cảnh đó
+        for i, num in zip(idxs, numbers):
+            if num in got:
+                lines[i] = got[num]
+                cache_store(build_prompt(batch[i], char_dict_for([batch[i]]), camera_list_str), got[num])
+        left = [i for i in idxs if lines[i] is None]
+        if not left:
+            return
+        print(f"⚠️ Batch thiếu / sai {len(left)}/{len(idxs)} cảnh → tách nhỏ và gửi lại.")
+
+    mid = len(left) // 2
+    fill_batch(batch, left[:mid], lines, char_dict_for, camera_list_str)
+    fill_batch(batch, left[mid:], lines, char_dict_for, camera_list_str)
@@ -0,0 +1,146 @@
+"""
+Benchmark end-to-end lệnh generate với server Gemini giả (fakeserver.py), không tốn quota.
+
+Mỗi kích thước N: tạo thư mục tạm với N cảnh tổng hợp + api_keys giả, chạy runner.run()
+qua REST tới server giả, rồi báo: cảnh/giây, p50/p99 latency request, p50 time-to-first-token
+(khi chạy --stream), số request bỏ phí.
+"""
+
+import contextlib
+import io
+import json
+import os
+import random
+import shlex
+import tempfile
+import time
+from pathlib import Path
+
+WORDS = (
+    "Alex Maya Marcus bước chậm qua hành lang tối gió lạnh ánh đèn le lói tiếng bước chân vang "
+    "cánh cửa khép hờ bản đồ cũ vết máu khô ánh trăng màn sương dày mùi ẩm mốc tiếng thì thầm"
+).split()
+
+# Request "bỏ phí" = response không dùng được, phải gọi lại (429 / 500 / key bị từ chối / JSON hỏng không sửa được)
+WASTED_OUTCOMES = ("429", "500", "400_key", "truncated", "garbage", "rambling")
+
+
+def write_synthetic_scenes(path: Path, n: int, seed: int = 0, words_per_scene: int = 90):
+    """Ghi n cảnh dạng "Scene <i>: ..." (nội dung ngẫu nhiên theo seed, có 1 câu thoại)."""
+    rng = random.Random(seed)
+    with path.open("w", encoding="utf-8") as f:
+        for i in range(1, n + 1):
+            body = " ".join(rng.choice(WORDS) for _ in range(words_per_scene))
+            f.write(f'Scene {i}: {body}. Alex: "Đi thôi."\n\n')
+
+
+def write_workspace(root: Path, n: int, keys: int, seed: int, bad_keys: int = 0):
+    """bad_keys: thêm (ở đầu file) key mà server giả luôn từ chối (400 API_KEY_INVALID)."""
+    write_synthetic_scenes(root / "scenes.txt", n, seed)
+    names = [f"bench-invalid-key-{i}" for i in range(1, bad_keys + 1)] + [f"bench-key-{i}" for i in range(1, keys + 1)]
+    (root / "api_keys.txt").write_text(
+        "".join(f"{name} rpm=100000 tpm=1000000000\n" for name in names), encoding="utf-8"
+    )
+    (root / "camera_styles.txt").write_text("Dolly in\nCrane up\nHandheld\nSteadicam\nDrone\n", encoding="utf-8")
+    (root / "character_dictionary.json").write_text(json.dumps({"characters": [
+        {"name": "Alex", "name_closeup": "Alex2", "appearance": "tall", "voice_tone": "calm"},
+        {"name": "Maya", "name_closeup": "Maya2", "appearance": "short hair", "voice_tone": "bright"},
+    ]}), encoding="utf-8")
+
+
+def run_one(n: int, args, server) -> dict:
+    """Chạy generate cho n cảnh trong thư mục tạm, trả về 1 dòng kết quả."""
+    from . import config, gemini
+    from .cli import build_parser
+    from .metrics import metrics
+    from .runner import run
+
+    gen_argv = ["generate", "--no-metrics", "--no-store"] + shlex.split(args.generate_args)
+    if args.workers:
+        gen_argv += ["--workers", str(args.workers)]
+    if "--refresh" not in gen_argv and "--cache-dir" not in gen_argv:
+        gen_argv.append("--no-cache")
+    gen_args = build_parser().parse_args(gen_argv)
+
+    cwd = os.getcwd()
+    before = dict(server.stats)
+    with tempfile.TemporaryDirectory(prefix="tachphai-bench-") as tmp:
+        root = Path(tmp)
+        write_workspace(root, n, args.keys, args.seed, args.bad_keys)
+        os.chdir(root)
+        try:
+            gemini.scheduler = None
+            out = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+            t0 = time.perf_counter()
+            with out:
+                gemini.get_scheduler().cooldown = args.cooldown
+                run(gen_args)
+            wall = time.perf_counter() - t0
+            lines = sum(1 for line in (root / config.OUTPUT_FILE).open(encoding="utf-8") if line.strip())
+        finally:
+            os.chdir(cwd)
+            gemini.scheduler = None
+
+    stats = {k: server.stats[k] - before.get(k, 0) for k in server.stats}
+    summary = metrics.summary()
+    # Latency của loại request chính (scene, hoặc batch khi chạy --batch)
+    latency = max(summary["latency_seconds"].values(), key=lambda v: v["count"], default={})
+    ttft = max(summary["ttft_seconds"].values(), key=lambda v: v["count"], default={})
+    requests = stats.get("requests", 0)
+    wasted = sum(stats.get(k, 0) for k in WASTED_OUTCOMES)
+    return {
+        "scenes": n,
+        "output_lines": lines,
+        "seconds": round(wall, 3),
+        "scenes_per_sec": round(n / wall, 2) if wall else 0.0,
+        "p50_ms": round(latency.get("p50", 0) * 1000, 1),
+        "p99_ms": round(latency.get("p99", 0) * 1000, 1),
+        "ttft_p50_ms": round(ttft.get("p50", 0) * 1000, 1),
+        "requests": requests,
+        "wasted_requests": wasted,
+        "requests_per_scene": round(requests / n, 3) if n else 0.0,
+        "server": stats,
+    }
+
+
+def print_table(rows):
+    print(f"{'scenes':>7} {'lines':>7} {'sec':>8} {'scenes/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'ttft ms':>8} {'req':>7} {'wasted':>7} {'req/scene':>9}")
+    for r in rows:
+        print(
+            f"{r['scenes']:>7} {r['output_lines']:>7} {r['seconds']:>8.2f} {r['scenes_per_sec']:>9.1f} "
+            f"{r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['ttft_p50_ms']:>8.1f} {r['requests']:>7} {r['wasted_requests']:>7} "
+            f"{r['requests_per_scene']:>9.3f}"
+        )
+
+
+def run_bench(args) -> list:
+    from . import config
+    from .fakeserver import FakeGeminiServer
+
+    sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+    server = FakeGeminiServer(
+        latency=args.latency,
+        rate_429=args.rate_429,
+        rate_500=args.rate_500,
+        rate_malformed=args.rate_malformed,
+        seed=args.seed,
+        retry_delay=args.cooldown,
+    )
+    old_endpoint = config.API_ENDPOINT
+    rows = []
+    with server:
+        config.API_ENDPOINT = server.url
+        print(f"🧪 Fake Gemini tại {server.url} (latency {args.latency}, 429 {args.rate_429:.0%}, "
+              f"500 {args.rate_500:.0%}, JSON hỏng {args.rate_malformed:.0%})")
+        try:
+            for n in sizes:
+                print(f"▶️ {n} cảnh ...")
+                rows.append(run_one(n, args, server))
+        finally:
+            config.API_ENDPOINT = old_endpoint
+
+    print_table(rows)
+    if args.json:
+        Path(args.json).write_text(json.dumps(rows, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"📝 Kết quả → {args.json}")
+    return rows
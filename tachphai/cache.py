@@ -0,0 +1,93 @@
+"""Cache response của Gemini trên ổ đĩa (SQLite), key = hash(model + prompt đầy đủ)."""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from .config import CACHE_DIR, CACHE_MAX_AGE_DAYS, CACHE_MAX_MB, MODEL_NAME
+
+
+class ResponseCache:
+    """
+    Cache response của Gemini trong SQLite (CACHE_DIR/responses.sqlite3).
+    - Key = sha256(model + prompt đầy đủ) → sửa 1 cảnh chỉ làm đổi key của cảnh đó;
+      mỗi model (tầng --tiers) có entry riêng cho cùng 1 prompt.
+    - Chỉ lưu response parse được JSON (không cache output hỏng).
+    - read=False (--refresh): bỏ qua cache khi đọc nhưng vẫn ghi đè kết quả mới.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, read: bool = True):
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+        self.path = Path(cache_dir) / "responses.sqlite3"
+        self.read = read
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, model TEXT, response TEXT,"
+            " size INTEGER, created_at REAL, used_at REAL)"
+        )
+        self.db.commit()
+
+    @staticmethod
+    def make_key(prompt: str, model: str = MODEL_NAME) -> str:
+        return hashlib.sha256(f"{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        if not self.read:
+            return None
+        with self.lock:
+            row = self.db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.db.execute("UPDATE responses SET used_at = ? WHERE key = ?", (time.time(), key))
+            self.db.commit()
+            return row[0]
+
+    def put(self, key: str, response: str, model: str = MODEL_NAME):
+        try:
+            json.loads(response)
+        except json.JSONDecodeError:
+            return
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, len(response.encode("utf-8")), now, now),
+            )
+            self.db.commit()
+
+    def evict(self, max_age_days: float = CACHE_MAX_AGE_DAYS, max_mb: float = CACHE_MAX_MB) -> int:
+        """Xoá entry quá hạn, rồi xoá entry ít dùng nhất tới khi tổng dung lượng <= max_mb."""
+        with self.lock:
+            cur = self.db.execute(
+                "DELETE FROM responses WHERE created_at < ?",
+                (time.time() - max_age_days * 86400,),
+            )
+            removed = cur.rowcount
+
+            max_bytes = int(max_mb * 1024 * 1024)
+            total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > max_bytes:
+                doomed = []
+                for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY used_at"):
+                    if total <= max_bytes:
+                        break
+                    doomed.append((key,))
+                    total -= size
+                self.db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+                removed += len(doomed)
+
+            self.db.commit()
+            return removed
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,84 @@
+"""
+Lọc character dictionary theo từng cảnh: chỉ gửi vào <<CHAR_DICT>> các nhân vật có mặt trong cảnh,
+để prompt không phình theo số nhân vật của cả phim.
+
+Tìm tên bằng automaton Aho-Corasick dựng 1 lần từ tên gốc + name_closeup + aliases:
+mỗi cảnh quét 1 lượt, thời gian theo độ dài cảnh chứ không theo số nhân vật × số alias.
+"""
+
+from collections import deque
+
+
+class AhoCorasick:
+    """Tìm mọi pattern trong text trong 1 lượt. patterns: [(pattern, value), ...]."""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for pattern, value in patterns:
+            node = 0
+            for ch in pattern:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                node = nxt
+            self.out[node].append((len(pattern), value))
+
+        # Failure link theo BFS; out của mỗi node gộp luôn out của failure link
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(ch, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def iter_matches(self, text: str):
+        """Yield (start, end, value) cho mọi lần xuất hiện (kể cả chồng nhau)."""
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            for length, value in self.out[node]:
+                yield i - length + 1, i + 1, value
+
+
+def is_boundary(text: str, i: int) -> bool:
+    """Vị trí i nằm ngoài text hoặc không phải chữ / số → ranh giới từ ("Al" không khớp trong "Alex")."""
+    return i < 0 or i >= len(text) or not text[i].isalnum()
+
+
+class CharacterMatcher:
+    """
+    names_in(text) → tập tên gốc (key của character_dict) xuất hiện trong text.
+    Khớp không phân biệt hoa thường, nguyên từ: tên gốc, name_closeup và "aliases" của từng nhân vật.
+    """
+
+    def __init__(self, character_dict: dict):
+        patterns = []
+        for name, info in character_dict.items():
+            aliases = {name, info.get("name_closeup") or "", *info.get("aliases", ())}
+            for alias in aliases:
+                alias = alias.strip().lower()
+                if alias:
+                    patterns.append((alias, name))
+        self.pattern_count = len(patterns)
+        self.automaton = AhoCorasick(patterns)
+
+    def names_in(self, text: str) -> set:
+        lowered = text.lower()
+        found = set()
+        for start, end, name in self.automaton.iter_matches(lowered):
+            if is_boundary(lowered, start - 1) and is_boundary(lowered, end):
+                found.add(name)
+        return found
@@ -0,0 +1,549 @@
+"""
+CLI: `python -m tachphai <lệnh>`.
+
+  generate   (mặc định) gọi Gemini sinh prompt JSON cho từng cảnh
+  episodes   như generate cho nhiều tập (thư mục / manifest), chung 1 pool request + 1 bộ key
+  parse      tách scenes.txt, liệt kê số cảnh / cảnh trùng (offline)
+  validate   kiểm tra output_prompts.txt theo rule của prompt (offline)
+  stats      thống kê scenes / output (offline)
+  postprocess  chạy lại hậu xử lý trên output có sẵn (offline)
+  store      xem / lấy cảnh / so sánh / export các run trong kho output có version (offline)
+  queue      hàng đợi nhiều process / nhiều máy: enqueue / work / status / export
+  watch      chạy mãi, sửa scenes / dictionary / camera là chỉ sinh lại các cảnh bị ảnh hưởng
+  bench      đo throughput generate với server Gemini giả chạy local (offline)
+
+Các lệnh offline không import google.generativeai, không đọc api_keys.txt → chạy tức thì.
+"""
+
+import argparse
+import json
+import sys
+
+from . import config
+
+COMMANDS = ("generate", "episodes", "parse", "validate", "stats", "postprocess", "store", "queue", "watch", "bench")
+
+
+# ==============================
+# CÁC LỆNH
+# ==============================
+
+def cmd_generate(args):
+    # Import trễ: chỉ lệnh generate mới cần SDK Gemini
+    from .runner import run
+
+    try:
+        run(args)
+    except (ValueError, OSError) as e:
+        # File tầng (--tiers) sai / không đọc được
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+
+def cmd_episodes(args):
+    from .runner import run_manifest
+
+    if not args.dirs and not args.manifest:
+        print("⚠️ Truyền thư mục tập hoặc --manifest FILE.")
+        return 1
+    try:
+        run_manifest(args)
+    except (ValueError, OSError) as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+
+def cmd_parse(args):
+    from .scenes import iter_scenes, load_scene_range, parse_scene_range, scene_number_of
+
+    if args.scenes:
+        lo, hi = parse_scene_range(args.scenes)
+        selected = load_scene_range(args.scenes_file, lo, hi)
+    else:
+        selected = iter_scenes(args.scenes_file)
+
+    if args.dups:
+        from .dedup import find_duplicates
+
+        selected = list(selected)
+        dups = find_duplicates(selected, args.dedup_threshold)
+        for num, (rep, similarity) in dups.items():
+            if args.json:
+                print(json.dumps({"scene_number": num, "duplicate_of": rep, "similarity": round(similarity, 3)}))
+            else:
+                print(f"{num} {'=' if similarity >= 1.0 else '≈'} {rep} ({similarity:.0%})")
+        if not args.json:
+            exact = sum(1 for _, similarity in dups.values() if similarity >= 1.0)
+            print(f"🔁 {len(dups)}/{len(selected)} cảnh trùng cảnh trước (trùng hẳn {exact}, gần trùng {len(dups) - exact}).")
+        return 0
+
+    count = 0
+    for scene in selected:
+        count += 1
+        if args.json:
+            print(json.dumps({"scene_number": scene_number_of(scene), "text": scene}, ensure_ascii=False))
+        else:
+            first_line = scene.splitlines()[0] if scene else ""
+            print(first_line[:80])
+
+    if not args.json:
+        print(f"📄 {count} cảnh trong {args.scenes_file}")
+    return 0
+
+
+def cmd_validate(args):
+    from pathlib import Path
+
+    from .resources import load_camera_styles
+    from .validate import validate_line
+
+    p = Path(args.output_file)
+    if not p.exists():
+        print(f"⚠️ Không tìm thấy {args.output_file}")
+        return 1
+
+    camera_styles = load_camera_styles(args.camera_styles) if args.camera_styles else []
+
+    total = bad = 0
+    with p.open("r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            total += 1
+            data, issues = validate_line(line, camera_styles)
+            if issues:
+                bad += 1
+                scene = data.get("scene_number", "?") if isinstance(data, dict) else "?"
+                print(f"❌ Dòng {lineno} (scene {scene}): " + "; ".join(issues))
+
+    if bad:
+        print(f"⚠️ {bad}/{total} dòng có lỗi.")
+        return 1
+    print(f"✅ {total} dòng hợp lệ.")
+    return 0
+
+
+def cmd_stats(args):
+    from .stats import output_stats, scene_stats
+
+    result = {
+        "scenes_file": args.scenes_file,
+        "scenes": scene_stats(args.scenes_file),
+        "output_file": args.output_file,
+        "output": output_stats(args.output_file),
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+def cmd_postprocess(args):
+    from .reprocess import reprocess_paths
+    from .resources import load_camera_styles, load_character_dictionary
+
+    character_dict = load_character_dictionary(args.character_dict)
+    camera_styles = load_camera_styles(args.camera_styles)
+    results = reprocess_paths(args.paths, args.output, character_dict, camera_styles, args.pattern, args.seed)
+    if not results:
+        print("⚠️ Không có file output nào để xử lý.")
+        return 1
+    print(f"✅ Xong {len(results)} file.")
+    return 0
+
+
+def cmd_store(args):
+    from pathlib import Path
+
+    from .store import OutputStore
+
+    if not Path(args.store).exists():
+        print(f"⚠️ Không tìm thấy {args.store}")
+        return 1
+    store = OutputStore(args.store)
+    episode = args.episode or "default"
+    try:
+        if args.store_command == "runs":
+            for run in store.runs(args.episode):
+                print(f"{run['run_id']}  {run['episode']:<12} {run['scenes']:>6} cảnh  seed={run['seed']}  {run['output_file']}")
+            return 0
+
+        if args.store_command == "get":
+            line = store.get(episode, args.scene, args.run)
+            if line is None:
+                print(f"⚠️ Không có cảnh {args.scene} (tập {episode}, run {args.run or 'mới nhất'}).")
+                return 1
+            print(line)
+            return 0
+
+        if args.store_command == "diff":
+            # Không ghi run → 2 run gần nhất; ghi 1 run → so với run mới nhất
+            run_ids = [r["run_id"] for r in store.runs(episode)]
+            run_b = args.run_b or (run_ids[-1] if run_ids else None)
+            run_a = args.run_a or (run_ids[-2] if len(run_ids) > 1 else None)
+            if run_a is None or run_b is None:
+                print(f"⚠️ Tập {episode} chưa có đủ 2 run để so sánh.")
+                return 1
+            d = store.diff(episode, run_a, run_b)
+            if args.json:
+                print(json.dumps({"episode": episode, "from": run_a, "to": run_b, **d}, ensure_ascii=False, indent=2))
+            else:
+                print(f"🔍 {episode}: {run_a} → {run_b}")
+                for mark, key in (("+", "added"), ("-", "removed"), ("~", "changed")):
+                    for num in d[key]:
+                        print(f"{mark} cảnh {num}")
+                print(f"📊 +{len(d['added'])} / -{len(d['removed'])} / ~{len(d['changed'])} / giữ nguyên {d['same']}")
+            return 0
+
+        if args.store_command == "export":
+            total = store.export(episode, args.output, args.run)
+            print(f"✅ Đã export {total} cảnh → {args.output}")
+            return 0
+    finally:
+        store.close()
+    return 1
+
+
+def cmd_queue(args):
+    if args.queue_command == "work":
+        from .runner import run_worker
+
+        run_worker(args)
+        return 0
+
+    from pathlib import Path
+
+    from .episodes import Episode, collect_episodes
+    from .workqueue import WorkQueue, enqueue_episodes, export_queue
+
+    if args.queue_command != "enqueue" and not Path(args.queue).exists():
+        print(f"⚠️ Không tìm thấy {args.queue}")
+        return 1
+    queue = WorkQueue(args.queue)
+    try:
+        if args.queue_command == "enqueue":
+            try:
+                if args.dirs or args.manifest:
+                    episodes = collect_episodes(args.dirs, args.manifest)
+                else:
+                    episodes = [Episode("", config.SCENES_FILE, config.OUTPUT_FILE)]
+                enqueue_episodes(queue, episodes, args.scenes)
+            except (ValueError, OSError) as e:
+                print(f"❌ {e}")
+                return 1
+            print(f"📋 {queue.outstanding()} cảnh đang chờ. Chạy `python -m tachphai queue work` trên từng máy / process.")
+            return 0
+
+        if args.queue_command == "status":
+            counts = queue.counts()
+            if args.json:
+                print(json.dumps(counts, ensure_ascii=False, indent=2))
+                return 0
+            for episode, by_status in counts.items():
+                cells = "  ".join(f"{status} {by_status.get(status, 0):>5}" for status in ("pending", "leased", "done", "failed"))
+                print(f"{episode or 'default':<16} {cells}")
+            return 0
+
+        if args.queue_command == "export":
+            from .store import OutputStore, new_run_id
+
+            store = None if args.no_store else OutputStore(config.OUTPUT_STORE_FILE)
+            try:
+                exported = export_queue(queue, store, new_run_id(), args.seed)
+            finally:
+                if store is not None:
+                    store.close()
+            print(f"✅ Đã export {exported} tập từ {args.queue}.")
+            return 0
+    finally:
+        queue.close()
+    return 1
+
+
+def cmd_watch(args):
+    from .watch import run_watch
+
+    run_watch(args)
+    return 0
+
+
+def cmd_bench(args):
+    from .bench import run_bench
+
+    rows = run_bench(args)
+    return 0 if all(r["output_lines"] == r["scenes"] for r in rows) else 1
+
+
+# ==============================
+# ARGPARSE
+# ==============================
+
+def add_generate_args(parser):
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help=f"Số request chạy song song (mặc định: số API key x {config.REQUESTS_PER_KEY}). 1 = chạy tuần tự.",
+    )
+    parser.add_argument(
+        "--window", type=int, default=config.REORDER_WINDOW,
+        help="Số cảnh tối đa đã gửi nhưng chưa ghi ra file (mặc định: %(default)s).",
+    )
+    parser.add_argument(
+        "--batch", type=int, default=config.BATCH_SIZE,
+        help="Gộp N cảnh vào 1 request, mỗi cảnh 1 dòng JSON (mặc định: %(default)s = tắt).",
+    )
+    parser.add_argument(
+        "--context-cache", action="store_true",
+        help=f"Cache phần prompt tĩnh trên server Gemini (TTL {config.CONTEXT_CACHE_TTL}s / key), mỗi request chỉ gửi phần cảnh.",
+    )
+    parser.add_argument(
+        "--tiers", nargs="?", const=config.MODEL_TIERS_FILE, default=None, metavar="FILE",
+        help=f"Model theo tầng: thử model nhanh trước, dòng không qua validate mới lên tầng sau "
+             f"(file JSON, mặc định {config.MODEL_TIERS_FILE}; bỏ --batch / --context-cache).",
+    )
+    parser.add_argument(
+        "--full-char-dict", action="store_true",
+        help="Gửi cả character dictionary trong mọi prompt (mặc định chỉ gửi nhân vật có mặt trong cảnh; --context-cache luôn gửi đủ).",
+    )
+    parser.add_argument(
+        "--stream", action="store_true",
+        help="Đọc response theo từng chunk: dừng sớm response chắc chắn hỏng, xong cảnh ngay khi JSON đóng, ghi time-to-first-token.",
+    )
+    parser.add_argument(
+        "--dedup", choices=config.DEDUP_POLICIES, default=config.DEDUP_POLICY,
+        help="Cảnh trùng cảnh trước: off | exact = chỉ dùng lại cảnh trùng hẳn | reuse = dùng lại cả cảnh gần trùng "
+             "| seed = cảnh gần trùng vẫn sinh, kèm kết quả cảnh gốc làm mẫu (mặc định: %(default)s).",
+    )
+    add_dedup_threshold_arg(parser)
+    parser.add_argument("--no-cache", action="store_true", help="Không đọc / ghi cache response.")
+    parser.add_argument("--refresh", action="store_true", help="Bỏ qua cache, gọi lại Gemini và ghi đè cache.")
+    parser.add_argument("--cache-dir", default=config.CACHE_DIR, help="Thư mục cache (mặc định: %(default)s).")
+    parser.add_argument(
+        "--scenes", default=None, metavar="A-B",
+        help="Chỉ chạy các cảnh có số trong khoảng, vd 40-60 hoặc 42. Kết quả được gộp vào journal/output hiện có.",
+    )
+    parser.add_argument(
+        "--regen", type=int, default=config.REGEN_ATTEMPTS,
+        help="Số lượt gửi lại các cảnh có JSON hỏng không sửa được / sai cấu trúc (mặc định: %(default)s).",
+    )
+    parser.add_argument(
+        "--fix-fields", type=int, default=config.FIELD_FIX_ATTEMPTS,
+        help="Số lượt sửa riêng field sai rule (action_block sai độ dài, thiếu dialogue), 0 = tắt (mặc định: %(default)s).",
+    )
+    parser.add_argument(
+        "--no-store", action="store_true",
+        help=f"Không lưu run này vào kho output có version ({config.OUTPUT_STORE_FILE}).",
+    )
+    parser.add_argument(
+        "--no-metrics", action="store_true",
+        help="Không ghi OUTPUT_FILE.metrics.json / OUTPUT_FILE.prom cuối run.",
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="Đo thời gian từng bước (API, sửa JSON, journal, hậu xử lý...) và in ra cuối run.",
+    )
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="Chạy tiếp lần trước: bỏ qua các cảnh đã có trong journal (OUTPUT_FILE.journal).",
+    )
+
+
+def add_dedup_threshold_arg(parser):
+    parser.add_argument(
+        "--dedup-threshold", type=float, default=config.DEDUP_THRESHOLD,
+        help="Độ giống (Jaccard shingle 0..1) tối thiểu để coi 2 cảnh là gần trùng (mặc định: %(default)s).",
+    )
+
+
+def add_seed_arg(parser):
+    parser.add_argument(
+        "--seed", type=int, default=config.PLAN_SEED,
+        help="Seed kế hoạch camera / shot_type: cùng seed + cùng output model → cùng kết quả (mặc định: %(default)s).",
+    )
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="tachphai", description="Sinh prompt JSON cho từng cảnh bằng Gemini.")
+    sub = parser.add_subparsers(dest="command")
+
+    p = sub.add_parser("generate", help="Gọi Gemini sinh prompt (mặc định nếu không ghi lệnh).")
+    add_generate_args(p)
+    add_seed_arg(p)
+    p.set_defaults(func=cmd_generate)
+
+    p = sub.add_parser(
+        "episodes",
+        help="Sinh prompt cho nhiều tập trong 1 lần chạy, chung pool request + key.",
+        description="Mỗi thư mục tập: scenes.txt → output_prompts.txt (+ character_dictionary.json / "
+                    "camera_styles.txt riêng nếu có, không thì dùng file chung ở thư mục hiện tại).",
+    )
+    p.add_argument("dirs", nargs="*", help="Các thư mục tập.")
+    p.add_argument("--manifest", default=None, metavar="FILE", help="Manifest JSON liệt kê các tập (xem tachphai/episodes.py).")
+    p.add_argument(
+        "--metrics-file", default=config.EPISODES_METRICS_FILE,
+        help="Tiền tố file metrics của cả run (mặc định: %(default)s → %(default)s.metrics.json / .prom).",
+    )
+    add_generate_args(p)
+    add_seed_arg(p)
+    p.set_defaults(func=cmd_episodes)
+
+    p = sub.add_parser("parse", help="Tách scenes.txt và liệt kê các cảnh (offline).")
+    p.add_argument("scenes_file", nargs="?", default=config.SCENES_FILE)
+    p.add_argument("--scenes", default=None, metavar="A-B", help="Chỉ liệt kê các cảnh trong khoảng.")
+    p.add_argument("--json", action="store_true", help="In mỗi cảnh 1 dòng JSON {scene_number, text}.")
+    p.add_argument("--dups", action="store_true", help="Chỉ liệt kê cảnh trùng / gần trùng cảnh đứng trước.")
+    add_dedup_threshold_arg(p)
+    p.set_defaults(func=cmd_parse)
+
+    p = sub.add_parser("validate", help="Kiểm tra output JSON lines (offline). Exit 1 nếu có lỗi.")
+    p.add_argument("output_file", nargs="?", default=config.OUTPUT_FILE)
+    p.add_argument(
+        "--camera-styles", default=config.CAMERA_STYLES_FILE,
+        help="File camera để kiểm tra camera hợp lệ (mặc định: %(default)s, '' = bỏ qua).",
+    )
+    p.set_defaults(func=cmd_validate)
+
+    p = sub.add_parser("stats", help="Thống kê scenes / output (offline).")
+    p.add_argument("--scenes-file", default=config.SCENES_FILE)
+    p.add_argument("--output-file", default=config.OUTPUT_FILE)
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser("postprocess", help="Chạy lại hậu xử lý trên output có sẵn, không gọi API (offline).")
+    p.add_argument("paths", nargs="*", default=[config.OUTPUT_FILE], help="File output hoặc thư mục chứa chúng.")
+    p.add_argument(
+        "-o", "--output", default=None,
+        help="File / thư mục đích (mặc định: ghi cạnh file gốc với hậu tố .post, không ghi đè file gốc).",
+    )
+    p.add_argument("--pattern", default="output_prompts*.txt", help="Mẫu tên file khi input là thư mục (mặc định: %(default)s).")
+    p.add_argument("--character-dict", default=config.CHARACTER_DICT_FILE)
+    p.add_argument("--camera-styles", default=config.CAMERA_STYLES_FILE)
+    add_seed_arg(p)
+    p.set_defaults(func=cmd_postprocess)
+
+    p = sub.add_parser("store", help="Kho output có version: runs / get / diff / export (offline).")
+    p.add_argument("--store", default=config.OUTPUT_STORE_FILE, help="File kho (mặc định: %(default)s).")
+    p.add_argument(
+        "--episode", default=None,
+        help="Tên tập (lệnh generate thường: default). runs không ghi --episode → mọi tập.",
+    )
+    store_sub = p.add_subparsers(dest="store_command", required=True)
+    sp = store_sub.add_parser("runs", help="Liệt kê các run.")
+    sp = store_sub.add_parser("get", help="In dòng JSON của 1 cảnh.")
+    sp.add_argument("scene", help="Số cảnh.")
+    sp.add_argument("--run", default=None, help="run_id (mặc định: run mới nhất).")
+    sp = store_sub.add_parser("diff", help="So sánh 2 run theo từng cảnh (mặc định: 2 run gần nhất).")
+    sp.add_argument("run_a", nargs="?", default=None)
+    sp.add_argument("run_b", nargs="?", default=None)
+    sp.add_argument("--json", action="store_true")
+    sp = store_sub.add_parser("export", help="Ghi 1 run ra file JSON lines như output_prompts.txt.")
+    sp.add_argument("output", help="File ra.")
+    sp.add_argument("--run", default=None, help="run_id (mặc định: run mới nhất).")
+    p.set_defaults(func=cmd_store)
+
+    p = sub.add_parser(
+        "queue",
+        help="Hàng đợi SQLite cho nhiều worker (nhiều process / nhiều máy chung thư mục).",
+        description="enqueue xếp cảnh vào hàng đợi; mỗi process / máy chạy `queue work` (có thể với --keys riêng) "
+                    "nhận cảnh theo lease; `queue export` ghi kết quả ra output của từng tập.",
+    )
+    p.add_argument("--queue", default=config.QUEUE_FILE, help="File hàng đợi (mặc định: %(default)s).")
+    queue_sub = p.add_subparsers(dest="queue_command", required=True)
+    sp = queue_sub.add_parser("enqueue", help="Xếp cảnh (cảnh mới / đã sửa) vào hàng đợi.")
+    sp.add_argument("dirs", nargs="*", help="Các thư mục tập (không ghi → scenes.txt ở thư mục hiện tại).")
+    sp.add_argument("--manifest", default=None, metavar="FILE", help="Manifest JSON liệt kê các tập.")
+    sp.add_argument("--scenes", default=None, metavar="A-B", help="Chỉ xếp các cảnh trong khoảng.")
+    sp = queue_sub.add_parser("work", help="Nhận cảnh từ hàng đợi và gọi Gemini tới khi hết việc.")
+    sp.add_argument(
+        "--keys", default=None, metavar="SPEC",
+        help='Chỉ dùng 1 phần api_keys.txt: "1-4,7" (key thứ 1..4 và 7) hoặc "K/N" (worker K trong N: key K, K+N, ...).',
+    )
+    sp.add_argument("--worker-id", default=None, help="Tên worker (mặc định: hostname-pid).")
+    sp.add_argument(
+        "--lease", type=float, default=config.QUEUE_LEASE_SECONDS,
+        help="Giây giữ 1 cảnh; worker chết quá hạn này thì cảnh về lại hàng đợi (mặc định: %(default)s).",
+    )
+    sp.add_argument("--claim", type=int, default=None, help="Số cảnh nhận mỗi lượt (mặc định: 2 x --workers).")
+    sp.add_argument("--wait", action="store_true", help="Hết việc vẫn chạy, chờ cảnh mới được xếp vào.")
+    sp.add_argument(
+        "--workers", type=int, default=None,
+        help=f"Số request song song của worker này (mặc định: số key x {config.REQUESTS_PER_KEY}).",
+    )
+    sp.add_argument("--window", type=int, default=config.REORDER_WINDOW, help="Như generate --window.")
+    sp.add_argument("--full-char-dict", action="store_true", help="Như generate --full-char-dict.")
+    sp.add_argument("--stream", action="store_true", help="Như generate --stream.")
+    sp.add_argument("--no-cache", action="store_true", help="Không đọc / ghi cache response.")
+    sp.add_argument("--refresh", action="store_true", help="Bỏ qua cache, gọi lại Gemini và ghi đè cache.")
+    sp.add_argument("--cache-dir", default=config.CACHE_DIR, help="Thư mục cache (mặc định: %(default)s).")
+    sp.add_argument("--no-metrics", action="store_true", help="Không ghi QUEUE.<worker>.metrics.json / .prom.")
+    sp.add_argument("--profile", action="store_true", help="Đo thời gian từng bước và in ra cuối run.")
+    add_seed_arg(sp)
+    sp = queue_sub.add_parser("status", help="Số cảnh theo trạng thái của từng tập.")
+    sp.add_argument("--json", action="store_true")
+    sp = queue_sub.add_parser("export", help="Ghi các cảnh đã xong ra output của từng tập (hậu xử lý như generate).")
+    sp.add_argument(
+        "--no-store", action="store_true",
+        help=f"Không lưu bản export vào kho output có version ({config.OUTPUT_STORE_FILE}).",
+    )
+    add_seed_arg(sp)
+    p.set_defaults(func=cmd_queue)
+
+    p = sub.add_parser(
+        "watch",
+        help="Theo dõi scenes / dictionary / camera, chỉ sinh lại cảnh mới / sửa / có nhân vật đổi.",
+        description="Chạy tới khi Ctrl+C. Luôn làm tiếp journal (như --resume); output ghi đè tại chỗ sau mỗi lần sửa.",
+    )
+    p.add_argument(
+        "--interval", type=float, default=config.WATCH_INTERVAL_SECONDS,
+        help="Giây giữa 2 lần kiểm tra file (mặc định: %(default)s).",
+    )
+    p.add_argument(
+        "--debounce", type=float, default=config.WATCH_DEBOUNCE_SECONDS,
+        help="File phải đứng yên bấy nhiêu giây mới chạy (mặc định: %(default)s).",
+    )
+    p.add_argument(
+        "--workers", type=int, default=None,
+        help=f"Số request song song (mặc định: số API key x {config.REQUESTS_PER_KEY}).",
+    )
+    p.add_argument("--window", type=int, default=config.REORDER_WINDOW, help="Như generate --window.")
+    p.add_argument("--batch", type=int, default=config.BATCH_SIZE, help="Như generate --batch.")
+    p.add_argument("--full-char-dict", action="store_true", help="Như generate --full-char-dict (sửa 1 nhân vật → sinh lại mọi cảnh).")
+    p.add_argument("--stream", action="store_true", help="Như generate --stream.")
+    p.add_argument("--dedup", choices=config.DEDUP_POLICIES, default=config.DEDUP_POLICY, help="Như generate --dedup.")
+    add_dedup_threshold_arg(p)
+    p.add_argument("--regen", type=int, default=config.REGEN_ATTEMPTS, help="Như generate --regen.")
+    p.add_argument("--fix-fields", type=int, default=config.FIELD_FIX_ATTEMPTS, help="Như generate --fix-fields.")
+    p.add_argument("--no-cache", action="store_true", help="Không đọc / ghi cache response.")
+    p.add_argument("--refresh", action="store_true", help="Bỏ qua cache, gọi lại Gemini và ghi đè cache.")
+    p.add_argument("--cache-dir", default=config.CACHE_DIR, help="Thư mục cache (mặc định: %(default)s).")
+    add_seed_arg(p)
+    p.set_defaults(func=cmd_watch)
+
+    p = sub.add_parser("bench", help="Benchmark generate với server Gemini giả (không tốn quota).")
+    p.add_argument("--sizes", default="10,100,1000", help="Các kích thước (số cảnh), cách nhau dấu phẩy (mặc định: %(default)s).")
+    p.add_argument(
+        "--latency", default="lognormal:300:0.5",
+        help="Phân bố latency server giả, ms: const:MS | uniform:LO:HI | lognormal:MEDIAN:SIGMA (mặc định: %(default)s).",
+    )
+    p.add_argument("--rate-429", type=float, default=0.0, help="Tỉ lệ request trả 429.")
+    p.add_argument("--rate-500", type=float, default=0.0, help="Tỉ lệ request trả 500.")
+    p.add_argument("--rate-malformed", type=float, default=0.0, help="Tỉ lệ response JSON hỏng (2/5 kiểu sửa được, 3/5 phải gọi lại).")
+    p.add_argument("--keys", type=int, default=4, help="Số API key giả (mặc định: %(default)s).")
+    p.add_argument("--bad-keys", type=int, default=0, help="Thêm N key giả luôn bị từ chối (400 API key not valid).")
+    p.add_argument("--workers", type=int, default=None, help="Truyền xuống generate --workers.")
+    p.add_argument("--cooldown", type=float, default=1.0, help="Giây nghỉ của key sau 429 trong lúc bench (mặc định: %(default)s).")
+    p.add_argument("--generate-args", default="", help='Flag thêm cho generate, vd "--batch 5 --context-cache".')
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--json", default=None, metavar="FILE", help="Ghi kết quả ra file JSON.")
+    p.add_argument("--verbose", action="store_true", help="Hiện log của generate.")
+    p.set_defaults(func=cmd_bench)
+
+    return parser
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    # Tương thích cách chạy cũ: không ghi lệnh (hoặc chỉ có flag) → generate
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ("-h", "--help")):
+        argv.insert(0, "generate")
+
+    args = build_parser().parse_args(argv)
+    return args.func(args)
@@ -0,0 +1,96 @@
+"""Cấu hình mặc định (tên file, model, quota, cache...). Các lệnh CLI có thể ghi đè."""
+
+import os
+
+# ==============================
+# CẤU HÌNH TÊN FILE
+# ==============================
+
+API_KEYS_FILE = "api_keys.txt"                     # Mỗi dòng 1 API key
+SCENES_FILE = "scenes.txt"                         # Danh sách scene
+OUTPUT_FILE = "output_prompts.txt"                 # Kết quả JSON lines
+CHARACTER_DICT_FILE = "character_dictionary.json"  # Dictionary nhân vật
+CAMERA_STYLES_FILE = "camera_styles.txt"           # Danh sách camera cinematic
+
+MODEL_NAME = "models/gemini-2.5-flash"
+
+# Model theo tầng (--tiers, xem tachphai/tiers.py): thử model nhanh / rẻ trước, không đạt validate mới lên tầng sau
+MODEL_TIERS_FILE = "model_tiers.json"
+
+# Endpoint thay thế (vd server giả lập local "http://127.0.0.1:8080"), None = API thật của Google
+API_ENDPOINT = os.environ.get("GEMINI_API_ENDPOINT")
+
+# Context caching: đăng ký phần prompt tĩnh (rule + dictionary + camera) 1 lần / key, sống CONTEXT_CACHE_TTL giây
+CONTEXT_CACHE_TTL = 3600
+
+# Cache response theo hash(model + prompt đã ghép đầy đủ)
+CACHE_DIR = ".prompt_cache"
+CACHE_MAX_AGE_DAYS = 30        # entry cũ hơn thì xoá
+CACHE_MAX_MB = 200             # vượt dung lượng thì xoá entry ít dùng nhất
+
+# Chạy song song: mặc định mỗi API key giữ REQUESTS_PER_KEY request đang bay.
+# REORDER_WINDOW = số cảnh tối đa đã gửi nhưng chưa ghi ra file (chặn bộ nhớ).
+REQUESTS_PER_KEY = 1
+REORDER_WINDOW = 32
+
+# Retry khi gọi Gemini (tachphai/retry.py)
+RETRY_MAX_ATTEMPTS = 6         # số lần thử tối đa cho 1 request (tính trên mọi key)
+RETRY_BACKOFF_BASE = 1.0       # giây; lỗi tạm thời lần n chờ random(0, base * 2^(n-1))
+RETRY_BACKOFF_CAP = 30.0       # trần thời gian chờ 1 lần backoff
+BREAKER_FAILURES = 3           # key lỗi tạm thời liên tiếp bấy nhiêu lần → ngắt mạch (tạm bỏ key)
+BREAKER_OPEN_SECONDS = 30      # thời gian ngắt lần đầu; lần sau gấp đôi ...
+BREAKER_MAX_OPEN_SECONDS = 300 # ... tối đa bấy nhiêu giây
+
+# --stream: đọc response theo từng chunk, dừng sớm khi chắc chắn hỏng (tachphai/streamjson.py)
+STREAM_MAX_PROSE_CHARS = 200     # chữ thừa ngoài JSON quá bấy nhiêu ký tự → dừng
+STREAM_MAX_OBJECT_CHARS = 12000  # 1 cảnh dài quá bấy nhiêu ký tự → model đang lặp, dừng
+STREAM_MAX_DEPTH = 8             # JSON lồng quá sâu → dừng
+
+# Kế hoạch camera / shot_type cho cả chuỗi cảnh (tachphai/planner.py)
+PLAN_SEED = 0                  # cùng seed + cùng output model → cùng kết quả
+CAMERA_WINDOW = 3              # camera không lặp lại trong N cảnh liên tiếp
+SHOT_WINDOW = 4                # trong N cảnh liên tiếp ...
+SHOT_MAX_IN_WINDOW = 2         # ... 1 shot_type xuất hiện tối đa bấy nhiêu lần
+
+# Dòng JSON hỏng không sửa được / sai cấu trúc → gửi lại tối đa bấy nhiêu lượt (0 = không gửi lại)
+REGEN_ATTEMPTS = 2
+
+# Field sai rule (action_block ngoài 150-200 từ, thiếu dialogue) → request nhỏ sửa riêng field, tối đa bấy nhiêu lượt
+FIELD_FIX_ATTEMPTS = 2
+
+# Cảnh trùng / gần trùng (tachphai/dedup.py). Policy: off | exact (chỉ dùng lại cảnh trùng hẳn)
+# | reuse (dùng lại cả cảnh gần trùng) | seed (cảnh gần trùng vẫn gửi, kèm kết quả cảnh gốc làm mẫu)
+DEDUP_POLICIES = ("off", "exact", "reuse", "seed")
+DEDUP_POLICY = "off"           # dedup là tuỳ chọn: --dedup exact / reuse / seed mới đổi output
+DEDUP_THRESHOLD = 0.85         # Jaccard shingle tối thiểu để coi là gần trùng
+DEDUP_SHINGLE_WORDS = 3        # shingle = bấy nhiêu từ liên tiếp
+DEDUP_MINHASH_BINS = 32        # số ngăn MinHash ...
+DEDUP_BAND_ROWS = 2            # ... chia band bấy nhiêu ngăn để tìm ứng viên (LSH)
+
+# Hàng đợi công việc nhiều process / nhiều máy (tachphai/workqueue.py, lệnh `queue`)
+QUEUE_FILE = "work_queue.sqlite3"
+QUEUE_LEASE_SECONDS = 300      # worker giữ task tối đa bấy nhiêu giây không gia hạn → task được nhận lại
+QUEUE_POLL_SECONDS = 1         # hàng đợi tạm hết task (worker khác đang giữ) → chờ bấy nhiêu giây rồi nhận tiếp
+QUEUE_MAX_ATTEMPTS = 4         # 1 cảnh lỗi / hỏng quá bấy nhiêu lần thì thôi (failed / giữ dòng hỏng)
+QUEUE_BUSY_TIMEOUT = 30        # giây chờ khi process khác đang ghi file hàng đợi
+
+# Lệnh watch (tachphai/watch.py)
+WATCH_INTERVAL_SECONDS = 1.0   # bao lâu kiểm tra file input 1 lần
+WATCH_DEBOUNCE_SECONDS = 0.5   # file phải đứng yên bấy nhiêu giây mới chạy (editor ghi nhiều bước)
+
+# Kho output có version (tachphai/store.py): mỗi run ghi thêm 1 bản, lấy từng cảnh / so sánh / export lại
+OUTPUT_STORE_FILE = "output_store.sqlite3"
+
+# Số liệu cuối run: OUTPUT_FILE + hậu tố (JSON summary + Prometheus text)
+METRICS_JSON_SUFFIX = ".metrics.json"
+METRICS_PROM_SUFFIX = ".prom"
+EPISODES_METRICS_FILE = "episodes"  # lệnh episodes: metrics chung của cả run → episodes.metrics.json / episodes.prom
+
+# Gộp N cảnh vào 1 request (phần rule + dictionary + camera chỉ gửi 1 lần cho N cảnh). 1 = tắt.
+BATCH_SIZE = 1
+
+# Quota mặc định cho mỗi key (có thể ghi đè từng key trong api_keys.txt, vd: "AIza... rpm=15 tpm=1000000")
+KEY_RPM = 10                   # request / phút
+KEY_TPM = 250_000              # token / phút
+KEY_COOLDOWN_SECONDS = 60      # key dính 429 thì nghỉ bấy nhiêu giây
+EXPECTED_OUTPUT_TOKENS = 600   # ước lượng token output 1 cảnh (để trừ TPM trước khi gọi)
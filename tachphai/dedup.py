@@ -0,0 +1,129 @@
+"""
+Tìm cảnh trùng / gần trùng trước khi gửi Gemini (bản nháp export lại, cùng 1 beat viết 2 lần...).
+
+  - Chuẩn hoá: bỏ tiêu đề "Scene N:", chữ thường, bỏ dấu câu, gộp khoảng trắng
+  - Trùng hẳn: cùng hash văn bản đã chuẩn hoá
+  - Gần trùng: Jaccard của tập shingle (DEDUP_SHINGLE_WORDS từ liên tiếp) >= ngưỡng.
+    Ứng viên tìm bằng MinHash 1 hoán vị (DEDUP_MINHASH_BINS ngăn) + LSH theo band,
+    rồi tính Jaccard thật trên tập hash shingle → không so từng cặp cảnh.
+
+Mỗi cảnh chỉ so với các cảnh "đại diện" đứng trước nó (cảnh không trùng ai), nên cảnh trùng
+luôn trỏ tới 1 cảnh gốc thật sự giống nó, không nối chuỗi A ≈ B ≈ C.
+"""
+
+import hashlib
+import re
+from collections import defaultdict
+
+from . import jsoncodec
+from .config import DEDUP_BAND_ROWS, DEDUP_MINHASH_BINS, DEDUP_SHINGLE_WORDS
+from .repair import parse_lenient
+from .scenes import scene_number_of
+
+HEADER_RE = re.compile(r"^\s*scene\s*\d+\s*[:.\-–—]?", re.I)
+NON_WORD_RE = re.compile(r"[\W_]+")
+
+
+def normalize_scene_text(scene: str) -> str:
+    text = HEADER_RE.sub("", scene, count=1).lower()
+    return NON_WORD_RE.sub(" ", text).strip()
+
+
+def hash64(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def shingle_hashes(words: list, k: int = DEDUP_SHINGLE_WORDS) -> frozenset:
+    if len(words) <= k:
+        return frozenset([hash64(" ".join(words))]) if words else frozenset()
+    return frozenset(hash64(" ".join(words[i:i + k])) for i in range(len(words) - k + 1))
+
+
+def minhash_bins(hashes, bins: int = DEDUP_MINHASH_BINS) -> list:
+    """MinHash 1 hoán vị: hash rơi vào ngăn h % bins, mỗi ngăn giữ giá trị nhỏ nhất (ngăn rỗng = None)."""
+    sig = [None] * bins
+    for h in hashes:
+        b = h % bins
+        v = h // bins
+        if sig[b] is None or v < sig[b]:
+            sig[b] = v
+    return sig
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class DuplicateIndex:
+    """Index các cảnh đại diện: tra cảnh trùng hẳn (hash) và gần trùng (LSH + Jaccard)."""
+
+    def __init__(self, threshold: float, near: bool = True, band_rows: int = DEDUP_BAND_ROWS):
+        self.threshold = threshold
+        self.near = near
+        self.band_rows = band_rows
+        self.exact = {}                    # hash văn bản chuẩn hoá → (scene_number đại diện, độ giống)
+        self.shingles = {}                 # scene_number → tập hash shingle
+        self.buckets = defaultdict(list)   # (band, giá trị band) → [scene_number]
+
+    def bands(self, sig: list):
+        for start in range(0, len(sig), self.band_rows):
+            band = tuple(sig[start:start + self.band_rows])
+            if None not in band:
+                yield start, band
+
+    def add_or_match(self, num: str, text: str):
+        """(scene_number đại diện, độ giống) hoặc None; không trùng thì text thành đại diện mới."""
+        key = hash64(text)
+        if key in self.exact:
+            return self.exact[key]
+        self.exact[key] = (num, 1.0)
+        if not self.near:
+            return None
+
+        hashes = shingle_hashes(text.split())
+        sig = minhash_bins(hashes)
+        best, best_sim = None, 0.0
+        seen = set()
+        for band in self.bands(sig):
+            for other in self.buckets.get(band, ()):
+                if other in seen:
+                    continue
+                seen.add(other)
+                sim = jaccard(hashes, self.shingles[other])
+                if sim > best_sim:
+                    best, best_sim = other, sim
+        if best is not None and best_sim >= self.threshold:
+            # Cảnh gần trùng không thành đại diện; bản trùng hẳn của nó trỏ về cùng đại diện
+            self.exact[key] = (best, best_sim)
+            return best, best_sim
+
+        self.shingles[num] = hashes
+        for band in self.bands(sig):
+            self.buckets[band].append(num)
+        return None
+
+
+def find_duplicates(scenes, threshold: float, near: bool = True) -> dict:
+    """
+    {scene_number: (scene_number đại diện đứng trước, độ giống 0..1)} cho mọi cảnh trùng / gần trùng.
+    near=False: chỉ tìm cảnh trùng hẳn sau chuẩn hoá.
+    """
+    index = DuplicateIndex(threshold, near)
+    duplicates = {}
+    for scene in scenes:
+        num = scene_number_of(scene)
+        match = index.add_or_match(num, normalize_scene_text(scene))
+        if match is not None and match[0] != num:
+            duplicates[num] = match
+    return duplicates
+
+
+def renumber_line(line: str, scene_number: str) -> str:
+    """Dòng JSON của cảnh đại diện → dùng cho cảnh trùng: đổi scene_number, giữ nguyên phần còn lại."""
+    data, _ = parse_lenient(line)
+    if not isinstance(data, dict):
+        return line
+    data["scene_number"] = int(scene_number) if scene_number.isdigit() else scene_number
+    return jsoncodec.dumps(data)
@@ -0,0 +1,269 @@
+"""
+Nhiều tập phim trong 1 lần chạy: mỗi tập có scenes / character dictionary / camera styles / output riêng,
+nhưng mọi cảnh của mọi tập đi chung 1 pool request và 1 scheduler API key (runner.run_episodes).
+
+Lệnh generate thường = 1 tập dùng các file mặc định trong config.
+"""
+
+import json
+from pathlib import Path
+
+from . import config
+from .cache import ResponseCache
+from .charmatch import CharacterMatcher
+from .dedup import find_duplicates
+from .journal import ProgressJournal
+from .postprocess import Postprocessor
+from .prompts import build_camera_list_str, build_char_dict_str, build_prompt, build_seeded_prompt
+from .resources import load_camera_styles, load_character_dictionary
+from .retry import is_terminal_line
+from .scenes import load_scene_range, load_scenes, parse_scene_range, scene_hash, scene_number_of
+from .validate import line_errors
+
+
+class Episode:
+    """
+    1 tập: đường dẫn file + trạng thái của tập trong 1 run (cảnh đã chọn, journal, hậu xử lý, tiến độ).
+    name = "" → không in tiền tố [tên tập] trong log (lệnh generate thường).
+    """
+
+    def __init__(self, name: str, scenes_file: str, output_file: str,
+                 character_dict_file: str = config.CHARACTER_DICT_FILE,
+                 camera_styles_file: str = config.CAMERA_STYLES_FILE):
+        self.name = name
+        self.scenes_file = str(scenes_file)
+        self.output_file = str(output_file)
+        self.character_dict_file = str(character_dict_file)
+        self.camera_styles_file = str(camera_styles_file)
+
+        self.selected = []
+        self.todo = []
+        self.duplicates = {}
+        self.dup_todo = []
+        self.dup_exact = 0
+        self.seeds = {}
+        self.done = {}
+        self.range_mode = False
+        self.finished = 0
+        self.post = None
+        self.journal = None
+        self.character_dict = {}
+        self.matcher = None
+        self.char_dict_str = ""
+        self.char_dict_subsets = {}
+        self.camera_list_str = ""
+
+    @property
+    def tag(self) -> str:
+        return f"[{self.name}] " if self.name else ""
+
+    @property
+    def store_key(self) -> str:
+        """Tên tập trong OutputStore (lệnh generate thường → "default")."""
+        return self.name or "default"
+
+    def load(self, scene_range: str = None, resume: bool = False, seed: int = config.PLAN_SEED,
+             subset_characters: bool = True, dedup: str = config.DEDUP_POLICY,
+             dedup_threshold: float = config.DEDUP_THRESHOLD):
+        """
+        Đọc cảnh (theo --scenes nếu có), tài nguyên, journal cũ (--resume) → self.todo.
+        subset_characters: mỗi prompt chỉ gửi các nhân vật có mặt trong cảnh (char_dict_for).
+        dedup != "off": cảnh trùng / gần trùng 1 cảnh đứng trước → self.dup_todo
+        (runner.fill_duplicates xử lý sau khi cảnh gốc đã có kết quả).
+        """
+        self.load_scenes(scene_range)
+        self.load_resources(seed, subset_characters)
+
+        self.journal = ProgressJournal(self.output_file + ".journal")
+        old = self.journal.load() if (resume or self.range_mode) else {}
+        self.done = {}
+        if resume:
+            for scene in self.selected:
+                entry = old.get(scene_number_of(scene))
+                # Dòng hỏng (không sửa được / sai cấu trúc) từ lần trước thì chạy lại,
+                # trừ cảnh bị chặn / prompt không hợp lệ: cảnh chưa sửa thì gửi lại cũng lỗi y hệt
+                if entry and entry[0] == scene_hash(scene) and (not line_errors(entry[1]) or is_terminal_line(entry[1])):
+                    self.done[scene_number_of(scene)] = entry[1]
+            print(f"♻️ {self.tag}Resume: {len(self.done)}/{len(self.selected)} cảnh đã xong từ lần chạy trước.")
+        elif self.journal.path.exists() and not self.range_mode:
+            print(f"ℹ️ {self.tag}Bắt đầu journal mới ({self.journal.path}). Dùng --resume để chạy tiếp lần trước.")
+
+        self.duplicates = {}
+        if dedup != "off":
+            self.duplicates = find_duplicates(self.selected, dedup_threshold, near=dedup != "exact")
+        self.plan_todo()
+        self.seeds = {}
+        if self.dup_todo:
+            print(f"🔁 {self.tag}{len(self.dup_todo)} cảnh trùng cảnh trước (trùng hẳn {self.dup_exact}, "
+                  f"gần trùng {len(self.dup_todo) - self.dup_exact}) → dedup = {dedup}.")
+        self.finished = 0
+        return self
+
+    def plan_todo(self):
+        """self.selected - self.done → self.todo (sinh ngay) + self.dup_todo (cảnh trùng, xử lý sau cảnh gốc)."""
+        todo = [scene for scene in self.selected if scene_number_of(scene) not in self.done]
+        self.todo = [scene for scene in todo if scene_number_of(scene) not in self.duplicates]
+        self.dup_todo = [scene for scene in todo if scene_number_of(scene) in self.duplicates]
+        self.dup_exact = sum(1 for scene in self.dup_todo if self.duplicates[scene_number_of(scene)][1] >= 1.0)
+
+    def load_scenes(self, scene_range: str = None) -> list:
+        """Cảnh của tập (chỉ khoảng --scenes nếu có) → self.selected."""
+        self.range_mode = scene_range is not None
+        if self.range_mode:
+            lo, hi = parse_scene_range(scene_range)
+            self.selected = load_scene_range(self.scenes_file, lo, hi)
+            print(f"🎯 {self.tag}Chỉ chạy {len(self.selected)} cảnh trong khoảng {lo}-{hi}.")
+        else:
+            self.selected = load_scenes(self.scenes_file)
+            print(f"📚 {self.tag}Đã nạp {len(self.selected)} cảnh từ {self.scenes_file}")
+        return self.selected
+
+    def load_resources(self, seed: int = config.PLAN_SEED, subset_characters: bool = True):
+        """Character dictionary + camera styles → chuỗi cho prompt và bộ hậu xử lý (không đọc cảnh)."""
+        character_dict = load_character_dictionary(self.character_dict_file)
+        camera_styles = load_camera_styles(self.camera_styles_file)
+        self.post = Postprocessor(character_dict, camera_styles, seed)
+        self.character_dict = character_dict
+        self.char_dict_str = build_char_dict_str(character_dict)
+        self.char_dict_subsets = {}
+        self.matcher = None
+        if subset_characters and len(character_dict) > 1:
+            self.matcher = CharacterMatcher(character_dict)
+            print(f"👥 {self.tag}Lọc nhân vật theo cảnh ({self.matcher.pattern_count} tên / alias).")
+        self.camera_list_str = build_camera_list_str(camera_styles)
+        return self
+
+    @property
+    def planned(self) -> int:
+        """Số cảnh phải xong trong run này (kể cả cảnh trùng lấy lại kết quả)."""
+        return len(self.todo) + len(self.dup_todo)
+
+    def char_dict_for(self, scenes) -> str:
+        """CHAR_DICT chỉ gồm nhân vật xuất hiện trong các cảnh; không khớp ai → cả dictionary."""
+        if self.matcher is None:
+            return self.char_dict_str
+        names = set()
+        for scene in scenes:
+            names |= self.matcher.names_in(scene)
+        if not names:
+            return self.char_dict_str
+        key = frozenset(names)
+        text = self.char_dict_subsets.get(key)
+        if text is None:
+            text = build_char_dict_str({n: info for n, info in self.character_dict.items() if n in names})
+            self.char_dict_subsets[key] = text
+        return text
+
+    def prompt(self, scene: str) -> str:
+        prompt = build_prompt(scene, self.char_dict_for([scene]), self.camera_list_str)
+        reference = self.seeds.get(scene_number_of(scene))
+        return build_seeded_prompt(prompt, reference) if reference else prompt
+
+    def open_journal(self, resume: bool):
+        # Chạy theo khoảng: giữ nguyên journal cũ, append kết quả mới
+        self.journal.open(resume=resume or self.range_mode)
+
+    def export(self, store=None, run_id: str = None, seed: int = None, started_at: float = None,
+               model: str = config.MODEL_NAME) -> int:
+        """
+        Journal → output_file, hậu xử lý 1 lượt theo thứ tự cảnh.
+        store: OutputStore → ghi thêm bản này thành 1 run (run_id) của tập, kèm model đã dùng.
+        """
+        keep = None if self.range_mode else {scene_number_of(scene) for scene in self.selected}
+        rows = []
+        scenes = {scene_number_of(scene): scene for scene in self.selected} if store is not None else {}
+
+        def collect(num, scene_hash_, line):
+            # Cảnh ngoài --scenes lần này (vẫn nằm trong journal) không có prompt để hash
+            scene = scenes.get(num)
+            prompt_hash = ResponseCache.make_key(self.prompt(scene)) if scene is not None else None
+            rows.append((num, line, prompt_hash, scene_hash_))
+
+        total = self.journal.export(self.output_file, self.post.postprocess_lines, keep,
+                                    collect if store is not None else None)
+        planner = self.post.planner
+        print(f"🧩 {self.tag}Đã ghi journal → {self.output_file} ({total} cảnh, giữ {planner.kept} / đổi {planner.changed} camera-shot).")
+        if store is not None:
+            store.record_run(run_id, self.store_key, rows, seed, self.output_file, started_at, model)
+            print(f"🗄️ {self.tag}Lưu run {run_id} vào {store.path}.")
+        return total
+
+
+# ==============================
+# DANH SÁCH TẬP: THƯ MỤC / MANIFEST
+# ==============================
+
+def pick_file(folder: Path, value, default_name: str, fallback) -> str:
+    """
+    Đường dẫn file cho 1 tập: value ghi rõ (tương đối theo thư mục tập) → dùng luôn;
+    không ghi thì lấy default_name trong thư mục tập nếu có, không có thì dùng file chung (fallback).
+    """
+    if value:
+        return str(folder / value)
+    own = folder / default_name
+    return str(own) if own.exists() or fallback is None else str(fallback)
+
+
+def episode_from_dir(folder, name: str = None, scenes: str = None, output: str = None,
+                     character_dictionary: str = None, camera_styles: str = None, defaults: dict = None) -> Episode:
+    """
+    1 thư mục tập: <dir>/scenes.txt → <dir>/output_prompts.txt.
+    character_dictionary.json / camera_styles.txt trong thư mục tập nếu có, không thì dùng file chung.
+    """
+    folder = Path(folder)
+    defaults = defaults or {}
+    return Episode(
+        name=name or folder.name or str(folder),
+        scenes_file=pick_file(folder, scenes, config.SCENES_FILE, None),
+        output_file=pick_file(folder, output, config.OUTPUT_FILE, None),
+        character_dict_file=pick_file(folder, character_dictionary, config.CHARACTER_DICT_FILE,
+                                      defaults.get("character_dictionary", config.CHARACTER_DICT_FILE)),
+        camera_styles_file=pick_file(folder, camera_styles, config.CAMERA_STYLES_FILE,
+                                     defaults.get("camera_styles", config.CAMERA_STYLES_FILE)),
+    )
+
+
+def load_manifest(path: str) -> list:
+    """
+    Manifest JSON, đường dẫn tương đối tính từ thư mục chứa manifest:
+        {
+          "defaults": {"character_dictionary": "chung/character_dictionary.json", "camera_styles": "chung/camera_styles.txt"},
+          "episodes": [
+            "tap01",
+            {"dir": "tap02", "name": "Tập 2", "scenes": "scenes_v2.txt", "output": "out.txt"}
+          ]
+        }
+    hoặc chỉ list "episodes".
+    """
+    p = Path(path)
+    data = json.loads(p.read_text(encoding="utf-8"))
+    base = p.parent
+    if isinstance(data, list):
+        data = {"episodes": data}
+
+    defaults = {k: str(base / v) for k, v in (data.get("defaults") or {}).items()}
+    episodes = []
+    for entry in data.get("episodes") or []:
+        if isinstance(entry, str):
+            entry = {"dir": entry}
+        entry = dict(entry)
+        folder = base / entry.pop("dir", ".")
+        episodes.append(episode_from_dir(folder, defaults=defaults, **entry))
+    return episodes
+
+
+def collect_episodes(dirs, manifest: str = None) -> list:
+    """Các tập từ manifest + các thư mục ghi trên dòng lệnh. Trùng tên / trùng file output → ValueError."""
+    episodes = load_manifest(manifest) if manifest else []
+    episodes += [episode_from_dir(d) for d in dirs]
+
+    seen_names, seen_outputs = set(), set()
+    for ep in episodes:
+        out = Path(ep.output_file).resolve()
+        if ep.name in seen_names:
+            raise ValueError(f"Trùng tên tập: {ep.name}")
+        if out in seen_outputs:
+            raise ValueError(f"2 tập ghi chung 1 file output: {ep.output_file}")
+        seen_names.add(ep.name)
+        seen_outputs.add(out)
+    return episodes
@@ -0,0 +1,271 @@
+"""
+Server giả lập endpoint Gemini (REST v1beta) chạy local, để đo pipeline mà không tốn quota.
+
+Hỗ trợ:
+  POST /v1beta/models/<model>:generateContent  → JSON hợp lệ cho mọi "Scene <n>" trong prompt
+                                                 (1 cảnh, batch, hoặc prompt sửa field)
+  POST /v1beta/models/<model>:streamGenerateContent  → như trên nhưng trả về từng chunk
+                                                 (mảng JSON stream như REST API thật)
+  POST /v1beta/cachedContents, DELETE /v1beta/cachedContents/<id>  → cho --context-cache
+                                                 (request gửi cachedContent chưa tạo / đã xoá → 404 như API thật)
+
+Cấu hình: phân bố latency, tỉ lệ 429 (kèm retryDelay như API thật) / 500, tỉ lệ response JSON hỏng.
+Key có chữ "invalid" (vd bench-invalid-key-1) luôn bị từ chối bằng 400 API_KEY_INVALID như API thật.
+Chỉ dùng thư viện chuẩn; không import google.
+"""
+
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+SCENE_RE = re.compile(r"Scene\s+(\d+)")
+PROMPT_MARKERS = ("SCENES TO PROCESS:", "SCENE TO PROCESS:", "SCENE TEXT:")
+ACTION_WORDS = 170
+STREAM_CHUNK_CHARS = 200   # mỗi chunk stream ~ bấy nhiêu ký tự text
+STREAM_FIRST_SHARE = 0.2   # stream: chunk đầu tới sau 20% latency, phần còn lại rải đều cho các chunk
+
+# Kiểu hỏng khi tiêm malformed JSON: 2 kiểu đầu repair.py sửa được, 3 kiểu sau phải gọi lại
+# (rambling = model lan man cả đoạn dài không có JSON; --stream dừng được sớm)
+MALFORMED_KINDS = ("fenced_prose", "unescaped_quote", "truncated", "garbage", "rambling")
+
+
+def parse_latency(spec: str):
+    """
+    "const:200" | "uniform:100:400" | "lognormal:300:0.5" (đơn vị ms; lognormal = median:sigma)
+    → hàm rng → số giây.
+    """
+    kind, _, rest = spec.partition(":")
+    params = [float(x) for x in rest.split(":") if x]
+    if kind == "const":
+        return lambda rng: params[0] / 1000
+    if kind == "uniform":
+        return lambda rng: rng.uniform(params[0], params[1]) / 1000
+    if kind == "lognormal":
+        mu = math.log(params[0])
+        return lambda rng: rng.lognormvariate(mu, params[1]) / 1000
+    raise ValueError(f"Latency không hợp lệ: {spec!r} (const:MS | uniform:LO:HI | lognormal:MEDIAN:SIGMA)")
+
+
+def fake_scene(num: int) -> dict:
+    words = " ".join(["step"] * ACTION_WORDS)
+    return {
+        "scene_number": num,
+        "scene_title": f"Scene {num}",
+        "character": {"name": "Alex", "appearance": "", "emotions": {"primary": "calm", "secondary": "alert"}, "voice_tone": ""},
+        "setting": {"location": "Forest", "environment": "Mist", "time": "Night"},
+        "cinematic": {
+            "camera": "Dolly in",
+            "shot_type": ("wide", "medium", "close-up")[num % 3],
+            "focus_characters": ["Alex"],
+            "lighting": "Low key",
+            "mood": "Tense",
+            "style": "Cinematic 8K realistic",
+            "effects": "Fog",
+            "sound": "Wind",
+        },
+        "dialogue": {"characters": [{"speaker": "Alex", "line": "Đi thôi."}]},
+        "action_block": {"length": "150-200 words", "content": words},
+    }
+
+
+def fake_fields(prompt: str) -> dict:
+    tasks = prompt.split("TASKS:")[-1]
+    nums = SCENE_RE.findall(prompt.split("SCENE TEXT:")[-1])
+    full = fake_scene(int(nums[0]) if nums else 0)
+    return {field: full[field] for field in ("dialogue", "action_block") if f"- {field}" in tasks}
+
+
+def response_body(text: str, prompt_tokens: int, output_tokens: int) -> dict:
+    return {
+        "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP"}],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": output_tokens,
+            "totalTokenCount": prompt_tokens + output_tokens,
+        },
+    }
+
+
+class FakeGeminiServer:
+    """
+    with FakeGeminiServer(latency="uniform:50:150", rate_429=0.05) as srv:
+        config.API_ENDPOINT = srv.url
+    """
+
+    def __init__(self, latency: str = "const:0", rate_429: float = 0.0, rate_500: float = 0.0,
+                 rate_malformed: float = 0.0, seed: int = 0, port: int = 0, retry_delay: float = 1.0):
+        self.latency = parse_latency(latency)
+        self.rate_429 = rate_429
+        self.rate_500 = rate_500
+        self.rate_malformed = rate_malformed
+        self.retry_delay = retry_delay  # retryDelay gợi ý trong response 429
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.stats = Counter()
+        self.stats_lock = threading.Lock()
+        self.cached = set()  # tên cachedContents/... còn sống
+        self.cache_seq = 0
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self.make_handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def count(self, name: str, n: int = 1):
+        with self.stats_lock:
+            self.stats[name] += n
+
+    def draw(self):
+        """1 lần bốc thăm cho 1 request: (latency giây, kết quả)."""
+        with self.rng_lock:
+            delay = self.latency(self.rng)
+            r = self.rng.random()
+            if r < self.rate_429:
+                return delay, "429"
+            if r < self.rate_429 + self.rate_500:
+                return delay, "500"
+            if self.rng.random() < self.rate_malformed:
+                return delay, self.rng.choice(MALFORMED_KINDS)
+            return delay, "ok"
+
+    def response_text(self, prompt: str, outcome: str) -> str:
+        if "TASKS:" in prompt and "SCENE TEXT:" in prompt:
+            text = json.dumps(fake_fields(prompt), ensure_ascii=False)
+        else:
+            part = prompt
+            for marker in PROMPT_MARKERS:
+                if marker in prompt:
+                    part = prompt.split(marker)[-1]
+                    break
+            nums = SCENE_RE.findall(part)
+            text = "\n".join(json.dumps(fake_scene(int(n)), ensure_ascii=False) for n in nums)
+
+        if outcome == "fenced_prose":
+            return "Here is the JSON:\n```json\n" + text + "\n```\nHope this helps!"
+        if outcome == "unescaped_quote":
+            return text.replace('"Đi thôi."', '"Anh ấy nói "đi thôi" rồi."')
+        if outcome == "truncated":
+            return text[: len(text) // 3]
+        if outcome == "garbage":
+            return "I'm sorry, I can't help with that."
+        if outcome == "rambling":
+            return " ".join(["Let me describe this scene in detail before writing anything."] * 60)
+        return text
+
+    def make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def send_json(self, code: int, obj: dict):
+                body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_DELETE(self):
+                server.count("cache_delete")
+                with server.stats_lock:
+                    server.cached.discard(urlsplit(self.path).path.split("/v1beta/")[-1])
+                self.send_json(200, {})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+
+                if "/cachedContents" in self.path:
+                    server.count("cache_create")
+                    with server.stats_lock:
+                        server.cache_seq += 1
+                        name = f"cachedContents/bench{server.cache_seq}"
+                        server.cached.add(name)
+                    return self.send_json(200, {"name": name, "model": body.get("model")})
+
+                cached_content = body.get("cachedContent") or body.get("cached_content")
+                if cached_content:
+                    if cached_content not in server.cached:
+                        server.count("cache_miss")
+                        return self.send_json(404, {"error": {
+                            "code": 404, "message": f"CachedContent not found: {cached_content}", "status": "NOT_FOUND"}})
+                    server.count("cache_hit")
+
+                api_key = self.headers.get("x-goog-api-key") or parse_qs(urlsplit(self.path).query).get("key", [""])[0]
+                if "invalid" in api_key:
+                    server.count("requests")
+                    server.count("400_key")
+                    return self.send_json(400, {"error": {
+                        "code": 400, "message": "API key not valid. Please pass a valid API key.", "status": "INVALID_ARGUMENT",
+                        "details": [{"@type": "type.googleapis.com/google.rpc.ErrorInfo", "reason": "API_KEY_INVALID",
+                                     "domain": "googleapis.com"}],
+                    }})
+
+                delay, outcome = server.draw()
+                streaming = ":streamGenerateContent" in self.path
+                time.sleep(delay * STREAM_FIRST_SHARE if streaming else delay)
+                server.count("requests")
+                server.count(outcome)
+
+                if outcome == "429":
+                    return self.send_json(429, {"error": {
+                        "code": 429, "message": "Resource has been exhausted (fake).", "status": "RESOURCE_EXHAUSTED",
+                        "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": f"{server.retry_delay:g}s"}],
+                    }})
+                if outcome == "500":
+                    return self.send_json(500, {"error": {"code": 500, "message": "Internal error (fake).", "status": "INTERNAL"}})
+
+                prompt = body["contents"][-1]["parts"][0]["text"]
+                text = server.response_text(prompt, outcome)
+                prompt_tokens = len(prompt) // 4
+                if streaming:
+                    return self.send_stream(text, prompt_tokens, delay * (1 - STREAM_FIRST_SHARE))
+                self.send_json(200, response_body(text, prompt_tokens, len(text) // 4))
+
+            def send_stream(self, text: str, prompt_tokens: int, rest_delay: float):
+                """Mảng JSON, mỗi phần tử 1 chunk; client huỷ giữa chừng → đếm stream_cancelled."""
+                pieces = [text[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(text), STREAM_CHUNK_CHARS)] or [""]
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                sent = 0
+                try:
+                    for n, piece in enumerate(pieces):
+                        if n:
+                            time.sleep(rest_delay / len(pieces))
+                        sent += len(piece)
+                        chunk = json.dumps(response_body(piece, prompt_tokens, sent // 4), ensure_ascii=False)
+                        self.wfile.write((("[" if n == 0 else ",\n") + chunk).encode("utf-8"))
+                        self.wfile.flush()
+                    self.wfile.write(b"]")
+                except (BrokenPipeError, ConnectionResetError):
+                    server.count("stream_cancelled")
+                    server.count("chars_not_sent", len(text) - sent)
+
+        return Handler
@@ -0,0 +1,58 @@
+"""
+Sửa riêng từng field sai rule (action_block sai độ dài, thiếu dialogue) bằng 1 request nhỏ
+thay vì sinh lại cả cảnh: prompt chỉ gồm cảnh + JSON hiện tại, không có dictionary / camera / rule.
+"""
+
+import json
+
+from .gemini import cache_store, call_gemini, call_gemini_cached
+from .prompts import FIELD_SPECS, build_field_prompt
+from .repair import parse_lenient
+from .retry import NoUsableKeysError
+from .validate import field_violations
+
+
+def fix_fields(scene: str, line: str, refresh: bool = False):
+    """
+    Trả về (line mới, list field đã sửa). Chỉ ghép field nào mà bản mới thật sự đạt rule;
+    response hỏng / vẫn sai thì giữ nguyên bản cũ của field đó.
+    refresh: bỏ qua cache (lượt sửa thứ 2 trở đi, khi response cache đã biết là không đạt).
+    """
+    data, _ = parse_lenient(line)
+    if not isinstance(data, dict):
+        return line, []
+
+    fields = [f for f in field_violations(data) if f in FIELD_SPECS]
+    if not fields:
+        return line, []
+
+    prompt = build_field_prompt(scene, data, fields)
+    try:
+        if refresh:
+            response = call_gemini(prompt, "field")
+            cache_store(prompt, response)
+        else:
+            response = call_gemini_cached(prompt, "field")
+    except NoUsableKeysError:
+        raise
+    except Exception as e:  # NonRetryableError / lỗi lạ: giữ nguyên dòng, lượt sau thử lại
+        print(f"⚠️ Không sửa được field của cảnh: {e}")
+        return line, []
+
+    got, _ = parse_lenient(response)
+    if not isinstance(got, dict):
+        return line, []
+
+    fixed = []
+    for field in fields:
+        if field not in got:
+            continue
+        candidate = dict(data)
+        candidate[field] = got[field]
+        if field not in field_violations(candidate):
+            data = candidate
+            fixed.append(field)
+
+    if not fixed:
+        return line, []
+    return json.dumps(data, ensure_ascii=False), fixed
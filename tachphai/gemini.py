@@ -0,0 +1,488 @@
+"""
+Gọi Gemini: client pool theo key, scheduler quota, cache response, context caching.
+Module này import google.ai.generativelanguage → chỉ được import khi thật sự cần gọi API.
+"""
+
+import datetime
+import json
+import threading
+import time
+
+from google.ai import generativelanguage as glm
+from google.api_core import exceptions as gexc
+
+from . import config
+from .config import EXPECTED_OUTPUT_TOKENS, MODEL_NAME, RETRY_MAX_ATTEMPTS
+from .keys import KeyScheduler, load_api_keys, select_keys
+from .metrics import metrics
+from .repair import parse_lenient, strip_fences
+from .retry import SAFETY_REASONS, EmptyResponseError, NonRetryableError, NoUsableKeysError, backoff_delay, classify_error, retry_after
+from .streamjson import JSONStreamMonitor, StreamViolation
+from .validate import tier_errors
+
+
+# ==============================
+# 1. API KEY, SCHEDULER & CLIENT POOL (NẠP LƯỜI)
+# ==============================
+
+scheduler = None
+scheduler_lock = threading.Lock()
+response_cache = None  # ResponseCache do runner gán khi bật cache (cache_lookup / cache_store)
+
+
+def get_scheduler(path: str = None, keys: str = None) -> KeyScheduler:
+    """Nạp api_keys.txt (chỉ phần `keys` nếu có, xem select_keys) và tạo KeyScheduler ở lần gọi đầu tiên."""
+    global scheduler
+    if scheduler is None:
+        with scheduler_lock:
+            if scheduler is None:
+                entries = load_api_keys(path or config.API_KEYS_FILE)
+                if keys:
+                    picked = select_keys(entries, keys)
+                    print(f"🔑 Worker này dùng {len(picked)}/{len(entries)} key (--keys {keys}).")
+                    entries = picked
+                scheduler = KeyScheduler(entries)
+    return scheduler
+
+
+def client_kwargs(api_key: str) -> dict:
+    """Tham số tạo client glm cho 1 key (có API_ENDPOINT thì dùng REST tới endpoint đó)."""
+    options = {"api_key": api_key}
+    if config.API_ENDPOINT:
+        options["api_endpoint"] = config.API_ENDPOINT
+        return {"client_options": options, "transport": "rest"}
+    return {"client_options": options}
+
+
+class ClientPool:
+    """
+    Giữ 1 client glm sống suốt cả run cho mỗi API key (cấu hình riêng, không qua genai.configure).
+    Request gửi thẳng qua client này (build_request), không tạo GenerativeModel.
+    - Client được tạo lần đầu khi key đó được dùng, sau đó tái sử dụng → giữ kết nối gRPC / HTTP
+      keep-alive, không phải bắt tay TLS lại mỗi request.
+    - Theo chuỗi API key chứ không theo số thứ tự: các tầng model (--tiers) có scheduler riêng.
+    - Client glm an toàn khi dùng chung giữa nhiều thread; lock chỉ bảo vệ lúc tạo.
+    """
+
+    def __init__(self):
+        self.clients = {}
+        self.lock = threading.Lock()
+
+    def get(self, kind: str, api_key: str):
+        """kind = "generative" | "cache"."""
+        client = self.clients.get((kind, api_key))
+        if client is not None:
+            return client
+        with self.lock:
+            client = self.clients.get((kind, api_key))
+            if client is None:
+                cls = glm.GenerativeServiceClient if kind == "generative" else glm.CacheServiceClient
+                client = cls(**client_kwargs(api_key))
+                self.clients[(kind, api_key)] = client
+            return client
+
+    def close(self):
+        with self.lock:
+            for client in self.clients.values():
+                try:
+                    client.transport.close()
+                except Exception:
+                    pass
+            self.clients.clear()
+
+
+client_pool = ClientPool()
+
+
+tiers = None  # --tiers: [tiers.Tier] theo thứ tự thử; None = 1 model (MODEL_NAME)
+
+
+def active_model() -> str:
+    """Model nhận request không chia tầng (batch, sửa field, sinh lại): tầng cuối nếu có --tiers."""
+    return tiers[-1].model if tiers else MODEL_NAME
+
+
+def model_label() -> str:
+    """Model của run, ghi vào OutputStore: "lite-model>flash-model" khi chia tầng."""
+    return ">".join(t.model for t in tiers) if tiers else MODEL_NAME
+
+
+# ==============================
+# 6. GỌI GEMINI VỚI XOAY API KEY
+# ==============================
+
+def clean_response_text(text: str) -> str:
+    """
+    Đưa response về 1 dòng JSON: bỏ markdown code block, chữ thừa, sửa lỗi JSON thường gặp
+    (xem repair.py). Không sửa được thì trả lại text gốc ép về 1 dòng.
+    """
+    data, repaired = parse_lenient(text)
+    if isinstance(data, dict):
+        if repaired:
+            print("🩹 Response JSON lỗi nhưng đã sửa được, không cần gọi lại.")
+        return json.dumps(data, ensure_ascii=False)
+
+    return " ".join(strip_fences(text).splitlines()).strip()
+
+
+def estimate_tokens(prompt: str) -> int:
+    """Ước lượng thô số token của 1 request (~4 ký tự / token + output dự kiến)."""
+    return len(prompt) // 4 + EXPECTED_OUTPUT_TOKENS
+
+
+def is_quota_error(e: Exception) -> bool:
+    """429 / RESOURCE_EXHAUSTED / hết quota."""
+    return isinstance(e, gexc.ResourceExhausted) or classify_error(e) == "quota"
+
+
+def model_path(name: str) -> str:
+    """Tên model đầy đủ cho request ("gemini-2.5-flash" → "models/gemini-2.5-flash")."""
+    return name if "/" in name else f"models/{name}"
+
+
+def build_request(model: str, text: str, cached_content: str = None) -> glm.GenerateContentRequest:
+    """GenerateContentRequest 1 lượt user; cached_content = tên cachedContents/... (context cache)."""
+    return glm.GenerateContentRequest(
+        model=model_path(model),
+        contents=[glm.Content(role="user", parts=[glm.Part(text=text)])],
+        cached_content=cached_content,
+    )
+
+
+def send_request(client, request: glm.GenerateContentRequest, stream: bool = False):
+    """stream=False → GenerateContentResponse; stream=True → iterator các chunk GenerateContentResponse."""
+    if stream:
+        return client.stream_generate_content(request)
+    return client.generate_content(request)
+
+
+def response_text(resp) -> str:
+    """
+    Ghép text các part của candidate đầu tiên. Xét lý do thật trước khi đọc text:
+      - prompt_feedback.block_reason có giá trị → EmptyResponseError(block_reason)
+      - finish_reason thuộc SAFETY_REASONS → EmptyResponseError (kể cả khi đã có 1 phần text)
+      - không có candidate / part nào (MAX_TOKENS, RECITATION...) → EmptyResponseError(finish_reason)
+    classify_error: SAFETY_REASONS → safety (không gửi lại), còn lại → incomplete (thử lại).
+    """
+    if "prompt_feedback" in resp and resp.prompt_feedback.block_reason:
+        raise EmptyResponseError(resp.prompt_feedback.block_reason.name)
+    if not resp.candidates:
+        raise EmptyResponseError("NO_CANDIDATES")
+    candidate = resp.candidates[0]
+    reason = candidate.finish_reason.name
+    if reason in SAFETY_REASONS or not candidate.content.parts:
+        raise EmptyResponseError(reason)
+    return "".join(part.text for part in candidate.content.parts)
+
+
+stream_responses = False  # --stream
+
+
+def cancel_stream(resp):
+    """Đóng kết nối của response stream=True đang đọc dở → server ngừng sinh phần còn lại."""
+    cancel = getattr(resp, "cancel", None)
+    if cancel is not None:
+        try:
+            cancel()
+        except Exception:
+            pass
+
+
+def read_stream(resp, kind: str, label: str, t0: float):
+    """
+    Đọc response stream=True qua JSONStreamMonitor, trả về (text đã nhận, usage_metadata chunk cuối).
+    - Chunk đầu tiên tới → ghi time-to-first-token (tính từ t0).
+    - Đủ object JSON (1 cảnh / 1 lượt sửa field) → ngừng đọc ngay, không chờ phần đuôi.
+    - Vi phạm cấu trúc (chữ thừa, ngoặc sai, lặp vô tận) → huỷ stream, trả phần đã nhận;
+      validate / --regen xử lý tiếp như mọi response hỏng.
+    """
+    monitor = JSONStreamMonitor(max_objects=None if kind == "batch" else 1)
+    parts = []
+    usage = None
+    stopped = False
+    try:
+        for chunk in resp:
+            if not parts and usage is None:
+                metrics.record_ttft(label, time.perf_counter() - t0)  # chunk đầu tiên
+            if "usage_metadata" in chunk:
+                usage = chunk.usage_metadata
+            try:
+                piece = response_text(chunk)
+            except EmptyResponseError as e:
+                if parts and e.reason not in SAFETY_REASONS:
+                    break  # chunk cuối chỉ có finish_reason / usage, không có text
+                raise
+            parts.append(piece)
+            if monitor.feed(piece):
+                stopped = True
+                metrics.count("stream_early_complete")
+                break
+    except StreamViolation as e:
+        stopped = True
+        metrics.count("stream_aborted")
+        print(f"✂️ Dừng stream sớm: {e}.")
+    finally:
+        if stopped:
+            cancel_stream(resp)
+
+    if not stopped and monitor.truncated:
+        metrics.count("stream_truncated")
+    return "".join(parts), usage
+
+
+def call_gemini_text(prompt: str, kind: str = "scene", tier=None) -> str:
+    """
+    Gọi Gemini với nội dung prompt, trả về text gốc của response (chưa ép 1 dòng).
+    Key được chọn bởi scheduler (key còn nhiều quota nhất). Lỗi được phân loại (retry.py):
+      - quota     → key nghỉ (Retry-After nếu có), thử key khác ngay
+      - transient → tính vào circuit breaker của key, chờ backoff mũ có jitter rồi thử lại
+      - incomplete (không có text: MAX_TOKENS, RECITATION...) → backoff rồi thử lại, không tính circuit breaker
+      - auth      → bỏ key đó tới hết run
+      - invalid / safety → raise NonRetryableError ngay (gửi lại cũng lỗi y hệt)
+      - unknown → raise nguyên lỗi ngay, không backoff (worker biến thành error_line của riêng cảnh đó)
+    Tối đa RETRY_MAX_ATTEMPTS lần (hết → NonRetryableError "exhausted": chỉ cảnh này hỏng, run chạy tiếp);
+    ưu tiên key chưa thử trong request này. Không còn key nào dùng được → NoUsableKeysError, dừng cả run.
+    Request gửi thẳng qua client của key trong pool (build_request), model = model của tầng / MODEL_NAME.
+    --stream: đọc response theo chunk (read_stream), ghi time-to-first-token.
+    kind ("scene" / "batch" / "field") chỉ dùng để tách số liệu trong metrics.
+    tier: tầng model; --tiers mà không ghi tầng (batch, sửa field, sinh lại) → tầng cuối (mạnh nhất).
+    """
+    if tier is None and tiers:
+        tier = tiers[-1]
+    scheduler = tier.scheduler if tier is not None else get_scheduler()
+    label = f"{kind}:{tier.name}" if tier is not None else kind  # latency / request tách theo tầng
+    est_tokens = estimate_tokens(prompt)
+    tried = set()
+    attempt = 0
+    last_error = None
+
+    while attempt < RETRY_MAX_ATTEMPTS:
+        attempt += 1
+        if len(tried | scheduler.disabled) >= len(scheduler):
+            tried.clear()  # đã thử hết các key → vòng mới
+        try:
+            with metrics.stage("key_wait"):
+                idx = scheduler.acquire(est_tokens, exclude=tried)
+        except ValueError as e:
+            # Mọi key đều bị bỏ (auth): cảnh nào cũng sẽ lỗi → dừng cả run
+            metrics.record_attempts(attempt)
+            metrics.count("calls_failed")
+            raise NoUsableKeysError(f"❌ {e}") from e
+        tried.add(idx)
+        who = f"{tier.name} key #{idx + 1}" if tier is not None else f"key #{idx + 1}"
+
+        t0 = time.perf_counter()
+        try:
+            client = client_pool.get("generative", scheduler.keys[idx])
+            model = tier.model if tier is not None else MODEL_NAME
+            text = None
+            with metrics.stage("api_call"):
+                resp = generate_with_context_cache(client, model, idx, prompt, stream=stream_responses)
+                if stream_responses:
+                    text, usage = read_stream(resp, kind, label, t0)
+                else:
+                    usage = resp.usage_metadata
+            scheduler.report_usage(idx, est_tokens, getattr(usage, "total_token_count", 0))
+            metrics.record_request(label, idx, time.perf_counter() - t0, usage)
+            if text is None:
+                text = response_text(resp)
+            scheduler.report_success(idx)
+            metrics.record_attempts(attempt)
+            return text
+
+        except Exception as e:
+            last_error = e
+            error_kind = "quota" if is_quota_error(e) else classify_error(e)
+            metrics.record_error(label, idx, e)
+            metrics.count(f"error_{error_kind}")
+            print(f"⚠️ Lỗi {error_kind} với {who}: {e}")
+
+            if error_kind == "unknown":
+                metrics.record_attempts(attempt)
+                metrics.count("calls_failed")
+                raise
+
+            if error_kind in ("invalid", "safety"):
+                metrics.record_attempts(attempt)
+                metrics.count("calls_failed")
+                raise NonRetryableError(error_kind, e) from e
+
+            if error_kind == "quota":
+                cooldown = retry_after(e) or scheduler.cooldown
+                print(f"🧊 {who} hết quota, cho nghỉ {cooldown:g}s.")
+                scheduler.report_quota_error(idx, cooldown)
+            elif error_kind == "auth":
+                print(f"🚫 {who} bị từ chối (sai / bị khoá), bỏ key này.")
+                scheduler.disable(idx)
+            else:
+                if error_kind == "transient" and scheduler.report_transient_error(idx):
+                    print(f"⚡ {who} lỗi liên tục, ngắt {scheduler.open_seconds[idx]:g}s.")
+                if attempt < RETRY_MAX_ATTEMPTS:
+                    delay = retry_after(e) or backoff_delay(attempt)
+                    print(f"⏳ Chờ {delay:.1f}s rồi thử lại...")
+                    time.sleep(delay)
+
+    metrics.record_attempts(attempt)
+    metrics.count("calls_failed")
+    raise NonRetryableError("exhausted", Exception(f"hết {attempt} lần thử, lỗi cuối: {last_error}"))
+
+
+def call_gemini(prompt: str, kind: str = "scene", tier=None) -> str:
+    """
+    Gọi Gemini cho 1 cảnh (không qua cache; --tiers mà không ghi tầng → tầng cuối).
+    Trả về: 1 dòng JSON string (có thể cần hậu xử lý thêm).
+    """
+    text = call_gemini_text(prompt, kind, tier)
+    with metrics.stage("repair"):
+        return clean_response_text(text)
+
+
+def cache_lookup(prompt: str, model: str = None):
+    """Tra cache theo prompt 1 cảnh đầy đủ + model (mặc định active_model). Không có cache / entry → None."""
+    if response_cache is None:
+        return None
+    return response_cache.get(response_cache.make_key(prompt, model or active_model()))
+
+
+def cache_store(prompt: str, line: str, model: str = None):
+    if response_cache is not None:
+        model = model or active_model()
+        response_cache.put(response_cache.make_key(prompt, model), line, model)
+
+
+def call_gemini_cached(prompt: str, kind: str = "scene") -> str:
+    """
+    call_gemini() có cache: prompt (đã ghép đủ dictionary + camera + cảnh) không đổi
+    thì lấy lại response cũ, không tốn request. --tiers: cảnh đi qua các tầng (call_gemini_tiered).
+    """
+    if tiers and kind == "scene":
+        return call_gemini_tiered(prompt)
+    with metrics.stage("cache_lookup"):
+        line = cache_lookup(prompt)
+    if line is not None:
+        metrics.count("cache_hit")
+        return line
+
+    line = call_gemini(prompt, kind)
+    cache_store(prompt, line)
+    return line
+
+
+def call_gemini_tiered(prompt: str) -> str:
+    """
+    --tiers: thử prompt 1 cảnh ở từng tầng theo thứ tự (mỗi tầng có cache riêng).
+    Dòng qua tier_errors (đúng cấu trúc + field đúng rule) → nhận luôn, không lên tầng sau.
+    Tầng lỗi hẳn (hết lượt thử, bị chặn...) cũng lên tầng sau. Tầng cuối: nhận dòng như khi
+    không chia tầng (hỏng thì --regen / --fix-fields xử lý), lỗi thì raise như call_gemini.
+    """
+    for i, tier in enumerate(tiers):
+        last = i == len(tiers) - 1
+        with metrics.stage("cache_lookup"):
+            line = cache_lookup(prompt, tier.model)
+        if line is not None:
+            metrics.count("cache_hit")
+        else:
+            try:
+                line = call_gemini(prompt, "scene", tier)
+            except Exception as e:
+                metrics.record_tier(tier.name, "error")
+                if last:
+                    raise
+                print(f"⤴️ Tầng {tier.name} lỗi ({e}) → thử tầng {tiers[i + 1].name}.")
+                continue
+            # Cache cả dòng bị loại: chạy lại thì lên tầng sau luôn, không gọi lại tầng này
+            cache_store(prompt, line, tier.model)
+
+        errors = tier_errors(line)
+        if not errors or last:
+            metrics.record_tier(tier.name, "rejected" if errors else "accepted")
+            return line
+        metrics.record_tier(tier.name, "escalated")
+        print(f"⤴️ Tầng {tier.name}: {'; '.join(errors[:2])} → lên tầng {tiers[i + 1].name}.")
+
+
+# ==============================
+# 6d. CONTEXT CACHING: PHẦN PROMPT TĨNH CHỈ GỬI 1 LẦN / KEY
+# ==============================
+
+class ContextCache:
+    """
+    Quản lý CachedContent cho phần prompt tĩnh, mỗi API key 1 bản (cache gắn với project của key).
+    - get(idx): tên cachedContents/... còn hạn cho key đó, tạo mới nếu chưa có / sắp hết hạn.
+    - Tạo cache lỗi (prompt quá ngắn so với mức tối thiểu, model/endpoint không hỗ trợ...)
+      → tắt hẳn context caching, mọi request quay về prompt đầy đủ.
+    """
+
+    def __init__(self, prefix: str, ttl: int = config.CONTEXT_CACHE_TTL):
+        self.prefix = prefix
+        self.ttl = ttl
+        self.entries = {}  # key_index -> (name, expires_at)
+        self.disabled = False
+        self.lock = threading.Lock()
+
+    def get(self, idx: int):
+        if self.disabled:
+            return None
+        with self.lock:
+            if self.disabled:
+                return None
+            entry = self.entries.get(idx)
+            # Còn < 1 phút là tạo lại, tránh cache hết hạn ngay giữa request
+            if entry and entry[1] - time.monotonic() > 60:
+                return entry[0]
+            try:
+                cached = client_pool.get("cache", get_scheduler().keys[idx]).create_cached_content(
+                    glm.CreateCachedContentRequest(
+                        cached_content=glm.CachedContent(
+                            model=MODEL_NAME,
+                            contents=[glm.Content(role="user", parts=[glm.Part(text=self.prefix)])],
+                            ttl=datetime.timedelta(seconds=self.ttl),
+                        )
+                    )
+                )
+            except Exception as e:
+                print(f"⚠️ Không tạo được context cache ({e}) → dùng prompt đầy đủ.")
+                self.disabled = True
+                return None
+            self.entries[idx] = (cached.name, time.monotonic() + self.ttl)
+            print(f"📌 Key #{idx + 1}: đã cache phần prompt tĩnh ({cached.name}).")
+            return cached.name
+
+    def invalidate(self, idx: int):
+        with self.lock:
+            self.entries.pop(idx, None)
+
+    def cleanup(self):
+        """Xoá các cache đã tạo khi chạy xong (không đợi hết TTL)."""
+        with self.lock:
+            for idx, (name, _) in self.entries.items():
+                try:
+                    client_pool.get("cache", get_scheduler().keys[idx]).delete_cached_content(name=name)
+                except Exception:
+                    pass
+            self.entries.clear()
+
+
+context_cache = None
+
+
+def generate_with_context_cache(client, model: str, idx: int, prompt: str, stream: bool = False):
+    """
+    Gửi prompt qua client của key. Nếu bật context cache và prompt bắt đầu bằng phần tĩnh đã cache
+    thì chỉ gửi phần cảnh (suffix) kèm cached_content trong request.
+    Cache bị lỗi (hết hạn, bị xoá...) → bỏ cache của key đó và gửi lại prompt đầy đủ.
+    """
+    cache = context_cache
+    if cache is None or not prompt.startswith(cache.prefix):
+        return send_request(client, build_request(model, prompt), stream)
+
+    name = cache.get(idx)
+    if name is None:
+        return send_request(client, build_request(model, prompt), stream)
+
+    try:
+        return send_request(client, build_request(model, prompt[len(cache.prefix):], name), stream)
+    except (gexc.NotFound, gexc.PermissionDenied, gexc.InvalidArgument) as e:
+        print(f"⚠️ Context cache của key #{idx + 1} không dùng được ({e}) → gửi prompt đầy đủ.")
+        cache.invalidate(idx)
+        return send_request(client, build_request(model, prompt), stream)
@@ -0,0 +1,78 @@
+"""Journal tiến độ: ghi từng cảnh đã xong (fsync) để chạy tiếp bằng --resume."""
+
+import json
+import os
+from pathlib import Path
+
+from .scenes import scene_hash, scene_number_of
+
+
+class ProgressJournal:
+    """
+    Journal JSON lines ghi lại từng cảnh đã xong: {"scene_number", "scene_hash", "line"}.
+    "line" là JSON model trả về (chưa hậu xử lý); hậu xử lý chạy 1 lần lúc export theo thứ tự cảnh.
+    Mỗi lần append đều flush + fsync → máy tắt / hết quota giữa chừng vẫn không mất cảnh đã xong.
+    Khi --resume: cảnh nào có cùng scene_number VÀ cùng nội dung (hash) thì dùng lại, không gọi API.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.f = None
+
+    def load(self) -> dict:
+        """Đọc journal cũ → {scene_number: (scene_hash, line)}. Dòng cuối bị ghi dở thì bỏ qua."""
+        done = {}
+        if not self.path.exists():
+            return done
+        with self.path.open("r", encoding="utf-8") as f:
+            for raw in f:
+                try:
+                    entry = json.loads(raw)
+                except json.JSONDecodeError:
+                    continue
+                done[entry["scene_number"]] = (entry["scene_hash"], entry["line"])
+        return done
+
+    def open(self, resume: bool):
+        self.f = self.path.open("a" if resume else "w", encoding="utf-8")
+
+    def append(self, scene: str, line: str):
+        entry = {"scene_number": scene_number_of(scene), "scene_hash": scene_hash(scene), "line": line}
+        self.f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+    def export(self, out_path: str, transform=None, keep=None, on_line=None):
+        """
+        Ghi lại OUTPUT_FILE từ journal: mỗi scene_number lấy bản mới nhất, sắp theo số cảnh.
+        transform: hàm nhận iterable các dòng (đúng thứ tự cảnh) → iterable dòng ghi ra (vd hậu xử lý),
+                   mỗi dòng vào đúng 1 dòng ra.
+        keep: nếu có, chỉ ghi các scene_number nằm trong tập này.
+        on_line(scene_number, scene_hash, dòng đã ghi): gọi sau khi ghi từng dòng (vd lưu vào OutputStore).
+        Ghi ra file tạm rồi os.replace → không bao giờ để OUTPUT_FILE ghi dở.
+        """
+        latest = self.load()
+        if keep is not None:
+            latest = {num: entry for num, entry in latest.items() if num in keep}
+
+        def order(num):
+            return (0, int(num), "") if num.isdigit() else (1, 0, num)
+
+        nums = sorted(latest, key=order)
+        lines = (latest[num][1] for num in nums)
+        if transform is not None:
+            lines = transform(lines)
+
+        tmp = Path(str(out_path) + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            for num, line in zip(nums, lines):
+                f.write(line + "\n")
+                if on_line is not None:
+                    on_line(num, latest[num][0], line)
+        os.replace(tmp, out_path)
+        return len(latest)
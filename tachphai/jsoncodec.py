@@ -0,0 +1,25 @@
+"""
+JSON codec nhanh cho các lệnh xử lý hàng loạt: dùng orjson nếu đã cài, không thì json chuẩn.
+Cả 2 nhánh đều ghi JSON 1 dòng, không escape tiếng Việt, không khoảng trắng thừa.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson là tuỳ chọn
+    orjson = None
+
+JSONDecodeError = orjson.JSONDecodeError if orjson else json.JSONDecodeError
+
+
+def loads(text):
+    if orjson:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def dumps(obj) -> str:
+    if orjson:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
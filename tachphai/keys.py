@@ -0,0 +1,204 @@
+"""Nạp API key và lập lịch key theo quota (request/phút, token/phút, cooldown sau 429, circuit breaker)."""
+
+import threading
+import time
+from pathlib import Path
+
+from .config import (
+    API_KEYS_FILE,
+    BREAKER_FAILURES,
+    BREAKER_MAX_OPEN_SECONDS,
+    BREAKER_OPEN_SECONDS,
+    KEY_COOLDOWN_SECONDS,
+    KEY_RPM,
+    KEY_TPM,
+)
+
+
+def parse_key_line(line: str, rpm: int = KEY_RPM, tpm: int = KEY_TPM):
+    """
+    Tách 1 dòng api_keys.txt thành (key, rpm, tpm).
+    Dòng chỉ có key → dùng rpm / tpm mặc định (KEY_RPM / KEY_TPM, hoặc của tầng model, xem tiers.py).
+    """
+    parts = line.split()
+    key = parts[0]
+    for opt in parts[1:]:
+        name, _, value = opt.partition("=")
+        if name == "rpm":
+            rpm = int(value)
+        elif name == "tpm":
+            tpm = int(value)
+    return key, rpm, tpm
+
+
+def load_api_keys(path: str = API_KEYS_FILE, rpm: int = KEY_RPM, tpm: int = KEY_TPM):
+    """
+    Đọc danh sách API key (mỗi dòng 1 key, có thể kèm rpm=/tpm= riêng).
+    Trả về list (key, rpm, tpm).
+    """
+    p = Path(path)
+    if not p.exists():
+        raise FileNotFoundError(f"Không tìm thấy {path}")
+    entries = [
+        parse_key_line(line.strip(), rpm, tpm)
+        for line in p.read_text(encoding="utf-8").splitlines()
+        if line.strip() and not line.strip().startswith("#")
+    ]
+    if not entries:
+        raise ValueError("❌ Không có API key nào trong api_keys.txt")
+    print(f"🔑 Đã nạp {len(entries)} API key.")
+    return entries
+
+
+def select_keys(entries, spec: str):
+    """
+    Chọn 1 phần key trong file (`queue work --keys`, "select" của 1 tầng trong --tiers):
+      "1-4,7"  → key thứ 1..4 và 7 trong file (đánh số từ 1, như log "key #n")
+      "2/3"    → phần 2 trong 3 phần: key thứ 2, 5, 8... (các worker dùng các key rời nhau)
+    Không in log: nơi gọi tự báo đã chọn bao nhiêu key.
+    """
+    spec = spec.strip()
+    if "/" in spec:
+        k, n = (int(x) for x in spec.split("/", 1))
+        if not 1 <= k <= n:
+            raise ValueError(f"Chọn key {spec!r}: cần 1 <= K <= N")
+        picked = [e for i, e in enumerate(entries) if i % n == k - 1]
+    else:
+        wanted = set()
+        for part in spec.split(","):
+            lo, _, hi = part.strip().partition("-")
+            wanted.update(range(int(lo), int(hi or lo) + 1))
+        picked = [e for i, e in enumerate(entries, 1) if i in wanted]
+    if not picked:
+        raise ValueError(f"Chọn key {spec!r}: không chọn được key nào trong {len(entries)} key")
+    return picked
+
+
+class TokenBucket:
+    """
+    Token bucket đơn giản: tối đa `capacity` token, hồi `capacity` token mỗi 60 giây.
+    Cho phép số dư âm (khi token thực tế > ước lượng) → key đó tự nghỉ lâu hơn.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.rate = capacity / 60.0
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Số giây cần chờ để đủ `amount` token (sau khi đã refill)."""
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+
+class KeyScheduler:
+    """
+    Lập lịch API key theo quota thay vì chờ lỗi rồi mới đổi key:
+      - Mỗi key có 2 bucket: request/phút và token/phút, cộng mốc cooldown sau 429.
+      - acquire() chọn key còn nhiều "headroom" nhất (tỉ lệ quota còn lại thấp nhất
+        trong 2 bucket), trừ quota trước rồi mới gọi. Hết key rảnh thì ngủ chờ.
+      - Key vừa dính 429 bị cho nghỉ KEY_COOLDOWN_SECONDS, không bị thử lại ngay.
+      - Circuit breaker: key lỗi tạm thời BREAKER_FAILURES lần liên tiếp → ngắt (nghỉ
+        BREAKER_OPEN_SECONDS, gấp đôi mỗi lần ngắt lại, tối đa BREAKER_MAX_OPEN_SECONDS).
+        Hết giờ nghỉ key được thử lại (half-open): thành công → đóng mạch, lỗi → ngắt tiếp.
+      - Key sai / bị khoá (401 / 403) bị bỏ hẳn tới hết run.
+    """
+
+    def __init__(self, entries):
+        self.keys = [key for key, _, _ in entries]
+        self.rpm = [TokenBucket(rpm) for _, rpm, _ in entries]
+        self.tpm = [TokenBucket(tpm) for _, _, tpm in entries]
+        self.cooldown_until = [0.0] * len(entries)
+        self.cooldown = KEY_COOLDOWN_SECONDS
+        self.failures = [0] * len(entries)        # lỗi tạm thời liên tiếp
+        self.open_seconds = [0.0] * len(entries)  # thời gian ngắt mạch lần gần nhất (0 = mạch đóng)
+        self.disabled = set()
+        self.cond = threading.Condition()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _headroom(self, i: int) -> float:
+        return min(self.rpm[i].tokens / self.rpm[i].capacity, self.tpm[i].tokens / self.tpm[i].capacity)
+
+    def acquire(self, est_tokens: int, exclude=()) -> int:
+        """Chờ tới khi có key đủ quota cho 1 request ~est_tokens, trả về index key."""
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                best, best_room, wait = None, -1.0, None
+                for i in range(len(self.keys)):
+                    if i in exclude or i in self.disabled:
+                        continue
+                    self.rpm[i].refill(now)
+                    self.tpm[i].refill(now)
+                    w = max(
+                        self.cooldown_until[i] - now,
+                        self.rpm[i].wait_time(1),
+                        self.tpm[i].wait_time(est_tokens),
+                    )
+                    if w > 0:
+                        wait = w if wait is None else min(wait, w)
+                        continue
+                    room = self._headroom(i)
+                    if room > best_room:
+                        best, best_room = i, room
+
+                if best is not None:
+                    self.rpm[best].tokens -= 1
+                    self.tpm[best].tokens -= est_tokens
+                    return best
+
+                if wait is None:
+                    raise ValueError("Không còn API key nào dùng được.")
+                self.cond.wait(timeout=wait)
+
+    def report_usage(self, i: int, est_tokens: int, used_tokens: int):
+        """Điều chỉnh bucket token theo số token thực tế (usage_metadata)."""
+        if not used_tokens:
+            return
+        with self.cond:
+            self.tpm[i].tokens -= used_tokens - est_tokens
+            self.cond.notify_all()
+
+    def report_success(self, i: int):
+        """Request thành công → đóng mạch của key."""
+        if self.failures[i] or self.open_seconds[i]:
+            with self.cond:
+                self.failures[i] = 0
+                self.open_seconds[i] = 0.0
+
+    def report_transient_error(self, i: int) -> bool:
+        """
+        Lỗi tạm thời (5xx, timeout...). Đủ BREAKER_FAILURES lần liên tiếp, hoặc lỗi ngay lúc
+        half-open → ngắt mạch key. Trả về True nếu vừa ngắt.
+        """
+        with self.cond:
+            self.failures[i] += 1
+            if self.failures[i] < BREAKER_FAILURES and not self.open_seconds[i]:
+                return False
+            self.open_seconds[i] = min(BREAKER_MAX_OPEN_SECONDS, (self.open_seconds[i] * 2) or BREAKER_OPEN_SECONDS)
+            self.cooldown_until[i] = max(self.cooldown_until[i], time.monotonic() + self.open_seconds[i])
+            self.failures[i] = 0
+            self.cond.notify_all()
+            return True
+
+    def disable(self, i: int):
+        """Key sai / bị khoá → không dùng nữa trong run này."""
+        with self.cond:
+            self.disabled.add(i)
+            self.cond.notify_all()
+
+    def report_quota_error(self, i: int, cooldown: float = None):
+        """Key dính 429 / hết quota → cho nghỉ (mặc định self.cooldown giây), xả hết bucket request."""
+        with self.cond:
+            self.cooldown_until[i] = time.monotonic() + (self.cooldown if cooldown is None else cooldown)
+            self.rpm[i].tokens = 0.0
+            self.cond.notify_all()
@@ -0,0 +1,245 @@
+"""
+Số liệu của 1 lần chạy: latency từng request, time-to-first-token (--stream), token (usage_metadata), số lần thử / request,
+lỗi theo loại + theo key, thời gian từng bước (--profile).
+Cuối run ghi ra JSON summary + file Prometheus text (dùng được với textfile collector của node_exporter).
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+LATENCY_QUANTILES = (0.5, 0.9, 0.99)
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Nearest-rank percentile của list đã sort (rỗng → 0)."""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(q * len(sorted_values))
+    return sorted_values[min(len(sorted_values), max(rank, 1)) - 1]
+
+
+def quantile_summary(values: list) -> dict:
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 4) if values else 0.0,
+        "max": round(values[-1], 4) if values else 0.0,
+        **{f"p{int(q * 100)}": round(percentile(values, q), 4) for q in LATENCY_QUANTILES},
+    }
+
+
+class Metrics:
+    """Thread-safe: các worker gọi record_* song song."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self, profile: bool = False):
+        self.profile = profile
+        self.started = time.time()
+        self.latencies = defaultdict(list)        # kind → [giây] của request thành công
+        self.ttft = defaultdict(list)             # kind → [giây] tới chunk đầu tiên (chỉ khi --stream)
+        self.requests = Counter()                 # (kind, key, result) → số request
+        self.tokens = Counter()                   # (kind, "input" / "output") → token
+        self.errors = Counter()                   # (key, loại lỗi) → số lần
+        self.attempts = Counter()                 # số lần thử của 1 lượt gọi → số lượt gọi
+        self.counters = Counter()                 # đếm tự do: cache_hit, regen, field_fix...
+        self.tiers = defaultdict(Counter)         # tầng → {accepted / escalated / rejected / error: số cảnh}
+        self.stages = Counter()                   # bước → tổng giây (chỉ khi profile)
+        self.stage_calls = Counter()
+
+    # ----- GHI NHẬN -----
+
+    def record_request(self, kind: str, key_idx: int, latency: float, usage=None):
+        with self.lock:
+            self.latencies[kind].append(latency)
+            self.requests[(kind, key_idx + 1, "ok")] += 1
+            if usage is not None:
+                self.tokens[(kind, "input")] += getattr(usage, "prompt_token_count", 0) or 0
+                self.tokens[(kind, "output")] += getattr(usage, "candidates_token_count", 0) or 0
+
+    def record_ttft(self, kind: str, seconds: float):
+        with self.lock:
+            self.ttft[kind].append(seconds)
+
+    def record_error(self, kind: str, key_idx: int, error: Exception):
+        with self.lock:
+            self.requests[(kind, key_idx + 1, "error")] += 1
+            self.errors[(key_idx + 1, type(error).__name__)] += 1
+
+    def record_attempts(self, n: int):
+        with self.lock:
+            self.attempts[n] += 1
+
+    def record_tier(self, tier: str, outcome: str):
+        """--tiers: kết quả 1 cảnh ở 1 tầng (accepted / escalated / rejected / error)."""
+        with self.lock:
+            self.tiers[tier][outcome] += 1
+
+    def tier_summary(self) -> dict:
+        """{tầng: {outcome: n, "scenes": tổng, "success_rate": accepted / tổng}} theo thứ tự thử."""
+        with self.lock:
+            tiers = {name: dict(outcomes) for name, outcomes in self.tiers.items()}
+        for outcomes in tiers.values():
+            total = sum(outcomes.values())
+            outcomes["scenes"] = total
+            outcomes["success_rate"] = round(outcomes.get("accepted", 0) / total, 4) if total else 0.0
+        return tiers
+
+    def count(self, name: str, n: int = 1):
+        with self.lock:
+            self.counters[name] += n
+
+    @contextmanager
+    def stage(self, name: str):
+        """Đo thời gian 1 bước; không bật --profile thì không làm gì."""
+        if not self.profile:
+            yield
+            return
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            with self.lock:
+                self.stages[name] += elapsed
+                self.stage_calls[name] += 1
+
+    # ----- XUẤT -----
+
+    def summary(self) -> dict:
+        with self.lock:
+            latency = {kind: quantile_summary(values) for kind, values in self.latencies.items()}
+
+            per_key = defaultdict(lambda: {"ok": 0, "error": 0})
+            for (_, key, result), n in self.requests.items():
+                per_key[f"#{key}"][result] += n
+
+            calls = sum(self.attempts.values())
+            retries = sum((n - 1) * c for n, c in self.attempts.items())
+            result = {
+                "duration_seconds": round(time.time() - self.started, 3),
+                "requests": {
+                    "ok": sum(n for (_, _, r), n in self.requests.items() if r == "ok"),
+                    "error": sum(n for (_, _, r), n in self.requests.items() if r == "error"),
+                    "by_key": dict(sorted(per_key.items())),
+                },
+                "latency_seconds": latency,
+                "ttft_seconds": {kind: quantile_summary(values) for kind, values in self.ttft.items()},
+                "tokens": {f"{kind}.{direction}": n for (kind, direction), n in sorted(self.tokens.items())},
+                "retries": {
+                    "calls": calls,
+                    "retried_calls": sum(c for n, c in self.attempts.items() if n > 1),
+                    "extra_attempts": retries,
+                    "attempts_histogram": {str(n): c for n, c in sorted(self.attempts.items())},
+                },
+                "errors": [
+                    {"key": f"#{key}", "type": etype, "count": n}
+                    for (key, etype), n in sorted(self.errors.items())
+                ],
+                "counters": dict(sorted(self.counters.items())),
+            }
+            if self.profile:
+                result["stages"] = {
+                    name: {"seconds": round(sec, 4), "calls": self.stage_calls[name]}
+                    for name, sec in self.stages.most_common()
+                }
+        if self.tiers:
+            result["tiers"] = self.tier_summary()  # tự lấy lock
+        return result
+
+    def prometheus_text(self) -> str:
+        """Format Prometheus text exposition (label key = số thứ tự key, không bao giờ là API key)."""
+        s = self.summary()
+        out = []
+
+        def metric(name, mtype, help_text, samples):
+            out.append(f"# HELP tachphai_{name} {help_text}")
+            out.append(f"# TYPE tachphai_{name} {mtype}")
+            for labels, value in samples:
+                label_str = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                out.append(f"tachphai_{name}{{{label_str}}} {value}" if label_str else f"tachphai_{name} {value}")
+
+        with self.lock:
+            requests = sorted(self.requests.items())
+            tokens = sorted(self.tokens.items())
+            errors = sorted(self.errors.items())
+            latencies = {kind: sorted(v) for kind, v in self.latencies.items()}
+            ttft = {kind: sorted(v) for kind, v in self.ttft.items()}
+
+        metric("requests_total", "counter", "Gemini requests by kind, key and result.", [
+            ({"kind": kind, "key": key, "result": result}, n) for (kind, key, result), n in requests
+        ])
+        metric("tokens_total", "counter", "Tokens from usage_metadata by kind and direction.", [
+            ({"kind": kind, "direction": direction}, n) for (kind, direction), n in tokens
+        ])
+        metric("errors_total", "counter", "Request errors by key and exception type.", [
+            ({"key": key, "type": etype}, n) for (key, etype), n in errors
+        ])
+
+        def summary_metric(name, help_text, series):
+            out.append(f"# HELP tachphai_{name} {help_text}")
+            out.append(f"# TYPE tachphai_{name} summary")
+            for kind, values in sorted(series.items()):
+                for q in LATENCY_QUANTILES:
+                    out.append(f'tachphai_{name}{{kind="{kind}",quantile="{q}"}} {round(percentile(values, q), 6)}')
+                out.append(f'tachphai_{name}_sum{{kind="{kind}"}} {round(sum(values), 6)}')
+                out.append(f'tachphai_{name}_count{{kind="{kind}"}} {len(values)}')
+
+        summary_metric("request_latency_seconds", "Latency of successful Gemini requests.", latencies)
+        if ttft:
+            summary_metric("time_to_first_token_seconds", "Time to the first streamed chunk (--stream).", ttft)
+
+        metric("retries_total", "counter", "Extra attempts after the first one, summed over all calls.", [
+            ({}, s["retries"]["extra_attempts"]),
+        ])
+        if "tiers" in s:
+            metric("tier_scenes_total", "counter", "Scenes tried per model tier by outcome (--tiers).", [
+                ({"tier": name, "outcome": outcome}, n)
+                for name, outcomes in s["tiers"].items()
+                for outcome, n in sorted(outcomes.items()) if outcome not in ("scenes", "success_rate")
+            ])
+        metric("events_total", "counter", "Pipeline events (cache hits, regenerations, field fixes...).", [
+            ({"event": name}, n) for name, n in s["counters"].items()
+        ])
+        if "stages" in s:
+            metric("stage_seconds_total", "counter", "Time spent per pipeline stage (--profile).", [
+                ({"stage": name}, v["seconds"]) for name, v in s["stages"].items()
+            ])
+        metric("run_duration_seconds", "gauge", "Wall time of the run.", [({}, s["duration_seconds"])])
+        return "\n".join(out) + "\n"
+
+    def write(self, json_path: str, prom_path: str):
+        """Ghi JSON summary + Prometheus text (file tạm + os.replace)."""
+        for path, text in (
+            (json_path, json.dumps(self.summary(), ensure_ascii=False, indent=2) + "\n"),
+            (prom_path, self.prometheus_text()),
+        ):
+            tmp = Path(str(path) + ".tmp")
+            tmp.write_text(text, encoding="utf-8")
+            os.replace(tmp, path)
+
+    def print_tiers(self):
+        """--tiers: tỉ lệ cảnh nhận ngay ở từng tầng."""
+        for name, v in self.tier_summary().items():
+            print(f"🪜 Tầng {name}: nhận {v.get('accepted', 0)}/{v['scenes']} cảnh ({v['success_rate']:.0%}), "
+                  f"lên tầng sau {v.get('escalated', 0)}, lỗi {v.get('error', 0)}"
+                  + (f", tầng cuối vẫn hỏng {v['rejected']}" if v.get("rejected") else "") + ".")
+
+    def print_profile(self):
+        if not self.profile:
+            return
+        print("⏱️ Profile (tổng giây theo bước, cộng dồn qua các worker):")
+        for name, v in self.summary().get("stages", {}).items():
+            print(f"   {name:<20} {v['seconds']:>10.3f}s  ({v['calls']} lần)")
+
+
+# Dùng chung cho cả process (giống client_pool)
+metrics = Metrics()
@@ -0,0 +1,146 @@
+"""
+Lên kế hoạch camera / shot_type cho CẢ chuỗi cảnh (đã sắp theo số cảnh), thay cho random.choice
++ biến global last_camera / last_shot_type trước đây.
+
+- Giữ lựa chọn của model nếu nó không vi phạm ràng buộc.
+- Camera: phải nằm trong camera_styles (nếu có) và không trùng CAMERA_WINDOW cảnh gần nhất.
+- Shot type: chuẩn hoá về 4 loại, không trùng cảnh ngay trước, và 1 loại xuất hiện tối đa
+  SHOT_MAX_IN_WINDOW lần trong SHOT_WINDOW cảnh gần nhất.
+- Khi phải đổi camera, random theo seed + scene_number → cùng input cho cùng output,
+  không phụ thuộc cảnh nào xong trước, chạy lại 1 đoạn cảnh cũng không làm xáo các cảnh khác.
+
+Mỗi cảnh O(số camera) → tuyến tính theo số cảnh.
+"""
+
+import random
+from collections import Counter, deque
+
+from .config import CAMERA_WINDOW, PLAN_SEED, SHOT_MAX_IN_WINDOW, SHOT_WINDOW
+
+# base (không dấu cách / gạch nối) → tên ghi ra JSON
+SHOT_NAMES = {
+    "wide": "wide",
+    "medium": "medium",
+    "closeup": "close-up",
+    "extremecloseup": "extreme close-up",
+}
+
+# Loại thay thế ưu tiên khi shot_type bị trùng (giữ đúng cách đổi cũ ở vị trí đầu)
+SHOT_FALLBACKS = {
+    "medium": ("closeup", "wide", "extremecloseup"),
+    "closeup": ("medium", "wide", "extremecloseup"),
+    "extremecloseup": ("medium", "wide", "closeup"),
+    "wide": ("medium", "closeup", "extremecloseup"),
+}
+
+
+def normalize_shot_type(shot: str):
+    """Chuẩn hoá shot_type model trả về thành base ("closeup"...); không nhận ra thì trả None."""
+    base = shot.strip().lower().replace("-", "").replace(" ", "")
+    if "close" in base and "extreme" in base:
+        return "extremecloseup"
+    if "close" in base:
+        return "closeup"
+    if "wide" in base:
+        return "wide"
+    if "medium" in base:
+        return "medium"
+    return None
+
+
+class CinematicPlanner:
+    """Gọi plan() lần lượt cho từng cảnh THEO THỨ TỰ cảnh; reset() trước khi sang chuỗi cảnh khác."""
+
+    def __init__(
+        self,
+        camera_styles: list,
+        seed: int = PLAN_SEED,
+        camera_window: int = CAMERA_WINDOW,
+        shot_window: int = SHOT_WINDOW,
+        shot_max_in_window: int = SHOT_MAX_IN_WINDOW,
+    ):
+        self.camera_styles = camera_styles
+        self.seed = seed
+        self.camera_window = max(1, camera_window)
+        self.shot_window = max(1, shot_window)
+        self.shot_max_in_window = max(1, shot_max_in_window)
+        self.reset()
+
+    def reset(self):
+        self.recent_cameras = deque(maxlen=self.camera_window)
+        self.recent_shots = deque(maxlen=self.shot_window)
+        self.shot_counts = Counter()
+        self.kept = self.changed = 0
+
+    def rng_for(self, scene_number) -> random.Random:
+        return random.Random(f"{self.seed}:{scene_number}")
+
+    # ----- CAMERA -----
+
+    def plan_camera(self, cam: str, scene_number) -> str:
+        cam = cam.strip()
+        styles = self.camera_styles
+        if not styles:
+            return cam
+
+        if cam in styles and cam not in self.recent_cameras:
+            return cam
+
+        candidates = [c for c in styles if c not in self.recent_cameras]
+        if not candidates:
+            # Ít camera hơn window → chỉ còn đòi khác cảnh ngay trước
+            prev = self.recent_cameras[-1] if self.recent_cameras else None
+            candidates = [c for c in styles if c != prev] or styles
+        return self.rng_for(scene_number).choice(candidates)
+
+    # ----- SHOT TYPE -----
+
+    def shot_allowed(self, base: str, strict: bool) -> bool:
+        if self.recent_shots and self.recent_shots[-1] == base:
+            return False
+        return not strict or self.shot_counts[base] < self.shot_max_in_window
+
+    def plan_shot(self, base: str) -> str:
+        for strict in (True, False):
+            for option in (base,) + SHOT_FALLBACKS[base]:
+                if self.shot_allowed(option, strict):
+                    return option
+        return base
+
+    def push_shot(self, base: str):
+        if len(self.recent_shots) == self.recent_shots.maxlen:
+            self.shot_counts[self.recent_shots[0]] -= 1
+        self.recent_shots.append(base)
+        self.shot_counts[base] += 1
+
+    # ----- 1 CẢNH -----
+
+    def plan(self, data: dict) -> dict:
+        """Sửa data["cinematic"] của cảnh kế tiếp cho thoả ràng buộc (in-place, trả lại data)."""
+        cinematic = data.get("cinematic")
+        if not isinstance(cinematic, dict):
+            return data
+        scene_number = data.get("scene_number")
+        changed = False
+
+        cam = cinematic.get("camera")
+        if isinstance(cam, str):
+            new_cam = self.plan_camera(cam, scene_number)
+            changed |= new_cam != cam
+            cinematic["camera"] = new_cam
+            self.recent_cameras.append(new_cam)
+
+        shot = cinematic.get("shot_type")
+        if isinstance(shot, str):
+            base = normalize_shot_type(shot)
+            if base is not None:
+                base = self.plan_shot(base)
+                changed |= SHOT_NAMES[base] != shot
+                cinematic["shot_type"] = SHOT_NAMES[base]
+                self.push_shot(base)
+
+        if changed:
+            self.changed += 1
+        else:
+            self.kept += 1
+        return data
@@ -0,0 +1,101 @@
+"""Hậu xử lý JSON của các cảnh: kế hoạch camera / shot_type, close-up logic, fixed definitions."""
+
+from . import jsoncodec
+from .config import PLAN_SEED
+from .planner import CinematicPlanner
+from .repair import parse_lenient
+from .resources import build_fixed_character_definitions, build_reverse_closeup_map
+
+
+# ==============================
+# 7. HẬU XỬ LÝ: CAMERA / SHOT_TYPE + CLOSE-UP LOGIC
+# ==============================
+
+class Postprocessor:
+    """
+    Gom các bước hậu xử lý của 1 tập cảnh (1 episode).
+    Camera / shot_type do CinematicPlanner quyết định theo seed, nên các dòng phải được
+    đưa vào theo thứ tự cảnh, nhưng KHÔNG phụ thuộc thứ tự model trả kết quả về.
+    """
+
+    def __init__(self, character_dict: dict, camera_styles: list, seed: int = PLAN_SEED):
+        self.character_dict = character_dict
+        self.camera_styles = camera_styles
+        self.fixed_character_definitions = build_fixed_character_definitions(character_dict)
+        self.planner = CinematicPlanner(camera_styles, seed)
+
+    def apply_closeup_and_fixed_defs(self, data: dict) -> dict:
+        """
+        - Gắn fixed_character_definitions vào JSON
+        - Áp dụng close-up logic: Alex/Maya/Marcus → Alex2/Maya2/Marcus2 nếu shot_type là close-up/extreme close-up
+        """
+        # 1) fixed_character_definitions
+        if self.fixed_character_definitions:
+            data["fixed_character_definitions"] = self.fixed_character_definitions
+
+        # 2) Close-up logic cho focus_characters
+        cinematic = data.get("cinematic", {})
+        shot_type = str(cinematic.get("shot_type", "")).strip()
+        norm = shot_type.lower().replace(" ", "").replace("-", "")
+        is_closeup = norm in ("closeup", "extremecloseup")
+
+        focus = cinematic.get("focus_characters")
+        if is_closeup and isinstance(focus, list) and self.character_dict:
+            new_focus = []
+            for name in focus:
+                if name in self.character_dict:
+                    close_name = self.character_dict[name].get("name_closeup", name + "2")
+                    new_focus.append(close_name)
+                else:
+                    new_focus.append(name)
+            cinematic["focus_characters"] = new_focus
+
+        data["cinematic"] = cinematic
+        return data
+
+    def postprocess_data(self, data: dict) -> dict:
+        """
+        Hậu xử lý 1 cảnh (cảnh kế tiếp trong chuỗi):
+          - đưa tên close-up cũ về tên gốc (dòng đã hậu xử lý lần trước vẫn chạy lại được)
+          - kế hoạch camera / shot_type
+          - close-up logic + fixed_character_definitions (theo shot_type đã chốt)
+        """
+        data = self.restore_base_names(data)
+        data = self.planner.plan(data)
+        return self.apply_closeup_and_fixed_defs(data)
+
+    def postprocess_lines(self, lines):
+        """
+        Generator: nhận các dòng JSON model trả về (đã sắp theo số cảnh), trả về dòng đã hậu xử lý.
+        Chạy lại từ đầu chuỗi mỗi lần gọi. Dòng JSON lỗi được sửa nếu có thể, không thì giữ nguyên.
+        """
+        self.planner.reset()
+        for line in lines:
+            try:
+                data = jsoncodec.loads(line)
+            except jsoncodec.JSONDecodeError:
+                data, _ = parse_lenient(line)
+                if data is None:
+                    print(f"⚠️ JSON không parse / sửa được, ghi raw line: {line[:80]}")
+                    yield line
+                    continue
+            if not isinstance(data, dict) or "error" in data:
+                yield line
+                continue
+            yield jsoncodec.dumps(self.postprocess_data(data))
+
+    def restore_base_names(self, data: dict) -> dict:
+        """
+        Đưa focus_characters đã đổi sang tên close-up (Alex2...) về tên gốc (Alex),
+        để chạy lại hậu xử lý với character dictionary mới mà không bị đổi tên 2 lần.
+        Tên close-up cũ lấy từ fixed_character_definitions đang nằm trong chính dòng JSON.
+        """
+        reverse = build_reverse_closeup_map(self.character_dict)
+        old_defs = data.get("fixed_character_definitions")
+        if isinstance(old_defs, dict):
+            reverse.update(build_reverse_closeup_map(old_defs))
+
+        cinematic = data.get("cinematic")
+        if isinstance(cinematic, dict) and isinstance(cinematic.get("focus_characters"), list):
+            cinematic["focus_characters"] = [reverse.get(n, n) for n in cinematic["focus_characters"]]
+        return data
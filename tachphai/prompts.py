@@ -0,0 +1,160 @@
+"""Prompt template gửi cho Gemini và các hàm ghép prompt."""
+
+import json
+
+
+# ==============================
+# 5. PROMPT TEMPLATE GỬI CHO GEMINI
+# ==============================
+
+PROMPT_TEMPLATE = """
+You are a cinematic formatter with a character consistency system.
+
+CHARACTER DICTIONARY (use these exact appearances):
+<<CHAR_DICT>>
+
+CAMERA STYLE OPTIONS (use EXACTLY one of these values for the "camera" field):
+<<CAMERA_LIST>>
+
+Convert the following scene into ONE SINGLE LINE JSON, EXACTLY in this structure:
+
+{"scene_number":1,"scene_title":"[Short title]","character":{"name":"[Main character name]","appearance":"[Use EXACT appearance from CHARACTER DICTIONARY above]","emotions":{"primary":"[Primary emotion]","secondary":"[Secondary emotion]"},"voice_tone":"[Use EXACT voice_tone from CHARACTER DICTIONARY]"},"setting":{"location":"[Place]","environment":"[Environment]","time":"[Day/Night]"},"cinematic":{"camera":"[One camera style from CAMERA STYLE OPTIONS above]","shot_type":"[wide/medium/close-up/extreme close-up]","focus_characters":["[character names in this shot]"],"lighting":"[Lighting - auto-select]","mood":"[Mood]","style":"Cinematic 8K realistic","effects":"[Effects - auto-select]","sound":"[Ambience]"},"dialogue":{"characters":[{"speaker":"[Speaker name]","line":"[Dialogue line]"}]},"action_block":{"length":"150-200 words","content":"[Cinematic action description]"}}
+
+CRITICAL RULES:
+
+1. CHARACTER CONSISTENCY:
+   - ALWAYS use the EXACT "appearance" and "voice_tone" from the CHARACTER DICTIONARY above
+   - For character name: use the original base names (Alex, Maya, Marcus)
+   - DO NOT modify appearance descriptions
+
+2. CLOSE-UP DETECTION & NAME SWITCHING:
+   - If shot_type is "close-up" or "extreme close-up":
+     * In "focus_characters" array, change names: Alex → Alex2, Maya → Maya2, Marcus → Marcus2
+     * If multiple characters in close-up, change ALL their names (e.g., ["Alex2", "Maya2"])
+   - If shot_type is "wide" or "medium":
+     * Keep original names in "focus_characters" (e.g., ["Alex", "Maya"])
+
+3. AI AUTO-SELECT:
+   - "camera": MUST be one of the CAMERA STYLE OPTIONS above
+   - "shot_type": choose wide/medium/close-up/extreme close-up based on scene emotion and action
+   - "lighting": choose lighting that fits the mood
+   - "effects": add cinematic effects if needed
+
+4. OUTPUT FORMAT:
+   - Return ONLY valid JSON
+   - JSON MUST be ONE SINGLE LINE (no line breaks)
+   - action_block MUST be 150-200 words
+
+SCENE TO PROCESS:
+\"\"\"<<SCENE>>\"\"\"
+"""
+
+# Bản batch: cùng rule như PROMPT_TEMPLATE, nhưng xử lý <<COUNT>> cảnh, mỗi cảnh 1 dòng JSON
+BATCH_PROMPT_TEMPLATE = PROMPT_TEMPLATE.replace(
+    "Convert the following scene into ONE SINGLE LINE JSON, EXACTLY in this structure:",
+    "Convert EACH of the following scenes into ONE SINGLE LINE JSON, EXACTLY in this structure:",
+).replace(
+    'SCENE TO PROCESS:\n\"\"\"<<SCENE>>\"\"\"\n',
+    """5. BATCH OUTPUT:
+   - There are <<COUNT>> scenes below. Return EXACTLY <<COUNT>> lines, one JSON object per line, in the same order
+   - "scene_number" MUST be the number in that scene's "Scene <n>:" header
+   - No blank lines, no markdown, no text before, between or after the lines
+
+SCENES TO PROCESS:
+<<SCENES>>
+""",
+)
+
+SCENE_MARKER = "SCENE TO PROCESS:"
+
+# --dedup seed: cảnh gần trùng 1 cảnh đã sinh → gửi kèm kết quả cảnh đó làm mẫu
+SEED_SECTION = """
+REFERENCE RESULT (a nearly identical scene was already processed into this JSON; keep everything that still
+applies, change only what this scene does differently, and use THIS scene's scene_number):
+<<REFERENCE>>
+"""
+
+# Sửa riêng 1 vài field của cảnh đã có (không gửi lại CHAR_DICT / CAMERA_LIST / toàn bộ rule)
+FIELD_PROMPT_TEMPLATE = """
+You are fixing part of an existing cinematic scene JSON. Keep the same story, characters and tone.
+
+SCENE TEXT:
+\"\"\"<<SCENE>>\"\"\"
+
+CURRENT SCENE JSON (context only, do not repeat it):
+<<CONTEXT>>
+
+TASKS:
+<<TASKS>>
+
+Return ONLY ONE SINGLE LINE JSON object with exactly these keys and nothing else:
+{<<SHAPE>>}
+"""
+
+# field → (hình dạng JSON trả về, yêu cầu)
+FIELD_SPECS = {
+    "dialogue": (
+        '"dialogue":{"characters":[{"speaker":"[Speaker name]","line":"[Dialogue line]"}]}',
+        "- dialogue: write the spoken lines of this scene (use lines from the SCENE TEXT when it has them, same language)",
+    ),
+    "action_block": (
+        '"action_block":{"length":"150-200 words","content":"[Cinematic action description]"}',
+        "- action_block.content: rewrite it to be BETWEEN 150 AND 200 WORDS, consistent with the JSON above",
+    ),
+}
+
+
+def build_char_dict_str(character_dict: dict) -> str:
+    """Chuẩn bị CHAR_DICT string cho prompt."""
+    if character_dict:
+        return "\n".join([
+            f"- {name}: appearance=\"{info.get('appearance','')}\", voice_tone=\"{info.get('voice_tone','')}\", closeup_name=\"{info.get('name_closeup', name + '2')}\""
+            for name, info in character_dict.items()
+        ])
+    return "(No character dictionary loaded - AI will infer appearances)"
+
+
+def build_camera_list_str(camera_styles: list) -> str:
+    """Chuẩn bị CAMERA_LIST string cho prompt."""
+    if camera_styles:
+        return "\n".join([f"- {c}" for c in camera_styles])
+    return "- tracking shot\n- medium shot\n- wide shot\n- close-up shot"
+
+
+def build_prompt(scene: str, char_dict_str: str, camera_list_str: str) -> str:
+    """Ghép CHAR_DICT, CAMERA_LIST và cảnh vào PROMPT_TEMPLATE."""
+    prompt = PROMPT_TEMPLATE.replace("<<CHAR_DICT>>", char_dict_str)
+    prompt = prompt.replace("<<CAMERA_LIST>>", camera_list_str)
+    return prompt.replace("<<SCENE>>", scene)
+
+
+def build_seeded_prompt(prompt: str, reference_line: str) -> str:
+    """Thêm SEED_SECTION (dòng JSON của cảnh gốc) vào cuối prompt 1 cảnh."""
+    return prompt + SEED_SECTION.replace("<<REFERENCE>>", reference_line.strip())
+
+
+def build_batch_prompt(batch, char_dict_str: str, camera_list_str: str) -> str:
+    """Ghép N cảnh vào BATCH_PROMPT_TEMPLATE (mỗi cảnh bọc trong \"\"\"...\"\"\")."""
+    scenes_str = "\n\n".join(f'\"\"\"{scene}\"\"\"' for scene in batch)
+    prompt = BATCH_PROMPT_TEMPLATE.replace("<<CHAR_DICT>>", char_dict_str)
+    prompt = prompt.replace("<<CAMERA_LIST>>", camera_list_str)
+    prompt = prompt.replace("<<COUNT>>", str(len(batch)))
+    return prompt.replace("<<SCENES>>", scenes_str)
+
+
+def split_static_prefix(char_dict_str: str, camera_list_str: str) -> str:
+    """
+    Phần tĩnh của PROMPT_TEMPLATE (rule + CHAR_DICT + CAMERA_LIST), tức mọi thứ trước
+    "SCENE TO PROCESS:". prefix + phần cảnh == build_prompt(...) của 1 cảnh.
+    """
+    prompt = build_prompt("", char_dict_str, camera_list_str)
+    return prompt[:prompt.index(SCENE_MARKER)]
+
+
+def build_field_prompt(scene: str, data: dict, fields) -> str:
+    """Prompt nhỏ chỉ xin lại các field trong `fields` (key của FIELD_SPECS), phần còn lại của JSON làm ngữ cảnh."""
+    context = {k: v for k, v in data.items() if k != "fixed_character_definitions"}
+    prompt = FIELD_PROMPT_TEMPLATE.replace("<<SCENE>>", scene)
+    prompt = prompt.replace("<<CONTEXT>>", json.dumps(context, ensure_ascii=False))
+    prompt = prompt.replace("<<TASKS>>", "\n".join(FIELD_SPECS[f][1] for f in fields))
+    return prompt.replace("<<SHAPE>>", ",".join(FIELD_SPECS[f][0] for f in fields))
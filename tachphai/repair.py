@@ -0,0 +1,136 @@
+"""
+Sửa nhanh các lỗi JSON hay gặp trong response của model, trước khi tính tới chuyện gọi lại API:
+  - markdown code block (```json ... ```) ở bất kỳ đâu
+  - chữ thừa trước / sau object ("Here is the JSON: {...} Hope this helps")
+  - dấu " không escape bên trong chuỗi, xuống dòng / tab thô trong chuỗi
+  - dấu phẩy thừa trước } / ]
+  - response bị cắt giữa chừng (thiếu " / } / ])
+"""
+
+import json
+import re
+
+FENCE_RE = re.compile(r"```(?:json|JSON)?\s*(.*?)\s*```", re.S)
+
+# Sau dấu " đóng chuỗi hợp lệ chỉ có thể là 1 trong các ký tự này (bỏ qua khoảng trắng)
+STRING_END_FOLLOWERS = ",:}]"
+CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+CLOSERS = {"{": "}", "[": "]"}
+
+# Cắt lùi tối đa bấy nhiêu dấu phẩy khi đóng response bị cụt mà vẫn chưa parse được
+MAX_TRUNCATION_BACKOFF = 3
+
+
+def strip_fences(text: str) -> str:
+    """Lấy nội dung trong code block đầu tiên (nếu có), bỏ luôn ``` bị cụt không đóng."""
+    text = (text or "").strip()
+    m = FENCE_RE.search(text)
+    if m:
+        return m.group(1).strip()
+    if text.startswith("```"):
+        text = re.sub(r"^```(?:json|JSON)?", "", text)
+    return text.strip()
+
+
+def rstrip_commas(out: list):
+    """Bỏ khoảng trắng + dấu phẩy thừa ở cuối buffer (trước khi đóng } / ])."""
+    while out and (out[-1].isspace() or out[-1] == ","):
+        out.pop()
+
+
+def close_truncated(out: list, stack: list) -> str:
+    """Đóng các {, [ còn mở của 1 buffer bị cụt."""
+    out = list(out)
+    rstrip_commas(out)
+    if out and out[-1] == ":":
+        out.append("null")
+    return "".join(out) + "".join(CLOSERS[c] for c in reversed(stack))
+
+
+def repair_candidates(text: str):
+    """
+    Quét 1 lượt (tuyến tính) từ dấu { đầu tiên (không có thì [), yield các bản sửa theo thứ tự ưu tiên:
+    bản đầy đủ trước, sau đó (nếu response bị cụt) các bản cắt lùi về dấu phẩy gần nhất.
+    """
+    start = text.find("{")
+    if start < 0:
+        start = text.find("[")
+    if start < 0:
+        return
+    s = text[start:]
+    n = len(s)
+
+    out, stack = [], []
+    cut_points = []  # (độ dài buffer, stack) tại mỗi dấu phẩy ngoài chuỗi
+    in_str = esc = False
+    i = 0
+    while i < n:
+        ch = s[i]
+        if in_str:
+            if esc:
+                out.append(ch)
+                esc = False
+            elif ch == "\\":
+                out.append(ch)
+                esc = True
+            elif ch == '"':
+                j = i + 1
+                while j < n and s[j].isspace():
+                    j += 1
+                if j >= n or s[j] in STRING_END_FOLLOWERS:
+                    out.append(ch)
+                    in_str = False
+                else:
+                    out.append('\\"')
+            elif ch in CONTROL_ESCAPES:
+                out.append(CONTROL_ESCAPES[ch])
+            else:
+                out.append(ch)
+        elif ch == '"':
+            out.append(ch)
+            in_str = True
+        elif ch in CLOSERS:
+            stack.append(ch)
+            out.append(ch)
+        elif ch in "}]":
+            if not stack:
+                break
+            rstrip_commas(out)
+            out.append(CLOSERS[stack.pop()])
+            if not stack:
+                # Object đã đóng → phần còn lại là chữ thừa
+                yield "".join(out)
+                return
+        else:
+            if ch == ",":
+                cut_points.append((len(out), list(stack)))
+            out.append(ch)
+        i += 1
+
+    # Tới đây là response bị cụt
+    if in_str:
+        out.append('"')
+    yield close_truncated(out, stack)
+    for length, snapshot in reversed(cut_points[-MAX_TRUNCATION_BACKOFF:]):
+        yield close_truncated(out[:length], snapshot)
+
+
+def parse_lenient(text: str):
+    """
+    Parse JSON, sửa nếu cần. Trả về (data, repaired):
+      - (obj, False): JSON chuẩn
+      - (obj, True): đã phải sửa
+      - (None, False): không cứu được
+    """
+    text = strip_fences(text)
+    try:
+        return json.loads(text), False
+    except json.JSONDecodeError:
+        pass
+
+    for candidate in repair_candidates(text):
+        try:
+            return json.loads(candidate), True
+        except json.JSONDecodeError:
+            continue
+    return None, False
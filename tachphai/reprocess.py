@@ -0,0 +1,108 @@
+"""
+Chạy lại hậu xử lý (close-up, fixed definitions, chống trùng camera / shot_type) trên output có sẵn,
+không gọi API. Dùng khi sửa character_dictionary.json hoặc camera_styles.txt.
+
+Đọc / ghi theo từng dòng (bộ nhớ không phụ thuộc kích thước file), ghi ra file tạm rồi
+os.replace sang file đích → file đích hoặc là bản cũ, hoặc là bản mới đầy đủ.
+"""
+
+import os
+from pathlib import Path
+
+from . import jsoncodec
+from .config import PLAN_SEED
+from .postprocess import Postprocessor
+from .repair import parse_lenient
+
+OUTPUT_PATTERN = "output_prompts*.txt"
+REPROCESSED_SUFFIX = ".post"
+
+
+def default_output_path(src: Path) -> Path:
+    """output_prompts.txt → output_prompts.post.txt"""
+    return src.with_name(src.stem + REPROCESSED_SUFFIX + src.suffix)
+
+
+def iter_output_files(path: Path, pattern: str = OUTPUT_PATTERN):
+    """1 file → chính nó; thư mục → mọi file khớp pattern (đệ quy), bỏ qua file .post đã sinh."""
+    if path.is_file():
+        yield path
+        return
+    for p in sorted(path.rglob(pattern)):
+        if p.is_file() and not p.stem.endswith(REPROCESSED_SUFFIX):
+            yield p
+
+
+def reprocess_file(src: Path, dst: Path, character_dict: dict, camera_styles: list, seed: int = PLAN_SEED) -> dict:
+    """
+    Hậu xử lý lại từng dòng của src, ghi sang dst (atomic).
+    Mỗi file dùng 1 Postprocessor riêng: kế hoạch camera / shot_type chỉ nối giữa các cảnh cùng file.
+    Dòng JSON lỗi được sửa nếu có thể; không sửa được thì giữ nguyên.
+    """
+    post = Postprocessor(character_dict, camera_styles, seed)
+    counts = {"lines": 0, "changed": 0, "raw": 0}
+
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(dst.name + ".tmp")
+    try:
+        with src.open("r", encoding="utf-8") as fin, tmp.open("w", encoding="utf-8", newline="\n") as fout:
+            for line in fin:
+                line = line.strip()
+                if not line:
+                    continue
+                counts["lines"] += 1
+
+                try:
+                    data = jsoncodec.loads(line)
+                except jsoncodec.JSONDecodeError:
+                    data, _ = parse_lenient(line)
+                if not isinstance(data, dict):
+                    counts["raw"] += 1
+                    fout.write(line + "\n")
+                    continue
+
+                before = jsoncodec.dumps(data)
+                new_line = jsoncodec.dumps(post.postprocess_data(data))
+                if new_line != before:
+                    counts["changed"] += 1
+                fout.write(new_line + "\n")
+
+            fout.flush()
+            os.fsync(fout.fileno())
+        os.replace(tmp, dst)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+    return counts
+
+
+def reprocess_paths(
+    paths, output, character_dict: dict, camera_styles: list, pattern: str = OUTPUT_PATTERN, seed: int = PLAN_SEED
+):
+    """
+    paths: list file / thư mục. output: None (ghi cạnh file gốc, hậu tố .post),
+    hoặc 1 file (khi chỉ có 1 input là file) / 1 thư mục (giữ cấu trúc thư mục con).
+    Trả về list (src, dst, counts).
+    """
+    results = []
+    for root in map(Path, paths):
+        if not root.exists():
+            print(f"⚠️ Không tìm thấy {root}")
+            continue
+        for src in iter_output_files(root, pattern):
+            if output is None:
+                dst = default_output_path(src)
+            elif root.is_file() and len(paths) == 1 and not Path(output).is_dir():
+                dst = Path(output)
+            else:
+                rel = src.relative_to(root) if root.is_dir() else Path(src.name)
+                dst = Path(output) / rel
+            if dst.resolve() == src.resolve():
+                print(f"⚠️ Bỏ qua {src}: file đích trùng file nguồn.")
+                continue
+
+            counts = reprocess_file(src, dst, character_dict, camera_styles, seed)
+            print(f"♻️ {src} → {dst}: {counts['lines']} dòng, {counts['changed']} dòng thay đổi, {counts['raw']} dòng giữ nguyên (JSON lỗi không sửa được).")
+            results.append((src, dst, counts))
+    return results
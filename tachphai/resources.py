@@ -0,0 +1,103 @@
+"""Nạp character dictionary và danh sách camera cinematic."""
+
+import json
+from pathlib import Path
+
+from .config import CAMERA_STYLES_FILE, CHARACTER_DICT_FILE
+
+
+# ==============================
+# 3. LOAD CHARACTER DICTIONARY
+# ==============================
+
+def load_character_dictionary(path: str = CHARACTER_DICT_FILE):
+    """
+    Đọc character dictionary từ file JSON.
+    Trả về dict:
+        {
+          "Alex": { "name": "Alex", "name_closeup": "Alex2", "appearance": "...", "voice_tone": "...",
+                    "aliases": ["Lex", "anh Alex"] },
+          ...
+        }
+    "aliases" (tuỳ chọn): tên gọi khác trong scenes.txt, dùng để lọc nhân vật theo cảnh (charmatch.py).
+    """
+    p = Path(path)
+    if not p.exists():
+        print(f"⚠️ Không tìm thấy {path}, tiếp tục mà không có character lock.")
+        return {}
+
+    try:
+        data = json.loads(p.read_text(encoding="utf-8"))
+    except Exception as e:
+        print(f"⚠️ Lỗi đọc/parse {path}: {e}")
+        return {}
+
+    characters = {}
+    for char in data.get("characters", []):
+        name = char.get("name")
+        if not name:
+            continue
+        characters[name] = {
+            "name": name,
+            "name_closeup": char.get("name_closeup", name + "2"),
+            "appearance": char.get("appearance", ""),
+            "voice_tone": char.get("voice_tone", ""),
+            "aliases": [a for a in char.get("aliases", []) if isinstance(a, str)],
+        }
+
+    print(f"👥 Đã nạp {len(characters)} nhân vật từ {path}")
+    return characters
+
+
+def build_reverse_closeup_map(character_dict: dict) -> dict:
+    """Reverse map cho closeup_name -> base_name (nếu sau này cần)."""
+    reverse_closeup_map = {}
+    for base_name, info in character_dict.items():
+        close_name = info.get("name_closeup")
+        if close_name:
+            reverse_closeup_map[close_name] = base_name
+    return reverse_closeup_map
+
+
+def build_fixed_character_definitions(character_dict: dict):
+    """
+    Tạo block fixed_character_definitions để gắn vào mỗi prompt.
+    Structure:
+    "fixed_character_definitions": {
+       "Alex": {"appearance": "...", "voice_tone": "...", "name_closeup": "Alex2"},
+       ...
+    }
+    """
+    fixed = {}
+    for name, info in character_dict.items():
+        fixed[name] = {
+            "appearance": info.get("appearance", ""),
+            "voice_tone": info.get("voice_tone", ""),
+            "name_closeup": info.get("name_closeup", name + "2"),
+        }
+    return fixed
+
+
+# ==============================
+# 4. LOAD CAMERA STYLES
+# ==============================
+
+def load_camera_styles(path: str = CAMERA_STYLES_FILE):
+    """
+    Đọc danh sách camera từ file .txt, bỏ dòng trống và dòng bắt đầu bằng '#'.
+    """
+    p = Path(path)
+    if not p.exists():
+        print(f"⚠️ Không tìm thấy {path}, AI sẽ tự chọn camera.")
+        return []
+
+    lines = p.read_text(encoding="utf-8").splitlines()
+    cameras = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        cameras.append(line)
+
+    print(f"🎥 Đã nạp {len(cameras)} kiểu camera từ {path}")
+    return cameras
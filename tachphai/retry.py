@@ -0,0 +1,153 @@
+"""
+Chính sách retry khi gọi Gemini: phân loại lỗi → quyết định thử lại, đổi key hay dừng hẳn.
+
+  quota      429 / RESOURCE_EXHAUSTED   → key đó nghỉ (theo Retry-After nếu server gợi ý), đổi key
+  transient  500 / 502 / 503 / 504, GoogleAPICallError / ServerError không rõ code, OSError (timeout, mất kết nối, SSL),
+             HTTP đọc dở → backoff mũ có jitter, tính vào circuit breaker của key
+  auth       401 / 403, hoặc 400 "API key not valid / expired" (key sai / bị khoá / hết hạn) → bỏ key đó cho tới hết run
+  invalid    400 / 404 / 412 (prompt / model sai) → không thử lại: key nào cũng sẽ lỗi y hệt
+  safety     response bị chặn (block_reason / finish_reason SAFETY, BLOCKLIST, PROHIBITED_CONTENT) → không thử lại
+  incomplete response không có text vì lý do khác (MAX_TOKENS, RECITATION, OTHER...) → backoff rồi thử lại,
+             không tính vào circuit breaker (key không có lỗi)
+  unknown    mọi lỗi khác (thường là bug trong code) → raise ngay, không backoff
+
+Phân loại theo HTTP code + tên exception, không import google → dùng / kiểm tra offline được.
+"""
+
+import json
+import random
+import re
+
+from .config import RETRY_BACKOFF_BASE, RETRY_BACKOFF_CAP
+from .scenes import scene_number_of
+
+QUOTA_CODES = {429}
+TRANSIENT_CODES = {408, 500, 502, 503, 504}
+AUTH_CODES = {401, 403}
+INVALID_CODES = {400, 404, 409, 412, 413}
+
+TRANSIENT_NAMES = (
+    "ServiceUnavailable", "InternalServerError", "DeadlineExceeded", "GatewayTimeout", "BadGateway",
+    "Aborted", "ConnectionError", "Timeout", "TimeoutError", "ReadTimeout", "RemoteDisconnected",
+    "ChunkedEncodingError", "ProtocolError", "TransportError",
+    # google.api_core: lỗi server không rõ code / lớp cha chung; http.client: response đọc dở
+    "ServerError", "Unknown", "GoogleAPICallError", "HTTPException", "IncompleteRead",
+)
+# error_line của các loại này là kết quả cuối: cảnh không đổi thì gửi lại cũng lỗi y hệt
+TERMINAL_KINDS = ("invalid", "safety")
+# google.generativeai: prompt / candidate bị chặn (thường gặp khi --stream)
+SAFETY_NAMES = ("BlockedPromptException", "StopCandidateException")
+# block_reason / finish_reason nghĩa là nội dung bị chặn; MAX_TOKENS, RECITATION, OTHER... gửi lại có thể được
+SAFETY_REASONS = ("SAFETY", "BLOCKLIST", "PROHIBITED_CONTENT")
+# Gemini trả 400 INVALID_ARGUMENT (không phải 401 / 403) cho key sai / bị thu hồi / hết hạn
+API_KEY_HINTS = ("api_key_invalid", "api key not valid", "api key expired")
+
+RETRY_DELAY_RE = re.compile(r"retry[_ -]?(?:delay|after)\W*(?:seconds\W*)?(\d+(?:\.\d+)?)\s*s?", re.I)
+
+
+class NonRetryableError(Exception):
+    """
+    Request dừng hẳn, không thử thêm trong lượt này; run vẫn chạy tiếp (cảnh đó thành error_line):
+      invalid / safety  gửi lại (trên key nào) cũng vô ích
+      exhausted         hết RETRY_MAX_ATTEMPTS lần thử (server chập chờn...), lượt --regen / --resume sau thử lại
+    """
+
+    def __init__(self, kind: str, error: Exception):
+        super().__init__(f"{kind}: {error}")
+        self.kind = kind
+        self.error = error
+
+
+class EmptyResponseError(Exception):
+    """Response không có text: reason = block_reason của prompt / finish_reason của candidate (tên enum)."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"response không có text (reason={reason})")
+        self.reason = reason
+
+
+class NoUsableKeysError(Exception):
+    """Mọi API key đều đã bị bỏ (auth): cảnh nào cũng sẽ lỗi → lỗi duy nhất được phép dừng cả run."""
+
+
+def http_code(e: Exception):
+    code = getattr(e, "code", None)
+    if isinstance(code, int):
+        return code
+    # grpc.StatusCode / HTTPStatus / callable code() của một số client
+    value = getattr(code, "value", None)
+    if isinstance(value, int):
+        return value
+    return None
+
+
+def classify_error(e: Exception) -> str:
+    """quota / transient / auth / invalid / safety / incomplete / unknown."""
+    code = http_code(e)
+    name = type(e).__name__
+    bases = {cls.__name__ for cls in type(e).__mro__}  # ServerError / GoogleAPICallError là lớp cha
+    msg = str(e).lower()
+
+    if code in QUOTA_CODES or name in ("ResourceExhausted", "TooManyRequests") or "resource_exhausted" in msg or "quota" in msg:
+        return "quota"
+    if code in AUTH_CODES or name in ("PermissionDenied", "Unauthenticated", "Forbidden", "Unauthorized"):
+        return "auth"
+    if any(h in msg for h in API_KEY_HINTS):
+        return "auth"
+    if code in INVALID_CODES or name in ("InvalidArgument", "BadRequest", "NotFound", "FailedPrecondition"):
+        return "invalid"
+    if name in SAFETY_NAMES or (isinstance(e, EmptyResponseError) and e.reason in SAFETY_REASONS):
+        return "safety"
+    if isinstance(e, EmptyResponseError):
+        return "incomplete"
+    if code in TRANSIENT_CODES or bases.intersection(TRANSIENT_NAMES) or isinstance(e, OSError):
+        return "transient"
+    return "unknown"
+
+
+def retry_after(e: Exception):
+    """Số giây server gợi ý chờ (header Retry-After hoặc RetryInfo.retryDelay), không có → None."""
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        value = headers.get("Retry-After") or headers.get("retry-after")
+        if value:
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                pass
+
+    text = f"{e} {getattr(e, 'details', '')}"
+    m = RETRY_DELAY_RE.search(text)
+    if m:
+        return float(m.group(1))
+    return None
+
+
+def backoff_delay(attempt: int, base: float = RETRY_BACKOFF_BASE, cap: float = RETRY_BACKOFF_CAP, rng=random) -> float:
+    """Full jitter: random trong [0, min(cap, base * 2^(attempt-1))] → các worker không dồn lại cùng lúc."""
+    return rng.uniform(0, min(cap, base * (2 ** max(0, attempt - 1))))
+
+
+def error_line(scene: str, e: Exception) -> str:
+    """
+    Dòng thay thế cho cảnh không sinh được vì lỗi không thử lại được (ghi journal như cảnh hỏng).
+    error_kind invalid / safety → is_terminal_line: --regen / --resume không gửi lại tới khi cảnh bị sửa;
+    exhausted → --regen / --resume gửi lại như dòng hỏng bình thường.
+    """
+    print(f"⛔ Cảnh {scene_number_of(scene)} bỏ qua: {e}")
+    return json.dumps(
+        {"scene_number": scene_number_of(scene), "error": str(e), "error_kind": getattr(e, "kind", "error")},
+        ensure_ascii=False,
+    )
+
+
+def is_terminal_line(line: str) -> bool:
+    """Dòng error_line của lỗi cố định (prompt không hợp lệ / bị safety chặn)."""
+    if '"error_kind"' not in line:
+        return False
+    try:
+        data = json.loads(line)
+    except ValueError:
+        return False
+    return isinstance(data, dict) and data.get("error_kind") in TERMINAL_KINDS
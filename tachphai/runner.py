@@ -0,0 +1,524 @@
+"""
+Lệnh generate / episodes: chạy các cảnh (song song) qua Gemini và lưu ra file theo thứ tự.
+Nhiều tập chạy chung 1 pool request + 1 scheduler key; mỗi tập có journal / output riêng.
+"""
+
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import config, gemini
+from .batch import generate_batch
+from .cache import ResponseCache
+from .config import QUEUE_MAX_ATTEMPTS, QUEUE_POLL_SECONDS, REORDER_WINDOW, REQUESTS_PER_KEY
+from .dedup import renumber_line
+from .episodes import Episode, collect_episodes
+from .fieldfix import fix_fields
+from .gemini import ContextCache, cache_store, call_gemini, call_gemini_cached, client_pool, get_scheduler
+from .metrics import metrics
+from .prompts import split_static_prefix
+from .repair import parse_lenient
+from .retry import NonRetryableError, NoUsableKeysError, error_line, is_terminal_line
+from .scenes import scene_hash, scene_number_of
+from .store import OutputStore, new_run_id
+from .tiers import load_tiers
+from .validate import field_violations, line_errors, schema_errors
+from .workqueue import WorkQueue
+
+
+# ==============================
+# 8. CHẠY CÁC CẢNH (SONG SONG) & LƯU RA FILE THEO THỨ TỰ
+# ==============================
+
+def generate_in_order(items, work, workers: int, window: int = REORDER_WINDOW):
+    """
+    Chạy work(item) cho từng item (1 cảnh hoặc 1 batch cảnh) với tối đa `workers`
+    request song song, nhưng yield (idx, kết quả) ĐÚNG thứ tự item.
+
+    - Key cho từng request do scheduler chọn theo quota còn lại.
+    - Chỉ gửi trước tối đa `window` item so với item đang chờ ghi,
+      nên bộ nhớ bị chặn bởi window chứ không phải bởi số cảnh.
+    - workers = 1: chạy tuần tự.
+    """
+    if workers <= 1:
+        for idx, item in enumerate(items):
+            yield idx, work(item)
+        return
+
+    window = max(window, workers)
+    pool = ThreadPoolExecutor(max_workers=workers)
+    pending = {}
+    next_submit = 0
+    try:
+        for next_out in range(len(items)):
+            while next_submit < len(items) and next_submit - next_out < window:
+                pending[next_submit] = pool.submit(work, items[next_submit])
+                next_submit += 1
+            yield next_out, pending.pop(next_out).result()
+    finally:
+        # Nếu có lỗi giữa chừng thì huỷ các cảnh chưa chạy, không chờ cả window
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def generate_lines(items, workers: int, window: int, batch_size: int):
+    """
+    items = [(episode, scene), ...]. Yield raw line của từng item theo đúng thứ tự
+    (1 cảnh / request, hoặc theo batch — mỗi batch chỉ gồm cảnh của cùng 1 tập).
+    """
+    if batch_size <= 1:
+        def work(item):
+            ep, scene = item
+            try:
+                return call_gemini_cached(ep.prompt(scene))
+            except NoUsableKeysError:
+                raise
+            except Exception as e:
+                # NonRetryableError, hoặc lỗi lạ của riêng cảnh này: không kéo cả run dừng theo
+                return error_line(scene, e)
+
+        results = generate_in_order(items, work, workers, window)
+        try:
+            for _, line in results:
+                yield line
+        finally:
+            results.close()
+        return
+
+    def work_batch(batch):
+        ep, scenes = batch
+        return generate_batch(scenes, ep.char_dict_for, ep.camera_list_str)
+
+    batches = []
+    for ep, scene in items:
+        if batches and batches[-1][0] is ep and len(batches[-1][1]) < batch_size:
+            batches[-1][1].append(scene)
+        else:
+            batches.append((ep, [scene]))
+    results = generate_in_order(batches, work_batch, workers, window)
+    try:
+        for _, lines in results:
+            yield from lines
+    finally:
+        results.close()
+
+
+def generate_pass(items, workers: int, window: int, batch_size: int) -> list:
+    """
+    Sinh các cảnh [(episode, scene), ...], ghi journal từng tập theo thứ tự.
+    Trả về list cảnh có dòng hỏng (không sửa được / sai cấu trúc) để sinh lại.
+    """
+    broken = []
+    results = generate_lines(items, workers, window, batch_size)
+    try:
+        for ep, scene in items:
+            raw_line = next(results)
+            with metrics.stage("journal"):
+                ep.journal.append(scene, raw_line)
+            ep.finished += 1
+            print(f"⏳ {ep.tag}Đã xong cảnh {ep.finished}/{ep.planned}")
+
+            # Lỗi JSON sửa được đã được sửa từ lúc nhận response; chỉ dòng không cứu được mới phải gọi lại
+            errors = line_errors(raw_line)
+            if errors and is_terminal_line(raw_line):
+                metrics.count("scenes_terminal")  # bị chặn / prompt không hợp lệ: sinh lại cũng vô ích
+            elif errors:
+                print(f"⚠️ {ep.tag}Cảnh {scene_number_of(scene)} hỏng ({'; '.join(errors[:3])}) → xếp hàng sinh lại.")
+                broken.append((ep, scene))
+    finally:
+        results.close()
+    return broken
+
+
+def regenerate_broken(broken, workers: int, window: int) -> list:
+    """
+    Gọi lại API (bỏ qua cache) cho các cảnh hỏng [(episode, scene), ...].
+    Dòng mới hợp lệ → ghi journal của tập + ghi đè cache. Lần này bị chặn / prompt không hợp lệ
+    → ghi journal dòng lỗi đó, không sinh lại nữa. Trả về list cảnh vẫn còn hỏng.
+    """
+    def work(item):
+        ep, scene = item
+        try:
+            return call_gemini(ep.prompt(scene))
+        except NoUsableKeysError:
+            raise
+        except Exception as e:
+            return error_line(scene, e)
+
+    still = []
+    results = generate_in_order(broken, work, workers, window)
+    try:
+        for idx, line in results:
+            ep, scene = broken[idx]
+            if is_terminal_line(line):
+                ep.journal.append(scene, line)
+                metrics.count("scenes_terminal")
+                continue
+            if line_errors(line):
+                still.append(broken[idx])
+                continue
+            ep.journal.append(scene, line)
+            cache_store(ep.prompt(scene), line)
+    finally:
+        results.close()
+    return still
+
+
+def regenerate_passes(broken, workers: int, window: int, attempts: int) -> list:
+    """Tối đa `attempts` lượt regenerate_broken. Trả về list cảnh vẫn còn hỏng."""
+    for attempt in range(1, attempts + 1):
+        if not broken:
+            break
+        print(f"🔁 Sinh lại {len(broken)} cảnh hỏng (lượt {attempt}/{attempts}).")
+        metrics.count("regen_requests", len(broken))
+        broken = regenerate_broken(broken, workers, window)
+    return broken
+
+
+def fill_duplicates(episodes, policy: str) -> list:
+    """
+    Cảnh trùng (Episode.dup_todo), sau khi cảnh gốc đã có kết quả trong journal:
+      - trùng hẳn, hoặc gần trùng + policy reuse → chép dòng của cảnh gốc (đổi scene_number), không gọi API
+      - gần trùng + policy seed → vẫn sinh, prompt kèm dòng của cảnh gốc làm mẫu (Episode.seeds)
+      - cảnh gốc không có dòng dùng được (hỏng / lỗi) → sinh như cảnh thường;
+        riêng cảnh trùng hẳn cảnh gốc bị chặn / prompt không hợp lệ → chép luôn dòng lỗi, không gửi
+    Trả về list (episode, scene) còn phải sinh.
+    """
+    pending = []
+    for ep in episodes:
+        if not ep.dup_todo:
+            continue
+        latest = ep.journal.load()
+        for scene in ep.dup_todo:
+            num = scene_number_of(scene)
+            rep, similarity = ep.duplicates[num]
+            entry = latest.get(rep)
+            if not entry or (line_errors(entry[1]) and not (similarity >= 1.0 and is_terminal_line(entry[1]))):
+                print(f"⚠️ {ep.tag}Cảnh {num}: cảnh gốc {rep} chưa có kết quả dùng được → sinh riêng.")
+                pending.append((ep, scene))
+            elif similarity >= 1.0 or policy == "reuse":
+                ep.journal.append(scene, renumber_line(entry[1], num))
+                ep.finished += 1
+                metrics.count("dedup_reused")
+                sign = "=" if similarity >= 1.0 else "≈"
+                print(f"♻️ {ep.tag}Cảnh {num} {sign} cảnh {rep} ({similarity:.0%}) → dùng lại kết quả.")
+            else:
+                ep.seeds[num] = entry[1]
+                metrics.count("dedup_seeded")
+                print(f"🌱 {ep.tag}Cảnh {num} ≈ cảnh {rep} ({similarity:.0%}) → sinh lại, lấy kết quả cảnh {rep} làm mẫu.")
+                pending.append((ep, scene))
+        del latest
+    return pending
+
+
+def fix_fields_pass(episodes, workers: int, window: int, refresh: bool = False) -> int:
+    """
+    1 lượt sửa field: cảnh nào có dòng journal đúng cấu trúc nhưng field sai rule
+    (action_block sai độ dài, thiếu dialogue) → 1 request nhỏ cho riêng các field đó.
+    Trả về số cảnh đã sửa được (0 = không còn gì để sửa / sửa không nổi).
+    """
+    items = []
+    for ep in episodes:
+        latest = ep.journal.load()
+        for scene in ep.selected:
+            entry = latest.get(scene_number_of(scene))
+            if not entry or entry[0] != scene_hash(scene):
+                continue
+            data, _ = parse_lenient(entry[1])
+            if isinstance(data, dict) and not schema_errors(data) and field_violations(data):
+                items.append((ep, scene, entry[1]))
+        del latest
+    if not items:
+        return 0
+
+    print(f"✂️ Sửa riêng field sai rule cho {len(items)} cảnh.")
+
+    def work(item):
+        return fix_fields(item[1], item[2], refresh=refresh)
+
+    fixed_count = 0
+    results = generate_in_order(items, work, workers, window)
+    try:
+        for idx, (line, fixed) in results:
+            if fixed:
+                ep, scene, _ = items[idx]
+                ep.journal.append(scene, line)
+                fixed_count += 1
+    finally:
+        results.close()
+    print(f"✂️ Đã sửa {fixed_count}/{len(items)} cảnh.")
+    return fixed_count
+
+
+def run(args):
+    """Chạy lệnh generate với args đã parse từ CLI: 1 tập với các file mặc định trong config."""
+    episode = Episode("", config.SCENES_FILE, config.OUTPUT_FILE, config.CHARACTER_DICT_FILE, config.CAMERA_STYLES_FILE)
+    run_episodes([episode], args, config.OUTPUT_FILE)
+
+
+def run_manifest(args):
+    """Chạy lệnh episodes: các tập từ --manifest + thư mục trên dòng lệnh, chung 1 pool + 1 scheduler key."""
+    episodes = collect_episodes(args.dirs, args.manifest)
+    if not episodes:
+        print("⚠️ Không có tập nào – truyền thư mục tập hoặc --manifest.")
+        return
+    print(f"🎬 {len(episodes)} tập: " + ", ".join(ep.name for ep in episodes))
+    run_episodes(episodes, args, args.metrics_file)
+
+
+def run_episodes(episodes, args, metrics_base: str):
+    """
+    Sinh cảnh cho các tập. Cảnh của mọi tập xếp nối nhau vào 1 hàng đợi chung → key và worker
+    không bao giờ rảnh ở ranh giới giữa 2 tập. Mỗi tập journal / export / tiến độ riêng.
+    Metrics của cả run ghi ra metrics_base + hậu tố.
+    """
+    metrics.reset(profile=args.profile)
+    started_at = time.time()
+    if args.tiers:
+        # Sai file tầng → ValueError / OSError trước khi nạp tập nào
+        gemini.tiers = load_tiers(args.tiers)
+        if args.context_cache:
+            print("⚠️ --tiers: bỏ qua --context-cache (phần tĩnh chỉ cache được cho 1 model).")
+            args.context_cache = False
+        if args.batch > 1:
+            print("⚠️ --tiers: mỗi cảnh cần validate riêng ở từng tầng → bỏ --batch.")
+            args.batch = 1
+    # Context cache cần phần tĩnh (kể cả CHAR_DICT) giống hệt nhau ở mọi request → gửi đủ dictionary
+    subset_characters = not (args.full_char_dict or args.context_cache)
+    with metrics.stage("load_resources"):
+        for ep in episodes:
+            ep.load(args.scenes, args.resume, args.seed, subset_characters, args.dedup, args.dedup_threshold)
+    episodes = [ep for ep in episodes if ep.selected]
+    if not episodes:
+        print("⚠️ Không có cảnh nào trong scenes.txt – kiểm tra lại file input.")
+        gemini.tiers = None
+        return
+
+    if gemini.tiers:
+        # Cảnh nằm ở tầng đầu nhiều nhất, nhưng lúc lên tầng sau vẫn cần chỗ → cộng key mọi tầng
+        workers = args.workers or sum(len(t.scheduler) for t in gemini.tiers) * REQUESTS_PER_KEY
+    else:
+        workers = args.workers or len(get_scheduler()) * REQUESTS_PER_KEY
+    print(f"🚀 Chạy với {workers} request song song (window = {args.window}, batch = {args.batch}).")
+
+    response_cache = None
+    if not args.no_cache:
+        response_cache = gemini.response_cache = ResponseCache(args.cache_dir, read=not args.refresh)
+        removed = response_cache.evict()
+        if removed:
+            print(f"🧹 Đã xoá {removed} entry cache cũ.")
+
+    context_cache = None
+    if args.context_cache:
+        # Chỉ áp dụng cho request 1 cảnh; prompt batch có phần tĩnh khác nên vẫn gửi đầy đủ.
+        # Chỉ có 1 phần tĩnh được cache → các tập phải dùng chung dictionary + camera.
+        prefixes = {split_static_prefix(ep.char_dict_str, ep.camera_list_str) for ep in episodes}
+        if len(prefixes) == 1:
+            context_cache = gemini.context_cache = ContextCache(prefixes.pop())
+        else:
+            print("⚠️ Các tập dùng dictionary / camera khác nhau → bỏ qua --context-cache.")
+
+    gemini.stream_responses = args.stream
+
+    items = [(ep, scene) for ep in episodes for scene in ep.todo]
+    metrics.count("scenes_selected", sum(len(ep.selected) for ep in episodes))
+    metrics.count("scenes_resumed", sum(len(ep.done) for ep in episodes))
+    metrics.count("dedup_exact", sum(ep.dup_exact for ep in episodes))
+    metrics.count("dedup_near", sum(len(ep.dup_todo) - ep.dup_exact for ep in episodes))
+
+    # Journal chỉ giữ JSON thô của model. Cuối cùng (kể cả khi dừng giữa chừng)
+    # export journal → output của từng tập, hậu xử lý 1 lượt theo thứ tự cảnh.
+    for ep in episodes:
+        ep.open_journal(args.resume)
+    try:
+        with metrics.stage("generate"):
+            broken = generate_pass(items, workers, args.window, args.batch)
+        metrics.count("scenes_broken", len(broken))
+        with metrics.stage("regenerate"):
+            broken = regenerate_passes(broken, workers, args.window, args.regen)
+
+        # Cảnh trùng: cảnh gốc đã sinh (+ sinh lại) xong → dùng lại / làm mẫu
+        pending = fill_duplicates(episodes, args.dedup)
+        if pending:
+            print(f"🔁 Sinh tiếp {len(pending)} cảnh trùng không chép lại được kết quả.")
+            with metrics.stage("generate"):
+                # Prompt có mẫu (seed) chỉ dựng được cho request 1 cảnh
+                more = generate_pass(pending, workers, args.window, 1 if args.dedup == "seed" else args.batch)
+            metrics.count("scenes_broken", len(more))
+            with metrics.stage("regenerate"):
+                broken += regenerate_passes(more, workers, args.window, args.regen)
+        if broken:
+            metrics.count("scenes_still_broken", len(broken))
+            print(f"❌ Còn {len(broken)} cảnh hỏng, giữ raw line trong output (chạy --resume để thử lại).")
+
+        with metrics.stage("fix_fields"):
+            for attempt in range(1, args.fix_fields + 1):
+                fixed = fix_fields_pass(episodes, workers, args.window, refresh=attempt > 1)
+                metrics.count("field_fixed_scenes", fixed)
+                if not fixed:
+                    break
+    except Exception as e:
+        print(f"\n❌ Dừng giữa chừng: {e}")
+        print("💡 Các cảnh đã xong nằm trong journal, chạy lại với --resume để làm tiếp.")
+        raise
+    finally:
+        for ep in episodes:
+            ep.journal.close()
+        if context_cache is not None:
+            context_cache.cleanup()
+            gemini.context_cache = None
+        gemini.stream_responses = False
+        client_pool.close()
+        if response_cache is not None:
+            print(f"💾 Cache: {response_cache.hits} hit / {response_cache.misses} miss")
+            response_cache.close()
+            gemini.response_cache = None
+        with metrics.stage("export_postprocess"):
+            store = None if args.no_store else OutputStore(config.OUTPUT_STORE_FILE)
+            run_id = new_run_id()
+            try:
+                for ep in episodes:
+                    ep.export(store, run_id, args.seed, started_at, gemini.model_label())
+                    metrics.count("planner_changed", ep.post.planner.changed)
+            finally:
+                if store is not None:
+                    store.close()
+        if not args.no_metrics:
+            json_path = metrics_base + config.METRICS_JSON_SUFFIX
+            prom_path = metrics_base + config.METRICS_PROM_SUFFIX
+            metrics.write(json_path, prom_path)
+            print(f"📊 Metrics → {json_path}, {prom_path}")
+        metrics.print_tiers()
+        metrics.print_profile()
+        gemini.tiers = None
+
+    print()
+    for ep in episodes:
+        print(f"✅ {ep.tag}Xong! Đã lưu {len(ep.selected)} prompt vào {ep.output_file}")
+
+
+# ==============================
+# 9. WORKER CỦA HÀNG ĐỢI (lệnh queue work)
+# ==============================
+
+def run_worker(args):
+    """
+    Nhận cảnh từ hàng đợi (tachphai/workqueue.py) theo lease, sinh bằng phần key của worker này
+    (--keys), ghi kết quả về hàng đợi. Chạy bao nhiêu worker cũng được, trên 1 hay nhiều máy.
+    Dừng khi hàng đợi hết việc (không còn cảnh pending / đang bị worker khác giữ);
+    --wait: chạy tiếp, chờ cảnh mới được xếp vào.
+    Dòng hỏng / request lỗi → trả cảnh về hàng đợi (tối đa QUEUE_MAX_ATTEMPTS lần), worker nào rảnh thì làm lại.
+    """
+    metrics.reset(profile=args.profile)
+    queue = WorkQueue(args.queue)
+    owner = args.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    scheduler = get_scheduler(keys=args.keys)
+    workers = args.workers or len(scheduler) * REQUESTS_PER_KEY
+    claim_size = args.claim or workers * 2
+    print(f"👷 Worker {owner}: {workers} request song song, nhận tối đa {claim_size} cảnh / lượt, lease {args.lease:g}s.")
+
+    response_cache = None
+    if not args.no_cache:
+        response_cache = gemini.response_cache = ResponseCache(args.cache_dir, read=not args.refresh)
+    gemini.stream_responses = args.stream
+
+    episodes = {}
+
+    def load_episodes(names):
+        missing = set(names) - set(episodes)
+        if missing:
+            for ep in queue.episodes():
+                if ep.name in missing:
+                    episodes[ep.name] = ep.load_resources(args.seed, not args.full_char_dict)
+
+    def work(task):
+        ep = episodes[task.episode]
+        prompt = ep.prompt(task.scene)
+        try:
+            if task.line is None:
+                return call_gemini_cached(prompt), None
+            # Lần trước ra dòng hỏng → bỏ qua cache, chỉ ghi cache khi dòng mới dùng được
+            line = call_gemini(prompt)
+            if not line_errors(line):
+                cache_store(prompt, line)
+            return line, None
+        except NonRetryableError as e:
+            if e.kind == "exhausted":
+                return None, str(e)  # trả về hàng đợi như lỗi request, worker sau thử lại
+            return error_line(task.scene, e), None
+        except NoUsableKeysError:
+            raise  # worker dừng, cảnh đang giữ được trả về hàng đợi
+        except Exception as e:
+            return None, str(e)
+
+    # Heartbeat: gia hạn lease các cảnh đang giữ, để chỉ worker chết mới bị nhận lại cảnh
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(args.lease / 3):
+            queue.renew(owner, args.lease)
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+    done = retried = 0
+    try:
+        while True:
+            tasks, expired = queue.claim(owner, claim_size, args.lease)
+            if expired:
+                metrics.count("queue_requeued", expired)
+                print(f"♻️ Nhận lại {expired} cảnh từ worker khác đã hết lease.")
+            if not tasks:
+                if not args.wait and not queue.outstanding():
+                    break
+                time.sleep(QUEUE_POLL_SECONDS)
+                continue
+            metrics.count("queue_claimed", len(tasks))
+            load_episodes({task.episode for task in tasks})
+
+            results = generate_in_order(tasks, work, workers, args.window)
+            try:
+                for idx, (line, error) in results:
+                    task = tasks[idx]
+                    tag = episodes[task.episode].tag
+                    if line is None or (line_errors(line) and not is_terminal_line(line)):
+                        kept = queue.retry(owner, task, line, error, model=gemini.model_label())
+                        retried += 1
+                        metrics.count("queue_retry")
+                        reason = error or "; ".join(line_errors(line)[:3])
+                        if task.attempts + 1 < QUEUE_MAX_ATTEMPTS:
+                            print(f"⚠️ {tag}Cảnh {task.scene_number} lỗi ({reason}) → trả về hàng đợi (lần {task.attempts + 1}).")
+                        else:
+                            metrics.count("queue_gave_up")
+                            outcome = "giữ dòng hỏng trong output" if line else "failed"
+                            print(f"❌ {tag}Cảnh {task.scene_number} lỗi {QUEUE_MAX_ATTEMPTS} lần ({reason}) → {outcome}.")
+                    else:
+                        kept = queue.complete(owner, task, line, gemini.model_label())
+                        if kept:
+                            done += 1
+                            metrics.count("queue_done")
+                            print(f"⏳ {tag}Xong cảnh {task.scene_number} ({done} cảnh).")
+                    if not kept:
+                        metrics.count("queue_lease_lost")
+                        print(f"⚠️ {tag}Cảnh {task.scene_number}: mất lease (worker khác đã nhận lại) → bỏ kết quả.")
+            finally:
+                results.close()
+    except KeyboardInterrupt:
+        print("\n⏹️ Dừng worker.")
+    finally:
+        stop.set()
+        released = queue.release_all(owner)
+        if released:
+            print(f"↩️ Trả {released} cảnh đang giữ về hàng đợi.")
+        queue.close()
+        gemini.stream_responses = False
+        client_pool.close()
+        if response_cache is not None:
+            response_cache.close()
+            gemini.response_cache = None
+        if not args.no_metrics:
+            base = f"{args.queue}.{owner}"
+            metrics.write(base + config.METRICS_JSON_SUFFIX, base + config.METRICS_PROM_SUFFIX)
+            print(f"📊 Metrics → {base}{config.METRICS_JSON_SUFFIX}")
+        metrics.print_profile()
+
+    print(f"✅ Worker {owner}: xong {done} cảnh, trả lại {retried} lần.")
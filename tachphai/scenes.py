@@ -0,0 +1,145 @@
+"""
+Đọc scenes.txt: parser dạng stream (header "Scene <n>:" ở đầu dòng) và index byte offset
+để đọc riêng 1 cảnh / 1 khoảng cảnh mà không phải parse cả file.
+"""
+
+import hashlib
+import json
+import re
+from pathlib import Path
+
+from .config import SCENES_FILE
+
+# Header cảnh phải nằm ở ĐẦU DÒNG: "Scene 16:" hoặc "Scene 60 (Kết thúc):"
+# → chữ "Scene " giữa thân cảnh không bị tách nhầm
+SCENE_HEADER_RE = re.compile(rb"^Scene\s+(\d+)([^:\r\n]*):")
+
+
+def scene_number_of(scene: str) -> str:
+    """Lấy số cảnh từ block "Scene 16: ..." / "Scene 16 (Mở đầu): ..." → "16"."""
+    m = re.match(r"Scene\s+(\d+)", scene)
+    return m.group(1).strip() if m else ""
+
+
+def scene_hash(scene: str) -> str:
+    return hashlib.sha256(scene.encode("utf-8")).hexdigest()[:16]
+
+
+def iter_scenes(path: str = SCENES_FILE, start: int = 0, end: int = None):
+    """
+    Generator đọc scenes.txt theo từng dòng và yield từng cảnh "Scene <n>: <nội dung>"
+    ngay khi gặp header cảnh kế tiếp → không đọc cả file vào RAM.
+    start / end: khoảng byte cần đọc (dùng với index để chỉ đọc 1 đoạn file).
+    """
+    p = Path(path)
+    if not p.exists():
+        print(f"⚠️ Không tìm thấy {path}")
+        return
+
+    header, body = None, []
+
+    def flush():
+        content = b"".join(body).decode("utf-8").replace("\r\n", "\n").strip()
+        if header is not None and content:
+            return f"{header}: {content}"
+        return None
+
+    with p.open("rb") as f:
+        f.seek(start)
+        pos = start
+        for line in f:
+            if end is not None and pos >= end:
+                break
+            if pos == 0 and line.startswith(b"\xef\xbb\xbf"):
+                line = line[3:]
+            pos += len(line)
+
+            m = SCENE_HEADER_RE.match(line)
+            if m:
+                block = flush()
+                if block:
+                    yield block
+                header = "Scene " + (m.group(1) + m.group(2)).decode("utf-8").strip()
+                body = [line[m.end():]]
+            elif header is not None:
+                body.append(line)
+
+    block = flush()
+    if block:
+        yield block
+
+
+def build_scene_index(path: str = SCENES_FILE):
+    """
+    Quét header 1 lượt → list [scene_number, byte_start, byte_end].
+    Index được lưu cạnh file (scenes.txt.idx) kèm size + mtime, file không đổi thì
+    lần sau đọc index luôn, không quét lại.
+    """
+    p = Path(path)
+    stat = p.stat()
+    idx_path = Path(str(p) + ".idx")
+    if idx_path.exists():
+        try:
+            cached = json.loads(idx_path.read_text(encoding="utf-8"))
+            if cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+                return cached["scenes"]
+        except (json.JSONDecodeError, KeyError):
+            pass
+
+    index = []
+    with p.open("rb") as f:
+        pos = 0
+        for line in f:
+            if pos == 0 and line.startswith(b"\xef\xbb\xbf"):
+                m = SCENE_HEADER_RE.match(line[3:])
+            else:
+                m = SCENE_HEADER_RE.match(line)
+            if m:
+                if index:
+                    index[-1][2] = pos
+                index.append([int(m.group(1)), pos, None])
+            pos += len(line)
+    if index:
+        index[-1][2] = pos
+
+    try:
+        idx_path.write_text(
+            json.dumps({"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "scenes": index}),
+            encoding="utf-8",
+        )
+    except OSError:
+        pass
+    return index
+
+
+def parse_scene_range(text: str):
+    """ "40-60" → (40, 60), "42" → (42, 42)."""
+    lo, _, hi = text.partition("-")
+    lo = int(lo)
+    return lo, int(hi) if hi else lo
+
+
+def load_scene_range(path: str, lo: int, hi: int):
+    """Chỉ đọc các cảnh có số trong [lo, hi], nhảy thẳng tới đoạn byte tương ứng nhờ index."""
+    if not Path(path).exists():
+        print(f"⚠️ Không tìm thấy {path}")
+        return []
+    index = [entry for entry in build_scene_index(path) if lo <= entry[0] <= hi]
+    if not index:
+        return []
+    start = min(entry[1] for entry in index)
+    end = max(entry[2] for entry in index)
+    return [
+        scene for scene in iter_scenes(path, start, end)
+        if lo <= int(scene_number_of(scene)) <= hi
+    ]
+
+
+def load_scenes(path: str = SCENES_FILE):
+    """
+    Đọc file scenes.txt và tách thành từng cảnh.
+    Format gợi ý:
+        Scene 16: ...
+        Scene 17: ...
+    """
+    return list(iter_scenes(path))
@@ -0,0 +1,59 @@
+"""Thống kê offline cho scenes.txt và output_prompts.txt (không gọi API)."""
+
+import json
+from collections import Counter
+from pathlib import Path
+
+from .validate import get_field
+
+
+def scene_stats(path: str) -> dict:
+    """Số cảnh, số từ / cảnh (min / trung bình / max)."""
+    from .scenes import iter_scenes
+
+    words = [len(scene.split()) for scene in iter_scenes(path)]
+    if not words:
+        return {"scenes": 0}
+    return {
+        "scenes": len(words),
+        "words_min": min(words),
+        "words_avg": round(sum(words) / len(words), 1),
+        "words_max": max(words),
+    }
+
+
+def output_stats(path: str) -> dict:
+    """Đọc output JSON lines theo stream: số dòng, dòng lỗi, phân bố shot_type / camera, độ dài action_block."""
+    p = Path(path)
+    if not p.exists():
+        return {"lines": 0}
+
+    lines = invalid = 0
+    shot_types, cameras = Counter(), Counter()
+    action_words = []
+    with p.open("r", encoding="utf-8") as f:
+        for raw in f:
+            if not raw.strip():
+                continue
+            lines += 1
+            try:
+                data = json.loads(raw)
+            except json.JSONDecodeError:
+                invalid += 1
+                continue
+            shot_types[str(get_field(data, "cinematic.shot_type"))] += 1
+            cameras[str(get_field(data, "cinematic.camera"))] += 1
+            content = get_field(data, "action_block.content")
+            if isinstance(content, str):
+                action_words.append(len(content.split()))
+
+    result = {
+        "lines": lines,
+        "invalid_json": invalid,
+        "shot_types": dict(shot_types.most_common()),
+        "top_cameras": dict(cameras.most_common(5)),
+    }
+    if action_words:
+        result["action_words_avg"] = round(sum(action_words) / len(action_words), 1)
+        result["action_words_out_of_range"] = sum(1 for w in action_words if not 150 <= w <= 200)
+    return result
@@ -0,0 +1,161 @@
+"""
+Kho output có version (SQLite): mỗi lần export ghi lại 1 "run" đầy đủ của từng tập, thay cho việc
+copy output_prompts.txt bằng tay. Lấy 1 cảnh bất kỳ theo (tập, số cảnh) qua index, so sánh 2 run,
+export lại đúng định dạng JSON lines hiện tại.
+
+    lines    hash → dòng JSON (đã hậu xử lý). Dòng giống hệt nhau giữa các run chỉ lưu 1 lần.
+    runs     run_id, tập, thời điểm, model, seed, file output, số cảnh
+    results  (run_id, tập, scene_number) → thứ tự cảnh, hash prompt, hash cảnh, hash dòng
+"""
+
+import hashlib
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from .config import MODEL_NAME, OUTPUT_STORE_FILE
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS lines (hash TEXT PRIMARY KEY, line TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS runs ("
+    " run_id TEXT NOT NULL, episode TEXT NOT NULL, started_at REAL, finished_at REAL,"
+    " model TEXT, seed INTEGER, output_file TEXT, scenes INTEGER,"
+    " PRIMARY KEY (run_id, episode))",
+    "CREATE TABLE IF NOT EXISTS results ("
+    " run_id TEXT NOT NULL, episode TEXT NOT NULL, scene_number TEXT NOT NULL, position INTEGER NOT NULL,"
+    " prompt_hash TEXT, scene_hash TEXT, line_hash TEXT NOT NULL,"
+    " PRIMARY KEY (episode, scene_number, run_id))",
+    "CREATE INDEX IF NOT EXISTS results_by_run ON results (run_id, episode, position)",
+)
+
+
+def line_hash(line: str) -> str:
+    return hashlib.sha256(line.encode("utf-8")).hexdigest()
+
+
+def new_run_id() -> str:
+    """Sắp theo thời gian được: 20261017-153012-a1b2."""
+    return time.strftime("%Y%m%d-%H%M%S") + "-" + secrets.token_hex(2)
+
+
+class OutputStore:
+    """
+    - record_run(): ghi 1 run của 1 tập (dùng khi export, xem Episode.export)
+    - get(episode, scene_number, run_id=None): 1 dòng, mặc định lấy từ run mới nhất của tập
+    - runs(), diff(), export(): cho lệnh `tachphai store ...` và tool dựng video
+    """
+
+    def __init__(self, path: str = OUTPUT_STORE_FILE):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(self.path), check_same_thread=False)
+        for statement in SCHEMA:
+            self.db.execute(statement)
+        self.db.commit()
+
+    # ----- GHI -----
+
+    def record_run(self, run_id: str, episode: str, rows, seed: int = None, output_file: str = None,
+                   started_at: float = None, model: str = MODEL_NAME) -> int:
+        """
+        rows: iterable (scene_number, line, prompt_hash, scene_hash) theo thứ tự cảnh.
+        Ghi trong 1 transaction; chạy lại cùng run_id + tập thì thay bản cũ. Trả về số cảnh.
+        """
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM results WHERE run_id = ? AND episode = ?", (run_id, episode))
+            count = 0
+            for position, (scene_number, line, prompt_hash, scene_hash) in enumerate(rows):
+                h = line_hash(line)
+                self.db.execute("INSERT OR IGNORE INTO lines VALUES (?, ?)", (h, line))
+                self.db.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (run_id, episode, str(scene_number), position, prompt_hash, scene_hash, h),
+                )
+                count += 1
+            self.db.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, episode, started_at or time.time(), time.time(), model, seed, output_file, count),
+            )
+        return count
+
+    # ----- ĐỌC -----
+
+    def latest_run(self, episode: str):
+        row = self.db.execute(
+            "SELECT run_id FROM runs WHERE episode = ? ORDER BY finished_at DESC, run_id DESC LIMIT 1", (episode,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get(self, episode: str, scene_number, run_id: str = None):
+        """Dòng JSON của 1 cảnh (None nếu không có)."""
+        with self.lock:
+            if run_id is None:
+                run_id = self.latest_run(episode)
+            row = self.db.execute(
+                "SELECT l.line FROM results r JOIN lines l ON l.hash = r.line_hash"
+                " WHERE r.episode = ? AND r.scene_number = ? AND r.run_id = ?",
+                (episode, str(scene_number), run_id),
+            ).fetchone()
+        return row[0] if row else None
+
+    def runs(self, episode: str = None) -> list:
+        sql = "SELECT run_id, episode, started_at, finished_at, model, seed, output_file, scenes FROM runs"
+        args = ()
+        if episode is not None:
+            sql += " WHERE episode = ?"
+            args = (episode,)
+        with self.lock:
+            rows = self.db.execute(sql + " ORDER BY finished_at, run_id", args).fetchall()
+        keys = ("run_id", "episode", "started_at", "finished_at", "model", "seed", "output_file", "scenes")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def episodes(self) -> list:
+        with self.lock:
+            return [row[0] for row in self.db.execute("SELECT DISTINCT episode FROM runs ORDER BY episode")]
+
+    def iter_run(self, episode: str, run_id: str):
+        """Yield (scene_number, line) của 1 run theo thứ tự cảnh."""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT r.scene_number, l.line FROM results r JOIN lines l ON l.hash = r.line_hash"
+                " WHERE r.run_id = ? AND r.episode = ? ORDER BY r.position",
+                (run_id, episode),
+            ).fetchall()
+        yield from rows
+
+    def diff(self, episode: str, run_a: str, run_b: str) -> dict:
+        """{"added": [...], "removed": [...], "changed": [...], "same": n} — theo scene_number, a → b."""
+        with self.lock:
+            a = dict(self.db.execute(
+                "SELECT scene_number, line_hash FROM results WHERE run_id = ? AND episode = ? ORDER BY position",
+                (run_a, episode)))
+            b = dict(self.db.execute(
+                "SELECT scene_number, line_hash FROM results WHERE run_id = ? AND episode = ? ORDER BY position",
+                (run_b, episode)))
+        return {
+            "added": [n for n in b if n not in a],
+            "removed": [n for n in a if n not in b],
+            "changed": [n for n in b if n in a and a[n] != b[n]],
+            "same": sum(1 for n in b if a.get(n) == b[n]),
+        }
+
+    def export(self, episode: str, out_path: str, run_id: str = None) -> int:
+        """Ghi lại 1 run ra file JSON lines (định dạng output_prompts.txt). Trả về số cảnh."""
+        if run_id is None:
+            with self.lock:
+                run_id = self.latest_run(episode)
+        tmp = Path(str(out_path) + ".tmp")
+        count = 0
+        with tmp.open("w", encoding="utf-8") as f:
+            for _, line in self.iter_run(episode, run_id):
+                f.write(line + "\n")
+                count += 1
+        os.replace(tmp, out_path)
+        return count
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,88 @@
+"""
+Theo dõi cấu trúc JSON của response đang stream (--stream), từng chunk, để dừng sớm response hỏng
+thay vì chờ model sinh hết (và tính tiền hết) rồi mới biết.
+
+Chỉ đếm ngoặc + chuỗi, không parse đầy đủ: lỗi nhỏ trong chuỗi (quote chưa escape...) vẫn để
+repair.py sửa sau như khi không stream. Không import google.
+"""
+
+from .config import STREAM_MAX_DEPTH, STREAM_MAX_OBJECT_CHARS, STREAM_MAX_PROSE_CHARS
+
+CLOSERS = {"}": "{", "]": "["}
+
+
+class StreamViolation(Exception):
+    """Response đang stream chắc chắn không thành JSON dùng được → dừng đọc."""
+
+
+class JSONStreamMonitor:
+    """
+    feed(text) cho từng chunk:
+      - trả về True khi đã đủ max_objects object JSON hoàn chỉnh ở mức ngoài cùng
+        (1 cảnh: đóng ngoặc '}' cuối là xong, không cần đọc phần còn lại)
+      - raise StreamViolation khi:
+          * chữ ngoài JSON (không tính khoảng trắng, code fence ```) vượt max_prose ký tự
+          * ngoặc đóng thừa / sai loại
+          * 1 object dài quá max_object_chars hoặc lồng quá max_depth (model lặp vô tận)
+    Object chưa đóng khi hết stream = response bị cắt → người gọi xem truncated.
+    """
+
+    def __init__(self, max_objects: int = None, max_prose: int = STREAM_MAX_PROSE_CHARS,
+                 max_object_chars: int = STREAM_MAX_OBJECT_CHARS, max_depth: int = STREAM_MAX_DEPTH):
+        self.max_objects = max_objects
+        self.max_prose = max_prose
+        self.max_object_chars = max_object_chars
+        self.max_depth = max_depth
+
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.objects = 0
+        self.prose = 0
+        self.object_chars = 0
+
+    @property
+    def truncated(self) -> bool:
+        return bool(self.stack)
+
+    def feed(self, text: str) -> bool:
+        for ch in text:
+            if not self.stack:
+                if ch in "{[":
+                    self.stack.append(ch)
+                    self.object_chars = 1
+                elif ch in "}]":
+                    raise StreamViolation(f"ngoặc đóng thừa '{ch}' ngoài JSON")
+                elif not ch.isspace() and ch != "`":
+                    self.prose += 1
+                    if self.prose > self.max_prose:
+                        raise StreamViolation(f"hơn {self.max_prose} ký tự chữ thừa ngoài JSON")
+                continue
+
+            self.object_chars += 1
+            if self.object_chars > self.max_object_chars:
+                raise StreamViolation(f"1 object JSON dài hơn {self.max_object_chars} ký tự")
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                continue
+
+            if ch == '"':
+                self.in_string = True
+            elif ch in "{[":
+                self.stack.append(ch)
+                if len(self.stack) > self.max_depth:
+                    raise StreamViolation(f"JSON lồng sâu hơn {self.max_depth} mức")
+            elif ch in "}]":
+                if self.stack.pop() != CLOSERS[ch]:
+                    raise StreamViolation(f"đóng ngoặc sai loại '{ch}'")
+                if not self.stack:
+                    self.objects += 1
+                    if self.max_objects and self.objects >= self.max_objects:
+                        return True
+        return False
@@ -0,0 +1,58 @@
+"""
+Model theo tầng (--tiers): mỗi cảnh thử tầng đầu (model nhanh / rẻ) trước, dòng ra không qua
+validate (sai cấu trúc hoặc field sai rule) mới lên tầng sau. Tầng cuối là model mạnh nhất:
+dòng của tầng cuối được nhận như khi không chia tầng (hỏng thì --regen / --fix-fields xử lý tiếp).
+
+File tầng (JSON, đường dẫn file key tính từ thư mục chứa file tầng):
+    [
+      {"name": "lite", "model": "models/gemini-2.5-flash-lite", "keys": "api_keys_lite.txt", "rpm": 30},
+      {"name": "flash", "model": "models/gemini-2.5-flash", "select": "1-2"}
+    ]
+  - keys:   file key riêng của tầng (mặc định api_keys.txt)
+  - select: chỉ dùng 1 phần key trong file ("1-4,7" / "K/N", như `queue work --keys`)
+  - rpm / tpm: quota mặc định cho key không ghi rpm= / tpm= riêng trong file
+
+Mỗi tầng có KeyScheduler riêng: quota Gemini tính theo từng model, nên cùng 1 key vẫn có
+ngân sách request / token riêng cho mỗi tầng. Không import google.
+"""
+
+import json
+from pathlib import Path
+
+from .config import API_KEYS_FILE, KEY_RPM, KEY_TPM
+from .keys import KeyScheduler, load_api_keys, select_keys
+
+
+class Tier:
+    def __init__(self, name: str, model: str, scheduler: KeyScheduler):
+        self.name = name
+        self.model = model
+        self.scheduler = scheduler
+
+
+def load_tiers(path: str) -> list:
+    """File tầng → [Tier], theo thứ tự thử. Sai định dạng → ValueError."""
+    p = Path(path)
+    data = json.loads(p.read_text(encoding="utf-8"))
+    if isinstance(data, dict):
+        data = data.get("tiers")
+    if not isinstance(data, list) or not data:
+        raise ValueError(f"{path}: cần list tầng [{{\"name\", \"model\", ...}}, ...]")
+
+    tiers = []
+    for entry in data:
+        if not isinstance(entry, dict) or not entry.get("model"):
+            raise ValueError(f"{path}: mỗi tầng cần ít nhất \"model\": {entry!r}")
+        name = entry.get("name") or entry["model"].rsplit("/", 1)[-1]
+        if any(t.name == name for t in tiers):
+            raise ValueError(f"{path}: trùng tên tầng {name}")
+        keys_file = p.parent / entry["keys"] if entry.get("keys") else Path(API_KEYS_FILE)
+        entries = load_api_keys(str(keys_file), entry.get("rpm", KEY_RPM), entry.get("tpm", KEY_TPM))
+        used = f"{len(entries)} key"
+        if entry.get("select"):
+            picked = select_keys(entries, entry["select"])
+            used = f"{len(picked)}/{len(entries)} key ({entry['select']})"
+            entries = picked
+        print(f"🪜 Tầng {name}: {entry['model']}, {used} từ {keys_file}")
+        tiers.append(Tier(name, entry["model"], KeyScheduler(entries)))
+    return tiers
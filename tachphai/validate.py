@@ -0,0 +1,143 @@
+"""
+Kiểm tra 1 dòng output JSON:
+  - schema_errors: sai CẤU TRÚC (thiếu field / sai kiểu) → dòng không dùng được, phải sinh lại
+  - field_violations: field sai rule nhưng sửa riêng được bằng 1 request nhỏ (dialogue, action_block)
+  - validate_data: tất cả những thứ trên + rule mềm (camera, shot_type)
+"""
+
+from .repair import parse_lenient
+
+SHOT_TYPES = ("wide", "medium", "close-up", "extreme close-up")
+ACTION_BLOCK_WORDS = (150, 200)
+
+# Cấu trúc bắt buộc của 1 dòng output (theo PROMPT_TEMPLATE).
+# dict = object con phải có các field bên trong; tuple / type = kiểu cho phép của giá trị.
+# dialogue / action_block không nằm ở đây: hỏng thì sửa riêng field đó (field_violations).
+OUTPUT_SCHEMA = {
+    "scene_number": (int, str),
+    "scene_title": str,
+    "character": {"name": str},
+    "setting": {"location": str},
+    "cinematic": {"camera": str, "shot_type": str},
+}
+
+
+def compile_schema(schema: dict, prefix: tuple = ()) -> list:
+    """
+    Biến schema lồng nhau thành list phẳng (dotted, path, types) để kiểm tra không cần đệ quy.
+    Object cha đứng trước object con → thiếu cha thì chỉ báo 1 lỗi.
+    """
+    checks = []
+    for name, spec in schema.items():
+        path = prefix + (name,)
+        if isinstance(spec, dict):
+            checks.append((".".join(path), path, (dict,)))
+            checks.extend(compile_schema(spec, path))
+        else:
+            checks.append((".".join(path), path, spec if isinstance(spec, tuple) else (spec,)))
+    return checks
+
+
+COMPILED_SCHEMA = compile_schema(OUTPUT_SCHEMA)
+
+
+def get_field(data, dotted: str):
+    """Lấy data["a"]["b"] theo "a.b", thiếu thì trả None."""
+    for part in dotted.split("."):
+        if not isinstance(data, dict) or part not in data:
+            return None
+        data = data[part]
+    return data
+
+
+def schema_errors(data) -> list:
+    """Lỗi cấu trúc theo COMPILED_SCHEMA (rỗng = dùng được)."""
+    if not isinstance(data, dict):
+        return ["không phải JSON object"]
+
+    errors = []
+    broken = set()  # object cha đã hỏng → bỏ qua field con
+    for dotted, path, types in COMPILED_SCHEMA:
+        if path[:-1] in broken:
+            broken.add(path)
+            continue
+        value = data
+        for part in path:
+            value = value.get(part) if isinstance(value, dict) else None
+        if value is None or value == "":
+            errors.append(f"thiếu {dotted}")
+            broken.add(path)
+        elif not isinstance(value, types) or isinstance(value, bool):
+            errors.append(f"{dotted} sai kiểu ({type(value).__name__})")
+            broken.add(path)
+    return errors
+
+
+def field_violations(data: dict) -> dict:
+    """{field: lý do} cho các field sửa riêng được: dialogue thiếu / rỗng, action_block sai độ dài."""
+    violations = {}
+
+    dialogue = data.get("dialogue")
+    if isinstance(dialogue, dict):
+        dialogue = dialogue.get("characters")
+    if not dialogue:
+        violations["dialogue"] = "thiếu dialogue"
+
+    content = get_field(data, "action_block.content")
+    if not isinstance(content, str) or not content.strip():
+        violations["action_block"] = "thiếu action_block.content"
+    else:
+        words = len(content.split())
+        lo, hi = ACTION_BLOCK_WORDS
+        if not lo <= words <= hi:
+            violations["action_block"] = f"action_block {words} từ (yêu cầu {lo}-{hi})"
+
+    return violations
+
+
+def validate_data(data: dict, camera_styles=None) -> list:
+    """Trả về list lỗi (rỗng = hợp lệ): lỗi cấu trúc + field sai rule + rule mềm."""
+    issues = schema_errors(data)
+    if not isinstance(data, dict):
+        return issues
+    issues.extend(field_violations(data).values())
+
+    shot = get_field(data, "cinematic.shot_type")
+    if isinstance(shot, str) and shot.strip().lower() not in SHOT_TYPES:
+        issues.append(f"shot_type lạ: {shot!r}")
+
+    cam = get_field(data, "cinematic.camera")
+    if camera_styles and isinstance(cam, str) and cam.strip() not in camera_styles:
+        issues.append(f"camera không có trong danh sách: {cam!r}")
+
+    return issues
+
+
+def validate_line(line: str, camera_styles=None):
+    """Parse (có sửa lỗi) + kiểm tra 1 dòng. Trả về (data hoặc None, list lỗi)."""
+    data, repaired = parse_lenient(line)
+    if data is None:
+        return None, ["JSON lỗi, không sửa được"]
+    issues = validate_data(data, camera_styles)
+    if repaired:
+        issues.insert(0, "JSON lỗi (sửa được)")
+    return data, issues
+
+
+def line_errors(line: str) -> list:
+    """Lỗi khiến dòng phải sinh lại: không parse / sửa được, hoặc sai cấu trúc."""
+    data, _ = parse_lenient(line)
+    if data is None:
+        return ["JSON lỗi, không sửa được"]
+    return schema_errors(data)
+
+
+def tier_errors(line: str) -> list:
+    """Lỗi khiến dòng của tầng model thấp không được nhận (--tiers): lỗi như line_errors + field sai rule."""
+    data, _ = parse_lenient(line)
+    if data is None:
+        return ["JSON lỗi, không sửa được"]
+    errors = schema_errors(data)
+    if not errors and isinstance(data, dict):
+        errors = list(field_violations(data).values())
+    return errors
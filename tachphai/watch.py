@@ -0,0 +1,160 @@
+"""
+Lệnh watch: chạy mãi, theo dõi scenes.txt / character_dictionary.json / camera_styles.txt.
+Mỗi lần 1 file đổi, chỉ sinh lại những cảnh thật sự cần rồi ghi đè output tại chỗ:
+
+  - cảnh mới / cảnh sửa: hash nội dung cảnh khác journal (như --resume)
+  - cảnh có nhân vật được sửa trong dictionary: phần CHAR_DICT gửi cho cảnh đó (char_dict_for)
+    khác lần trước → chỉ cảnh nhắc tới nhân vật đổi mới bị sinh lại
+  - cảnh bị xoá: không còn trong output sau lần export kế tiếp
+  - camera_styles.txt đổi: không sinh lại, chỉ hậu xử lý lại (kế hoạch camera chọn lại theo danh sách mới)
+
+Lần quét đầu tiên chỉ dựa vào journal, chưa biết dictionary đã đổi gì trước khi bật watch.
+"""
+
+import hashlib
+import time
+from pathlib import Path
+
+from . import config, gemini
+from .cache import ResponseCache
+from .episodes import Episode
+from .gemini import client_pool, get_scheduler
+from .metrics import metrics
+from .runner import fill_duplicates, fix_fields_pass, generate_pass, regenerate_passes
+from .scenes import scene_hash, scene_number_of
+from .validate import line_errors
+
+
+def file_stamps(ep: Episode) -> tuple:
+    """(mtime, size) của 3 file input; file không tồn tại → None."""
+    stamps = []
+    for path in (ep.scenes_file, ep.character_dict_file, ep.camera_styles_file):
+        try:
+            st = Path(path).stat()
+            stamps.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamps.append(None)
+    return tuple(stamps)
+
+
+def wait_until_stable(ep: Episode, stamps: tuple, debounce: float) -> tuple:
+    """Editor thường ghi file nhiều bước → chờ tới khi các file đứng yên `debounce` giây."""
+    while True:
+        time.sleep(debounce)
+        now = file_stamps(ep)
+        if now == stamps:
+            return now
+        stamps = now
+
+
+def char_dict_digest(ep: Episode, scene: str) -> str:
+    return hashlib.sha256(ep.char_dict_for([scene]).encode("utf-8")).hexdigest()
+
+
+def plan_changes(ep: Episode, previous: dict) -> dict:
+    """
+    Sau ep.load(resume=True): ep.todo = cảnh mới / sửa / hỏng. Thêm các cảnh đã xong nhưng
+    CHAR_DICT của cảnh khác lần quét trước. Trả về số cảnh theo từng loại để in báo cáo.
+    """
+    journal = ep.journal.load()
+    counts = {"new": 0, "changed": 0, "broken": 0, "characters": 0, "removed": 0}
+    for scene in ep.todo + ep.dup_todo:
+        entry = journal.get(scene_number_of(scene))
+        if entry is None:
+            counts["new"] += 1
+        elif entry[0] != scene_hash(scene):
+            counts["changed"] += 1
+        elif line_errors(entry[1]):
+            counts["broken"] += 1
+
+    for scene in ep.selected:
+        num = scene_number_of(scene)
+        old = previous.get(num)
+        if num in ep.done and old is not None and old != char_dict_digest(ep, scene):
+            del ep.done[num]
+            counts["characters"] += 1
+    if counts["characters"]:
+        ep.plan_todo()
+
+    counts["removed"] = len(set(previous) - {scene_number_of(scene) for scene in ep.selected})
+    return counts
+
+
+def regenerate_changes(ep: Episode, args, workers: int, previous: dict) -> dict:
+    """
+    1 lượt: nạp lại input, sinh các cảnh cần sinh, export output.
+    Trả về {scene_number: digest CHAR_DICT} mới để lần sau so sánh; input đang hỏng → giữ previous.
+    """
+    ep.load(None, resume=True, seed=args.seed, subset_characters=not args.full_char_dict,
+            dedup=args.dedup, dedup_threshold=args.dedup_threshold)
+    if not ep.selected:
+        print(f"⚠️ {ep.scenes_file} trống / không đọc được → chờ lần sửa kế tiếp.")
+        return previous
+    if not ep.character_dict and Path(ep.character_dict_file).exists() and Path(ep.character_dict_file).stat().st_size:
+        # Đang sửa dở JSON: đừng coi như mọi nhân vật bị xoá rồi sinh lại cả tập
+        print(f"⚠️ {ep.character_dict_file} lỗi JSON → chờ lần sửa kế tiếp.")
+        return previous
+
+    counts = plan_changes(ep, previous)
+    planned = ep.planned
+    print(f"🔍 Mới {counts['new']} / sửa {counts['changed']} / nhân vật đổi {counts['characters']} / "
+          f"hỏng {counts['broken']} / xoá {counts['removed']} → sinh {planned} cảnh.")
+
+    t0 = time.perf_counter()
+    ep.open_journal(resume=True)
+    try:
+        broken = generate_pass([(ep, scene) for scene in ep.todo], workers, args.window, args.batch)
+        broken = regenerate_passes(broken, workers, args.window, args.regen)
+        pending = fill_duplicates([ep], args.dedup)
+        if pending:
+            more = generate_pass(pending, workers, args.window, 1 if args.dedup == "seed" else args.batch)
+            broken += regenerate_passes(more, workers, args.window, args.regen)
+        if broken:
+            print(f"❌ Còn {len(broken)} cảnh hỏng, sẽ thử lại ở lần sửa kế tiếp.")
+        for attempt in range(1, args.fix_fields + 1):
+            if not fix_fields_pass([ep], workers, args.window, refresh=attempt > 1):
+                break
+    finally:
+        ep.journal.close()
+        ep.export()
+    if planned:
+        print(f"⚡ Sinh {planned} cảnh trong {time.perf_counter() - t0:.1f}s.")
+    return {scene_number_of(scene): char_dict_digest(ep, scene) for scene in ep.selected}
+
+
+def run_watch(args):
+    """Lệnh watch: 1 tập với các file mặc định trong config, chạy tới khi Ctrl+C."""
+    ep = Episode("", config.SCENES_FILE, config.OUTPUT_FILE, config.CHARACTER_DICT_FILE, config.CAMERA_STYLES_FILE)
+    metrics.reset(profile=False)
+    workers = args.workers or len(get_scheduler()) * config.REQUESTS_PER_KEY
+    response_cache = None
+    if not args.no_cache:
+        response_cache = gemini.response_cache = ResponseCache(args.cache_dir, read=not args.refresh)
+    gemini.stream_responses = args.stream
+
+    previous = {}
+    stamps = None
+    print(f"👀 Theo dõi {ep.scenes_file}, {ep.character_dict_file}, {ep.camera_styles_file} (Ctrl+C để dừng).")
+    try:
+        while True:
+            now = file_stamps(ep)
+            if now != stamps:
+                if stamps is not None:
+                    print("\n✏️ Input vừa đổi.")
+                    now = wait_until_stable(ep, now, args.debounce)
+                stamps = now
+                try:
+                    previous = regenerate_changes(ep, args, workers, previous)
+                except Exception as e:
+                    # Hết quota / mất mạng...: cảnh đã xong vẫn nằm trong journal, lần sửa sau làm tiếp
+                    print(f"❌ Lượt này dừng giữa chừng: {e}")
+                print(f"👀 Chờ thay đổi... ({time.strftime('%H:%M:%S')})")
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print("\n⏹️ Dừng watch.")
+    finally:
+        gemini.stream_responses = False
+        client_pool.close()
+        if response_cache is not None:
+            response_cache.close()
+            gemini.response_cache = None
@@ -0,0 +1,303 @@
+"""
+Hàng đợi công việc trên SQLite (lệnh `tachphai queue ...`): 1 process xếp cảnh vào hàng đợi,
+bao nhiêu process worker cũng được (trên 1 máy, hoặc nhiều máy chung 1 thư mục) nhận cảnh theo lease,
+gọi Gemini với bộ key riêng của mình rồi ghi kết quả lại vào hàng đợi.
+
+    episodes  tên tập → file scenes / output / character dictionary / camera styles
+              (đường dẫn tương đối theo thư mục chứa file hàng đợi nếu được)
+    tasks     (tập, scene_number) → nội dung cảnh, trạng thái, lease, số lần thử, dòng JSON,
+              model đã sinh ra dòng đó (gemini.model_label() của worker, ghi vào OutputStore khi export)
+
+Trạng thái task: pending → leased (có owner + hạn lease) → done / failed.
+Worker chết giữa chừng → lease hết hạn → task tự được worker khác nhận lại.
+Worker đang chạy gia hạn lease định kỳ (heartbeat), nên lease chỉ hết hạn khi worker thật sự dừng.
+
+Lưu ý khi chạy nhiều máy: SQLite trên ổ mạng cần file lock hoạt động đúng (SMB / NFS có lockd),
+và đồng hồ các máy phải đồng bộ (hạn lease tính theo time.time()).
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from .config import MODEL_NAME, QUEUE_BUSY_TIMEOUT, QUEUE_FILE, QUEUE_MAX_ATTEMPTS
+from .episodes import Episode
+from .retry import is_terminal_line
+from .scenes import scene_hash, scene_number_of
+from .validate import line_errors
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS episodes ("
+    " name TEXT PRIMARY KEY, scenes_file TEXT, output_file TEXT,"
+    " character_dict_file TEXT, camera_styles_file TEXT)",
+    "CREATE TABLE IF NOT EXISTS tasks ("
+    " episode TEXT NOT NULL, scene_number TEXT NOT NULL, position INTEGER NOT NULL,"
+    " scene TEXT NOT NULL, scene_hash TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'pending',"
+    " owner TEXT, lease_until REAL, attempts INTEGER NOT NULL DEFAULT 0, line TEXT, error TEXT, updated_at REAL,"
+    " model TEXT, PRIMARY KEY (episode, scene_number))",
+    "CREATE INDEX IF NOT EXISTS tasks_by_status ON tasks (status, lease_until, position)",
+)
+# Cột thêm sau: file hàng đợi cũ được ALTER TABLE khi mở
+ADDED_COLUMNS = (("tasks", "model", "TEXT"),)
+EPISODE_PATHS = ("scenes_file", "output_file", "character_dict_file", "camera_styles_file")
+
+
+class Task:
+    """1 cảnh đã nhận từ hàng đợi."""
+
+    def __init__(self, episode: str, scene_number: str, scene: str, attempts: int, line: str = None):
+        self.episode = episode
+        self.scene_number = scene_number
+        self.scene = scene
+        self.attempts = attempts
+        self.line = line
+
+
+class WorkQueue:
+    """
+    - enqueue(): lệnh `queue enqueue`
+    - claim() / renew() / complete() / retry() / release_all(): worker (runner.run_worker)
+    - counts() / done_lines(): lệnh `queue status` / `queue export`
+    Mỗi thao tác ghi là 1 transaction BEGIN IMMEDIATE → 2 worker không bao giờ nhận cùng 1 task.
+    """
+
+    def __init__(self, path: str = QUEUE_FILE):
+        self.path = Path(path)
+        self.base = self.path.resolve().parent
+        self.lock = threading.Lock()
+        # isolation_level=None: tự quản transaction (BEGIN IMMEDIATE khi nhận task)
+        self.db = sqlite3.connect(str(self.path), timeout=QUEUE_BUSY_TIMEOUT,
+                                  isolation_level=None, check_same_thread=False)
+        with self.lock:
+            for statement in SCHEMA:
+                self.db.execute(statement)
+            for table, column, kind in ADDED_COLUMNS:
+                if column not in {row[1] for row in self.db.execute(f"PRAGMA table_info({table})")}:
+                    self.db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+
+    def transaction(self):
+        self.db.execute("BEGIN IMMEDIATE")
+
+    # ----- TẬP -----
+
+    def relative(self, path: str) -> str:
+        p = Path(path).resolve()
+        try:
+            return str(p.relative_to(self.base))
+        except ValueError:
+            return str(p)
+
+    def episodes(self) -> list:
+        """Các tập trong hàng đợi → Episode (đường dẫn đã tính lại theo thư mục hàng đợi)."""
+        with self.lock:
+            rows = self.db.execute("SELECT name, " + ", ".join(EPISODE_PATHS) + " FROM episodes ORDER BY rowid").fetchall()
+        return [Episode(name, *(str(self.base / p) for p in paths)) for name, *paths in rows]
+
+    # ----- XẾP HÀNG -----
+
+    def enqueue(self, episode: Episode, scenes) -> tuple:
+        """
+        Xếp các cảnh của 1 tập. Cảnh đã có với cùng nội dung → giữ nguyên (đang chờ / đang chạy / đã xong);
+        cảnh mới / đã sửa / lần trước failed hoặc ra dòng hỏng (trừ dòng lỗi cố định) → pending, số lần thử về 0.
+        Trả về (số cảnh xếp mới, số cảnh giữ nguyên).
+        """
+        added = kept = 0
+        now = time.time()
+        with self.lock:
+            self.transaction()
+            try:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO episodes VALUES (?, ?, ?, ?, ?)",
+                    (episode.name, *(self.relative(getattr(episode, attr)) for attr in EPISODE_PATHS)),
+                )
+                for position, scene in enumerate(scenes):
+                    num, h = scene_number_of(scene), scene_hash(scene)
+                    row = self.db.execute(
+                        "SELECT scene_hash, status, line FROM tasks WHERE episode = ? AND scene_number = ?",
+                        (episode.name, num),
+                    ).fetchone()
+                    usable = row and row[1] != "failed" and not (
+                        row[1] == "done" and line_errors(row[2]) and not is_terminal_line(row[2]))
+                    if usable and row[0] == h:
+                        self.db.execute("UPDATE tasks SET position = ? WHERE episode = ? AND scene_number = ?",
+                                        (position, episode.name, num))
+                        kept += 1
+                        continue
+                    self.db.execute(
+                        "INSERT OR REPLACE INTO tasks (episode, scene_number, position, scene, scene_hash, updated_at)"
+                        " VALUES (?, ?, ?, ?, ?, ?)",
+                        (episode.name, num, position, scene, h, now),
+                    )
+                    added += 1
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        return added, kept
+
+    # ----- WORKER -----
+
+    def claim(self, owner: str, n: int, lease_seconds: float) -> tuple:
+        """
+        Nhận tối đa n task: pending, hoặc leased nhưng đã hết hạn lease (worker cũ đã chết).
+        Trả về (list Task, số task nhận lại từ lease hết hạn).
+        """
+        now = time.time()
+        with self.lock:
+            self.transaction()
+            try:
+                rows = self.db.execute(
+                    "SELECT episode, scene_number, scene, attempts, line, status FROM tasks"
+                    " WHERE status = 'pending' OR (status = 'leased' AND lease_until < ?)"
+                    " ORDER BY position, episode LIMIT ?",
+                    (now, n),
+                ).fetchall()
+                for episode, num, *_ in rows:
+                    self.db.execute(
+                        "UPDATE tasks SET status = 'leased', owner = ?, lease_until = ?, updated_at = ?"
+                        " WHERE episode = ? AND scene_number = ?",
+                        (owner, now + lease_seconds, now, episode, num),
+                    )
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        expired = sum(1 for row in rows if row[5] == "leased")
+        return [Task(*row[:5]) for row in rows], expired
+
+    def renew(self, owner: str, lease_seconds: float) -> int:
+        """Gia hạn mọi lease của owner (heartbeat). Trả về số task còn giữ."""
+        with self.lock:
+            cur = self.db.execute(
+                "UPDATE tasks SET lease_until = ? WHERE owner = ? AND status = 'leased'",
+                (time.time() + lease_seconds, owner),
+            )
+        return cur.rowcount
+
+    def finish(self, owner: str, task: Task, status: str, line: str = None, error: str = None,
+               attempts: int = None, model: str = None) -> bool:
+        """
+        Cập nhật task owner đang giữ (model: model đã sinh ra line). False = lease đã mất
+        (worker khác nhận lại) → bỏ kết quả.
+        """
+        with self.lock:
+            cur = self.db.execute(
+                "UPDATE tasks SET status = ?, line = COALESCE(?, line), model = COALESCE(?, model), error = ?, attempts = ?,"
+                " owner = CASE WHEN ? = 'pending' THEN NULL ELSE owner END, lease_until = NULL, updated_at = ?"
+                " WHERE episode = ? AND scene_number = ? AND owner = ? AND status = 'leased'",
+                (status, line, model if line else None, error, task.attempts if attempts is None else attempts, status,
+                 time.time(), task.episode, task.scene_number, owner),
+            )
+        return cur.rowcount == 1
+
+    def complete(self, owner: str, task: Task, line: str, model: str = None) -> bool:
+        return self.finish(owner, task, "done", line, model=model)
+
+    def retry(self, owner: str, task: Task, line: str = None, error: str = None,
+              max_attempts: int = QUEUE_MAX_ATTEMPTS, model: str = None) -> bool:
+        """
+        Trả task về pending để thử lại (dòng hỏng / request lỗi), số lần thử + 1.
+        Quá max_attempts: dòng hỏng → done giữ dòng đó (như --regen hết lượt); lỗi request → failed.
+        """
+        attempts = task.attempts + 1
+        if attempts < max_attempts:
+            return self.finish(owner, task, "pending", line, error, attempts, model)
+        return self.finish(owner, task, "done" if line else "failed", line, error, attempts, model)
+
+    def release_all(self, owner: str) -> int:
+        """Worker dừng (Ctrl+C...) → trả các task đang giữ về pending ngay, không chờ hết lease."""
+        with self.lock:
+            cur = self.db.execute(
+                "UPDATE tasks SET status = 'pending', owner = NULL, lease_until = NULL WHERE owner = ? AND status = 'leased'",
+                (owner,),
+            )
+        return cur.rowcount
+
+    def outstanding(self) -> int:
+        """Số task chưa xong (pending + leased)."""
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM tasks WHERE status IN ('pending', 'leased')").fetchone()[0]
+
+    # ----- ĐỌC -----
+
+    def counts(self) -> dict:
+        """{tập: {trạng thái: số cảnh}}."""
+        result = {}
+        with self.lock:
+            rows = self.db.execute("SELECT episode, status, COUNT(*) FROM tasks GROUP BY episode, status").fetchall()
+        for episode, status, n in rows:
+            result.setdefault(episode, {})[status] = n
+        return result
+
+    def done_lines(self, episode: str) -> list:
+        """[(scene, line)] các cảnh đã xong của 1 tập, theo thứ tự cảnh."""
+        with self.lock:
+            return self.db.execute(
+                "SELECT scene, line FROM tasks WHERE episode = ? AND status = 'done' ORDER BY position", (episode,)
+            ).fetchall()
+
+    def models(self, episode: str) -> list:
+        """Các model đã sinh ra cảnh xong của 1 tập (task cũ chưa có cột model bị bỏ qua)."""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT DISTINCT model FROM tasks WHERE episode = ? AND status = 'done' AND model IS NOT NULL"
+                " ORDER BY model", (episode,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+# ==============================
+# XẾP HÀNG / EXPORT (KHÔNG GỌI API)
+# ==============================
+
+def enqueue_episodes(queue: WorkQueue, episodes, scene_range: str = None) -> int:
+    """Xếp cảnh của các tập (theo --scenes nếu có) vào hàng đợi. Trả về tổng số cảnh xếp mới."""
+    total = 0
+    for ep in episodes:
+        selected = ep.load_scenes(scene_range)
+        added, kept = queue.enqueue(ep, selected)
+        total += added
+        print(f"📥 {ep.tag}Xếp {added} cảnh cần chạy, giữ nguyên {kept} cảnh → {queue.path}")
+    return total
+
+
+def export_queue(queue: WorkQueue, store=None, run_id: str = None, seed: int = None) -> int:
+    """
+    Các cảnh đã xong trong hàng đợi → journal của từng tập → output (hậu xử lý như generate).
+    Chỉ lấy dòng có nội dung cảnh khớp scenes file hiện tại; journal chỉ ghi thêm cảnh chưa có /
+    khác dòng đã ghi, nên export nhiều lần không làm journal phình ra. Trả về số tập đã export.
+    Model ghi vào OutputStore = các model worker đã dùng cho tập đó ("a, b" nếu nhiều worker khác model;
+    hàng đợi cũ chưa ghi model → MODEL_NAME).
+    """
+    exported = 0
+    for ep in queue.episodes():
+        ep.load(None, resume=True, seed=seed)
+        current = {scene_number_of(scene): scene_hash(scene) for scene in ep.selected}
+        journal = ep.journal.load()
+        matched = appended = 0
+        ep.journal.open(resume=True)
+        try:
+            for scene, line in queue.done_lines(ep.name):
+                num, h = scene_number_of(scene), scene_hash(scene)
+                if current.get(num) != h:
+                    continue
+                matched += 1
+                if journal.get(num) != (h, line):
+                    ep.journal.append(scene, line)
+                    appended += 1
+        finally:
+            ep.journal.close()
+        del journal
+        if appended:
+            print(f"📝 {ep.tag}Ghi thêm {appended} cảnh mới xong vào {ep.journal.path}.")
+        waiting = len(ep.selected) - matched
+        if waiting > 0:
+            print(f"⏳ {ep.tag}Còn {waiting} cảnh chưa xong trong hàng đợi.")
+        ep.export(store, run_id, seed, model=", ".join(queue.models(ep.name)) or MODEL_NAME)
+        exported += 1
+    return exported
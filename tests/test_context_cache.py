@@ -0,0 +1,72 @@
+"""Context cache (gemini.ContextCache / generate_with_context_cache) chạy với FakeGeminiServer."""
+
+import json
+
+import pytest
+
+pytest.importorskip("google.ai.generativelanguage")
+
+from tachphai import config, gemini  # noqa: E402
+from tachphai.fakeserver import FakeGeminiServer  # noqa: E402
+
+PREFIX = "STATIC RULES\n" * 20 + "SCENE TO PROCESS:\n"
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    keys = tmp_path / "api_keys.txt"
+    keys.write_text("test-key-1 rpm=6000 tpm=100000000\n", encoding="utf-8")
+    with FakeGeminiServer() as srv:
+        monkeypatch.setattr(config, "API_ENDPOINT", srv.url)
+        monkeypatch.setattr(gemini, "scheduler", None)
+        monkeypatch.setattr(gemini, "stream_responses", False)
+        monkeypatch.setattr(gemini, "context_cache", gemini.ContextCache(PREFIX))
+        gemini.get_scheduler(str(keys))
+        yield srv
+        gemini.client_pool.close()
+
+
+def scene_of(text: str) -> int:
+    return json.loads(text)["scene_number"]
+
+
+def test_first_call_creates_cache_and_sends_suffix(server):
+    assert scene_of(gemini.call_gemini_text(PREFIX + "Scene 3: rain")) == 3
+    assert server.stats["cache_create"] == 1
+    assert server.stats["cache_hit"] == 1
+    assert gemini.context_cache.entries[0][0] in server.cached
+
+
+def test_cache_is_reused_for_later_calls(server):
+    for n in (1, 2, 3):
+        assert scene_of(gemini.call_gemini_text(PREFIX + f"Scene {n}: rain")) == n
+    assert server.stats["cache_create"] == 1
+    assert server.stats["cache_hit"] == 3
+
+
+def test_prompt_without_prefix_skips_cache(server):
+    assert scene_of(gemini.call_gemini_text("SCENE TO PROCESS:\nScene 4: rain")) == 4
+    assert server.stats["cache_create"] == 0
+    assert server.stats["cache_hit"] == 0
+
+
+def test_missing_cache_falls_back_to_full_prompt(server):
+    gemini.call_gemini_text(PREFIX + "Scene 1: rain")
+    server.cached.clear()  # cache hết hạn / bị xoá phía server
+
+    assert scene_of(gemini.call_gemini_text(PREFIX + "Scene 2: rain")) == 2
+    assert server.stats["cache_miss"] == 1
+    assert 0 not in gemini.context_cache.entries
+
+    # Lượt sau tạo cache mới
+    assert scene_of(gemini.call_gemini_text(PREFIX + "Scene 3: rain")) == 3
+    assert server.stats["cache_create"] == 2
+    assert server.stats["cache_hit"] == 2
+
+
+def test_cleanup_deletes_created_caches(server):
+    gemini.call_gemini_text(PREFIX + "Scene 1: rain")
+    gemini.context_cache.cleanup()
+    assert server.stats["cache_delete"] == 1
+    assert not server.cached
+    assert not gemini.context_cache.entries
@@ -0,0 +1,71 @@
+"""dedup.py: cảnh trùng hẳn / gần trùng / khác hẳn và renumber_line."""
+
+import json
+
+from tachphai.dedup import DuplicateIndex, find_duplicates, normalize_scene_text, renumber_line
+
+BEAT = (
+    "An walks slowly through the flooded market at night while lanterns sway above the stalls "
+    "and a stray dog follows her past the closed fish counters toward the old bridge where "
+    "the ferryman waits with a broken oar and a story about the storm that took his brother"
+)
+OTHER = (
+    "Morning in the mountain monastery where two monks argue over a chess game that has lasted "
+    "three winters while novices sweep snow from the courtyard and bells ring for breakfast"
+)
+
+
+def scene(num: int, text: str) -> str:
+    return f"Scene {num}: {text}"
+
+
+def test_normalize_drops_header_case_and_punctuation():
+    assert normalize_scene_text("Scene 12 – An WALKS, slowly... home!") == "an walks slowly home"
+
+
+def test_exact_duplicate_after_normalization():
+    scenes = [scene(1, BEAT), scene(2, OTHER), scene(5, BEAT.upper() + "!!!")]
+    assert find_duplicates(scenes, threshold=0.85) == {"5": ("1", 1.0)}
+
+
+def test_near_duplicate():
+    edited = BEAT.replace("stray dog", "stray cat")
+    dups = find_duplicates([scene(1, BEAT), scene(2, OTHER), scene(3, edited)], threshold=0.7)
+    assert list(dups) == ["3"]
+    rep, sim = dups["3"]
+    assert rep == "1"
+    assert 0.7 <= sim < 1.0
+
+
+def test_near_duplicate_ignored_when_near_disabled():
+    edited = BEAT.replace("stray dog", "stray cat")
+    assert find_duplicates([scene(1, BEAT), scene(3, edited)], threshold=0.7, near=False) == {}
+
+
+def test_distinct_scenes_are_not_duplicates():
+    assert find_duplicates([scene(1, BEAT), scene(2, OTHER), scene(3, "A short unrelated beat.")], 0.5) == {}
+
+
+def test_copy_of_near_duplicate_points_to_representative():
+    edited = BEAT.replace("stray dog", "stray cat")
+    dups = find_duplicates([scene(1, BEAT), scene(2, edited), scene(3, edited)], threshold=0.7)
+    assert dups["2"][0] == "1"
+    assert dups["3"] == dups["2"]
+
+
+def test_index_same_scene_number_is_not_its_own_duplicate():
+    index = DuplicateIndex(0.85)
+    assert index.add_or_match("1", normalize_scene_text(BEAT)) is None
+    assert find_duplicates([scene(1, BEAT), scene(1, BEAT)], 0.85) == {}
+
+
+def test_renumber_line():
+    line = json.dumps({"scene_number": 1, "scene_title": "Chợ đêm", "setting": {"time": "Night"}}, ensure_ascii=False)
+    data = json.loads(renumber_line(line, "7"))
+    assert data == {"scene_number": 7, "scene_title": "Chợ đêm", "setting": {"time": "Night"}}
+
+
+def test_renumber_line_keeps_non_digit_number_and_broken_line():
+    line = '{"scene_number": 1, "scene_title": "x"}'
+    assert json.loads(renumber_line(line, "7a"))["scene_number"] == "7a"
+    assert renumber_line("not json", "7") == "not json"
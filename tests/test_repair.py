@@ -0,0 +1,76 @@
+"""repair.py: sửa JSON response hỏng (không gọi API)."""
+
+import json
+
+from tachphai.repair import parse_lenient, repair_candidates, strip_fences
+
+SCENE = {"scene_number": 3, "scene_title": "Rain", "dialogue": {"characters": [{"speaker": "An", "line": "Đi thôi."}]}}
+TEXT = json.dumps(SCENE, ensure_ascii=False)
+
+
+def test_valid_json_is_not_repaired():
+    assert parse_lenient(TEXT) == (SCENE, False)
+
+
+def test_fenced_json_with_prose():
+    text = "Here is the JSON:\n```json\n" + TEXT + "\n```\nHope this helps!"
+    assert strip_fences(text) == TEXT
+    assert parse_lenient(text) == (SCENE, False)
+
+
+def test_unclosed_fence():
+    assert parse_lenient("```json\n" + TEXT) == (SCENE, False)
+
+
+def test_prose_around_object():
+    assert parse_lenient("Sure! " + TEXT + " Anything else?") == (SCENE, True)
+
+
+def test_trailing_commas():
+    text = '{"scene_number": 3, "tags": ["a", "b",], "setting": {"time": "Night",},}'
+    data, repaired = parse_lenient(text)
+    assert repaired
+    assert data == {"scene_number": 3, "tags": ["a", "b"], "setting": {"time": "Night"}}
+
+
+def test_stray_quote_inside_string():
+    text = '{"scene_number": 3, "line": "Anh ấy nói "đi thôi" rồi."}'
+    data, repaired = parse_lenient(text)
+    assert repaired
+    assert data == {"scene_number": 3, "line": 'Anh ấy nói "đi thôi" rồi.'}
+
+
+def test_raw_newline_inside_string():
+    data, repaired = parse_lenient('{"content": "dòng 1\ndòng 2\tcuối"}')
+    assert repaired
+    assert data == {"content": "dòng 1\ndòng 2\tcuối"}
+
+
+def test_truncated_inside_string():
+    data, repaired = parse_lenient('{"scene_number": 3, "setting": {"location": "Forest", "time": "Nig')
+    assert repaired
+    assert data == {"scene_number": 3, "setting": {"location": "Forest", "time": "Nig"}}
+
+
+def test_truncated_after_key():
+    data, repaired = parse_lenient('{"scene_number": 3, "scene_title":')
+    assert repaired
+    assert data == {"scene_number": 3, "scene_title": None}
+
+
+def test_truncated_mid_key_backs_off_to_last_comma():
+    candidates = list(repair_candidates('{"scene_number": 3, "tags": ["a"], "scene_ti'))
+    assert json.loads(candidates[-1]) == {"scene_number": 3}
+    data, repaired = parse_lenient('{"scene_number": 3, "tags": ["a"], "scene_ti')
+    assert repaired
+    assert data == {"scene_number": 3, "tags": ["a"]}
+
+
+def test_first_candidate_stops_at_closed_object():
+    candidates = list(repair_candidates('{"a": 1} {"b": 2}'))
+    assert candidates == ['{"a": 1}']
+
+
+def test_unrecoverable_text():
+    assert parse_lenient("I'm sorry, I can't help with that.") == (None, False)
+    assert list(repair_candidates("no json here")) == []
@@ -0,0 +1,99 @@
+"""workqueue.WorkQueue: lease giữa nhiều worker, hết hạn lease, trả task khi dừng."""
+
+import sqlite3
+import time
+
+import pytest
+
+from tachphai.episodes import Episode
+from tachphai.workqueue import SCHEMA, WorkQueue
+
+SCENES = [f"Scene {n}: beat {n}." for n in range(1, 7)]
+
+
+@pytest.fixture
+def queue(tmp_path):
+    q = WorkQueue(str(tmp_path / "queue.db"))
+    ep = Episode("ep1", str(tmp_path / "scenes.txt"), str(tmp_path / "out.txt"))
+    assert q.enqueue(ep, SCENES) == (6, 0)
+    yield q
+    q.close()
+
+
+def status_of(q: WorkQueue, num: str):
+    return q.db.execute("SELECT status, owner, attempts FROM tasks WHERE scene_number = ?", (num,)).fetchone()
+
+
+def test_two_owners_never_share_tasks(queue):
+    a, _ = queue.claim("w1", 4, 60)
+    b, _ = queue.claim("w2", 4, 60)
+    assert [t.scene_number for t in a] == ["1", "2", "3", "4"]
+    assert [t.scene_number for t in b] == ["5", "6"]
+    assert queue.claim("w3", 4, 60) == ([], 0)
+    assert queue.counts() == {"ep1": {"leased": 6}}
+
+
+def test_expired_lease_is_reclaimed_and_old_owner_loses_result(queue):
+    stale, _ = queue.claim("w1", 2, 0.01)
+    time.sleep(0.05)
+    tasks, expired = queue.claim("w2", 10, 60)
+    assert expired == 2
+    assert {t.scene_number for t in tasks} == {str(n) for n in range(1, 7)}
+
+    # w1 sống lại sau khi mất lease → kết quả bị bỏ, task vẫn của w2
+    assert not queue.complete("w1", stale[0], '{"scene_number": 1}')
+    assert status_of(queue, "1")[:2] == ("leased", "w2")
+    assert queue.complete("w2", tasks[0], '{"scene_number": 1}', "models/test")
+    assert status_of(queue, "1")[:2] == ("done", "w2")
+
+
+def test_renew_keeps_lease_alive(queue):
+    queue.claim("w1", 2, 0.01)
+    assert queue.renew("w1", 60) == 2
+    time.sleep(0.05)
+    tasks, expired = queue.claim("w2", 10, 60)
+    assert expired == 0
+    assert [t.scene_number for t in tasks] == ["3", "4", "5", "6"]
+    assert queue.renew("w2", 60) == 4
+    assert queue.renew("nobody", 60) == 0
+
+
+def test_finish_and_retry(queue):
+    tasks, _ = queue.claim("w1", 3, 60)
+    assert queue.complete("w1", tasks[0], '{"scene_number": 1}', "models/a")
+    assert queue.retry("w1", tasks[1], error="boom", max_attempts=3)
+    assert status_of(queue, "2") == ("pending", None, 1)
+    assert queue.retry("w1", tasks[2], error="boom", max_attempts=1)
+    assert status_of(queue, "3") == ("failed", "w1", 1)
+    assert queue.done_lines("ep1") == [(SCENES[0], '{"scene_number": 1}')]
+    assert queue.models("ep1") == ["models/a"]
+    # Task đã xong không còn lease để hoàn thành lần nữa
+    assert not queue.complete("w1", tasks[0], '{"scene_number": 1}')
+
+
+def test_release_all_only_touches_own_tasks(queue):
+    queue.claim("w1", 2, 60)
+    queue.claim("w2", 2, 60)
+    assert queue.release_all("w1") == 2
+    assert status_of(queue, "1")[:2] == ("pending", None)
+    assert status_of(queue, "3")[:2] == ("leased", "w2")
+    assert queue.outstanding() == 6
+    tasks, expired = queue.claim("w3", 10, 60)
+    assert expired == 0
+    assert [t.scene_number for t in tasks] == ["1", "2", "5", "6"]
+
+
+def test_old_queue_file_gets_model_column(tmp_path):
+    path = str(tmp_path / "old.db")
+    db = sqlite3.connect(path)
+    db.execute(SCHEMA[0])
+    db.execute(SCHEMA[1].replace(" model TEXT,", ""))
+    db.commit()
+    db.close()
+
+    q = WorkQueue(path)
+    try:
+        columns = {row[1] for row in q.db.execute("PRAGMA table_info(tasks)")}
+        assert "model" in columns
+    finally:
+        q.close()